@@ -6,16 +6,199 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql+psycopg2://netsentinel:netsentinel@db:5432/netsentinel"
     FRONTEND_ORIGIN: str = "http://localhost:3000"
 
-    # which provider to use: "searxng" or "wikipedia"
+    # request sessions on an async engine (asyncpg, same DATABASE_URL) instead
+    # of the threadpool; background threads keep using the sync engine
+    DATABASE_ASYNC: bool = False
+    # connection pool of the engine serving requests, per worker process
+    # (ignored for SQLite)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # with DATABASE_ASYNC, the sync engine only serves the background threads
+    # (settings LISTEN, history writer, retention) and gets this smaller pool,
+    # so a worker needs up to DB_POOL_SIZE + DB_MAX_OVERFLOW +
+    # DB_BACKGROUND_POOL_SIZE + DB_BACKGROUND_MAX_OVERFLOW connections
+    DB_BACKGROUND_POOL_SIZE: int = 3
+    DB_BACKGROUND_MAX_OVERFLOW: int = 3
+
+    # which providers to query (comma-separated, queried concurrently):
+    # "searxng", "wikipedia" or e.g. "searxng,wikipedia"
     SEARCH_PROVIDER: str = "searxng"
 
     # base URL of your SearxNG instance (make sure JSON format is enabled)
     # e.g. "http://searxng:8080" if you add a docker service, or "http://localhost:8080"
     SEARXNG_URL: str = "http://searxng:8080"
+    # more SearxNG instances to fan out to (comma-separated base URLs)
+    SEARXNG_EXTRA_URLS: str = ""
+
+    WIKIPEDIA_API_URL: str = "https://en.wikipedia.org/w/api.php"
+
+    # whole fan-out must finish within the deadline; a provider that hasn't
+    # answered after the hedge delay gets a second request (0 = no hedging)
+    SEARCH_DEADLINE_MS: int = 4000
+    SEARCH_HEDGE_DELAY_MS: int = 1000
+
+    # per-worker cache of provider results (0 = disabled); filtering still
+    # runs per request, so this only skips the upstream call
+    SEARCH_CACHE_TTL_SECONDS: float = 300.0
+    SEARCH_CACHE_MAX_ITEMS: int = 1024
+
+    # pagination: results requested per upstream page, how many upstream pages
+    # one response may read to fill `limit` after filtering, background
+    # prefetch of the next page, and the HMAC key for cursors. Cursors are
+    # always signed: without a secret one is generated into
+    # SEARCH_CURSOR_SECRET_FILE and shared by the workers on that host, so
+    # set SEARCH_CURSOR_SECRET when several hosts serve the API.
+    SEARCH_UPSTREAM_PAGE_SIZE: int = 50
+    SEARCH_MAX_PAGES_PER_REQUEST: int = 3
+    SEARCH_PREFETCH: bool = True
+    SEARCH_CURSOR_SECRET: str = ""
+    SEARCH_CURSOR_SECRET_FILE: str = "/tmp/netsentinel/cursor_secret"
 
     # optional: restrict categories, leave empty for all
     SEARXNG_CATEGORIES: str = "general,images"
 
+    # keyword filter: only match whole words ("sex" no longer blocks "Essex")
+    KEYWORD_MATCH_WORD_BOUNDARY: bool = False
+
+    # GlobalSettings cache: how often a worker re-checks the settings version,
+    # and how long it trusts its copy when LISTEN/NOTIFY is connected
+    SETTINGS_CACHE_POLL_SECONDS: float = 2.0
+    SETTINGS_CACHE_MAX_AGE_SECONDS: float = 60.0
+    SETTINGS_CACHE_LISTEN: bool = True
+
+    # NSFW classifier micro-batching: concurrent images share one forward pass.
+    # A caller gives up on its score after CLASSIFIER_BATCH_TIMEOUT seconds
+    # (the classifier then counts as failed for that image)
+    CLASSIFIER_BATCHING: bool = True
+    CLASSIFIER_MAX_BATCH_SIZE: int = 16
+    CLASSIFIER_MAX_WAIT_MS: float = 10.0
+    CLASSIFIER_BATCH_TIMEOUT: float = 30.0
+
+    # NSFW classifier inference: "torch" (full precision) or "onnx"
+    # (ONNX Runtime; build the model with scripts/export_classifier_onnx.py)
+    CLASSIFIER_BACKEND: str = "torch"
+    CLASSIFIER_ONNX_PATH: str = "models/nsfw_classifier.int8.onnx"
+
+    # moderation score cache: per-worker LRU + SQLite file shared by the workers
+    # on this host (empty path = memory only)
+    MODERATION_CACHE_ENABLED: bool = True
+    MODERATION_CACHE_MEMORY_ITEMS: int = 4096
+    MODERATION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    MODERATION_CACHE_PATH: str = "/tmp/netsentinel/moderation_cache.sqlite3"
+    MODERATION_CACHE_MAX_ROWS: int = 200_000
+
+    # images are decoded once and downsampled to this longest side before
+    # detector / classifier / blur (NudeNet works at 320-640px, the ViT at 224px)
+    MODERATION_MAX_SIDE: int = 640
+
+    # where censor_if_needed runs: "thread" (FastAPI threadpool, in-process)
+    # or "process" (pool of worker processes, models loaded once per worker)
+    MODERATION_BACKEND: str = "thread"
+    MODERATION_WORKERS: int = 2
+    # torch intra-op threads per process (0 = torch default)
+    MODERATION_TORCH_THREADS: int = 0
+
+    # moderation cascade per filter mode (see app/services/moderation_cascade.py):
+    # comma-separated stages out of host, tiny, classifier, detector, run in
+    # order until one is decisive. "detector,classifier" is the pre-cascade
+    # behaviour. The classifier stage decides "safe" below SAFE_BELOW and
+    # "unsafe" at or above UNSAFE_ABOVE; in between the next stage runs.
+    MODERATION_CASCADE_MODERATE: str = "host,tiny,classifier,detector"
+    MODERATION_CASCADE_STRICT: str = "tiny,classifier,detector"
+    MODERATION_CASCADE_SAFE_BELOW_MODERATE: float = 0.10
+    MODERATION_CASCADE_SAFE_BELOW_STRICT: float = 0.03
+    MODERATION_CASCADE_UNSAFE_ABOVE_MODERATE: float = 0.90
+    MODERATION_CASCADE_UNSAFE_ABOVE_STRICT: float = 0.75
+    # images whose longer side is at most this many pixels are never blurred
+    MODERATION_TINY_MAX_SIDE: int = 48
+    # longest side of the decode the classifier stage runs on
+    MODERATION_CASCADE_CLASSIFIER_SIDE: int = 256
+    # host stage: a host is trusted (images skip the models) after this many
+    # clearly safe verdicts in a row in a mode (0 = never), until this many
+    # seconds pass without a model verdict for it; at most MAX_HOSTS tracked
+    # per process
+    MODERATION_HOST_TRUST_AFTER: int = 20
+    MODERATION_HOST_TRUST_SECONDS: int = 900
+    MODERATION_HOST_TRUST_MAX_HOSTS: int = 10_000
+
+    # load + warm up the models in the background at start-up (see /ready);
+    # False = load lazily on the first image request
+    MODEL_WARMUP: bool = True
+
+    # shared outbound HTTP client (connection pool with keep-alive)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_CONNECT_TIMEOUT: float = 3.0
+    HTTP_READ_TIMEOUT: float = 5.0
+
+    # media proxy downloads
+    IMAGE_FETCH_MAX_BYTES: int = 8 * 1024 * 1024
+    IMAGE_FETCH_TOTAL_TIMEOUT: float = 10.0
+    IMAGE_FETCH_PER_HOST_LIMIT: int = 6
+    IMAGE_FETCH_QUEUE_TIMEOUT: float = 5.0
+
+    # rendered thumbnails served by /api/media/proxy (empty dir = disabled).
+    # TTL: how long a stored thumbnail is served before the source image is
+    # fetched and moderated again; MAX_AGE: the Cache-Control max-age sent
+    # to browsers
+    THUMBNAIL_CACHE_DIR: str = "/tmp/netsentinel/thumbnails"
+    THUMBNAIL_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    THUMBNAIL_CACHE_TTL_SECONDS: int = 3 * 24 * 3600
+    THUMBNAIL_CACHE_MAX_AGE: int = 24 * 3600
+
+    # moderate the preview images of a search in the background before the
+    # browser asks for them (needs the thumbnail cache); pending jobs older
+    # than the max age are skipped
+    PREMODERATION_ENABLED: bool = True
+    PREMODERATION_QUEUE_SIZE: int = 256
+    PREMODERATION_WORKERS: int = 4
+    PREMODERATION_MAX_AGE_SECONDS: float = 60.0
+
+    # search history write-behind (Postgres only): rows are queued and written
+    # in batches; see app/services/history_writer.py for the options
+    HISTORY_WRITE_BEHIND: bool = True
+    HISTORY_QUEUE_SIZE: int = 10_000
+    HISTORY_BATCH_SIZE: int = 200
+    HISTORY_FLUSH_INTERVAL_MS: float = 250.0
+    HISTORY_ID_BLOCK_SIZE: int = 100
+    # "buffered" or "group_commit"
+    HISTORY_DURABILITY: str = "buffered"
+    # when the queue is full: "block", "drop" or "sync"
+    HISTORY_QUEUE_FULL: str = "block"
+    HISTORY_ENQUEUE_TIMEOUT: float = 2.0
+
+    # search history retention (0 = keep forever); the purge drops expired
+    # monthly partitions and deletes the rest in batches, see
+    # app/services/retention.py (also pre-creates upcoming partitions)
+    HISTORY_RETENTION_DAYS: int = 0
+    RETENTION_PURGE_INTERVAL_SECONDS: float = 3600.0
+    RETENTION_DELETE_BATCH_SIZE: int = 5000
+    PARTITION_PREMAKE_MONTHS: int = 3
+
+    # bulk domain lists built with scripts/import_domain_list.py (empty = none),
+    # shared by all workers through mmap; re-opened when the file is replaced.
+    # They apply in DOMAIN_LIST_MODES, the admin's allowed/blocked domains in
+    # every mode.
+    DOMAIN_BLOCKLIST_PATH: str = ""
+    DOMAIN_ALLOWLIST_PATH: str = ""
+    DOMAIN_LIST_MODES: str = "moderate,strict"
+    DOMAIN_LIST_RELOAD_SECONDS: float = 60.0
+
+    # on-demand request profiling (needs pyinstrument; the middleware isn't
+    # installed at all unless enabled with a token). A request carrying
+    # "X-Profile: <token>" (or ?profile=<token>) is profiled; a sample rate
+    # > 0 also profiles that share of all requests. Speedscope files go to
+    # PROFILE_DIR, keeping the N slowest per endpoint in each worker.
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: str = ""
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_DIR: str = "/tmp/netsentinel/profiles"
+    PROFILE_KEEP_SLOWEST: int = 5
+    PROFILE_INTERVAL_SECONDS: float = 0.001
+
     class Config:
         env_file = ".env"
 
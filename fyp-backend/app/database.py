@@ -1,15 +1,67 @@
 # app/database.py
 import os
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Optional, TypeVar, Union
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL, future=True)
+T = TypeVar("T")
+
+
+def _pool_options(url: str, background: bool = False) -> Dict[str, Any]:
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite uses its own single-file pools, sizing doesn't apply
+        return {}
+    return {
+        "pool_size": settings.DB_BACKGROUND_POOL_SIZE if background else settings.DB_POOL_SIZE,
+        "max_overflow": (
+            settings.DB_BACKGROUND_MAX_OVERFLOW if background else settings.DB_MAX_OVERFLOW
+        ),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _async_url(url: str) -> str:
+    # same database, async driver: postgresql+psycopg2://... -> postgresql+asyncpg://...
+    parsed = make_url(url)
+    driver = "sqlite+aiosqlite" if parsed.get_backend_name() == "sqlite" else "postgresql+asyncpg"
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# Sync engine: background threads (settings LISTEN, history writer) and,
+# unless DATABASE_ASYNC is on, the request sessions as well. With
+# DATABASE_ASYNC it gets the small background pool: both engines are open in
+# every worker, and two request-sized pools would double the connections.
+engine = create_engine(
+    settings.DATABASE_URL,
+    future=True,
+    **_pool_options(settings.DATABASE_URL, background=settings.DATABASE_ASYNC),
+)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        _async_url(settings.DATABASE_URL), **_pool_options(settings.DATABASE_URL)
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=True
+    )
+
 Base = declarative_base()
 
 
@@ -19,3 +71,52 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class DbRunner:
+    """
+    Runs sync ORM code (`fn(session, *args)`) from async endpoints.
+
+    With DATABASE_ASYNC the session is an AsyncSession on asyncpg and `fn`
+    runs through run_sync, so waiting on Postgres doesn't hold a threadpool
+    slot. Otherwise `fn` runs in the threadpool on a regular Session.
+
+    The session is only opened on the first `run`, so requests served from
+    cached data never check out a connection.
+    """
+
+    def __init__(self):
+        self._session: Optional[Union[Session, "AsyncSession"]] = None
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        if AsyncSessionLocal is not None:
+            if self._session is None:
+                self._session = AsyncSessionLocal()
+            return await self._session.run_sync(fn, *args, **kwargs)
+
+        if self._session is None:
+            self._session = SessionLocal()
+        return await run_in_threadpool(fn, self._session, *args, **kwargs)
+
+    async def close(self) -> None:
+        session, self._session = self._session, None
+        if session is None:
+            return
+        if AsyncSessionLocal is not None:
+            await session.close()
+        else:
+            await run_in_threadpool(session.close)
+
+
+async def get_db_runner() -> AsyncIterator[DbRunner]:
+    runner = DbRunner()
+    try:
+        yield runner
+    finally:
+        await runner.close()
+
+
+async def dispose_engines() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
@@ -1,21 +1,59 @@
 # app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .config import settings
-from .database import Base, engine
+from .database import Base, dispose_engines, engine
 from .routers import search, stats, settings as settings_router
 from .routers import media  # NEW
+from .routers import metrics
+from .services.history_writer import start_history_writer, stop_history_writer
+from .services.http_client import close_http_client
+from .services.model_warmup import model_readiness, start_model_warmup, stop_model_warmup
+from .services.moderation_pool import shutdown_moderation_pool, start_moderation_pool
+from .services.premoderation import start_premoderation, stop_premoderation
+from .services.retention import start_retention, stop_retention
+from .utils.profiling import install_profiling
+from .utils.settings import start_settings_listener, stop_settings_listener
 
 # Create tables
 # Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="NetSentinel API")
-
 # @app.on_event("startup")
 # def on_startup():
  #   Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_settings_listener(engine)
+    start_history_writer(engine)
+    start_moderation_pool()
+    # models load + warm up in the background; /health answers right away,
+    # /ready once the models are usable
+    start_model_warmup()
+    start_premoderation()
+    start_retention(engine)
+
+    yield
+
+    await stop_retention()
+    await stop_premoderation()
+    await stop_model_warmup()
+    stop_settings_listener()
+    # flush queued search history before the process goes away
+    stop_history_writer()
+    shutdown_moderation_pool()
+    await close_http_client()
+    await dispose_engines()
+
+
+app = FastAPI(title="NetSentinel API", lifespan=lifespan)
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.FRONTEND_ORIGIN, "http://localhost:3000", "http://127.0.0.1:3000"],
@@ -24,12 +62,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# no-op unless PROFILING_ENABLED (see app/utils/profiling.py)
+install_profiling(app)
+
 app.include_router(search.router, prefix="/api")
 app.include_router(stats.router, prefix="/api")
 app.include_router(settings_router.router, prefix="/api")
 app.include_router(media.router, prefix="/api")  # NEW
+app.include_router(metrics.router)
 
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    status = model_readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
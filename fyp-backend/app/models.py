@@ -11,6 +11,8 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     Text,
+    PrimaryKeyConstraint,
+    Index,
 )
 from sqlalchemy.orm import relationship
 
@@ -30,7 +32,14 @@ class ResultType(str, enum.Enum):
 
 
 class SearchQuery(Base):
+    # On Postgres this is range-partitioned by month on created_at, with
+    # primary key (id, created_at): migrations/0004_partition_search_history.sql
     __tablename__ = "search_queries"
+    __table_args__ = (
+        # keyset pagination of the history: ORDER BY created_at DESC, id DESC
+        Index("ix_search_queries_created_at_id", "created_at", "id"),
+        Index("ix_search_queries_filter_mode_created_at_id", "filter_mode", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     query = Column(String(512), nullable=False)
@@ -41,10 +50,13 @@ class SearchQuery(Base):
     safe_results = Column(Integer, default=0)
     blocked_results = Column(Integer, default=0)
 
+    # the database removes the results (ON DELETE CASCADE, or the retention
+    # purge once the tables are partitioned), the ORM doesn't load them first
     results = relationship(
         "SearchResult",
         back_populates="search_query",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -52,7 +64,7 @@ class SearchResult(Base):
     __tablename__ = "search_results"
 
     id = Column(Integer, primary_key=True, index=True)
-    query_id = Column(Integer, ForeignKey("search_queries.id", ondelete="CASCADE"))
+    query_id = Column(Integer, ForeignKey("search_queries.id", ondelete="CASCADE"), index=True)
     title = Column(String(512), nullable=False)
     url = Column(String(1024), nullable=False)
     snippet = Column(Text, nullable=False)
@@ -66,6 +78,27 @@ class SearchResult(Base):
     search_query = relationship("SearchQuery", back_populates="results")
 
 
+class SearchStatsRollup(Base):
+    """
+    Pre-aggregated search counts per time bucket and filter mode, upserted
+    in the same transaction as the search history (see
+    app/services/stats_rollup.py). granularity is "hour", "day" or "all"
+    (a single all-time bucket starting at the epoch).
+    """
+
+    __tablename__ = "search_stats_rollups"
+    __table_args__ = (PrimaryKeyConstraint("granularity", "bucket_start", "filter_mode"),)
+
+    granularity = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    filter_mode = Column(Enum(FilterMode), nullable=False)
+
+    searches = Column(Integer, default=0, nullable=False)
+    total_results = Column(Integer, default=0, nullable=False)
+    safe_results = Column(Integer, default=0, nullable=False)
+    blocked_results = Column(Integer, default=0, nullable=False)
+
+
 class GlobalSettings(Base):
     __tablename__ = "global_settings"
 
@@ -82,4 +115,15 @@ class GlobalSettings(Base):
     # comma-separated lists
     blocked_keywords = Column(Text, default="")
     allowed_domains = Column(Text, default="")
+    blocked_domains = Column(Text, default="")
+
+    # bumped on every PUT /api/settings so cached copies in other workers
+    # can tell they are stale (see app/utils/settings.py)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False,
+    )
 
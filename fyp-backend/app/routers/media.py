@@ -1,68 +1,131 @@
 # app/routers/media.py
-from io import BytesIO
-from urllib.parse import unquote_plus
-
-import requests
-from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.responses import StreamingResponse
-
-from ..services.image_moderation import censor_if_needed
-from ..utils.settings import get_or_create_global_settings
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+
+from ..config import settings as app_settings
+from ..services.image_fetch import ImageFetchError
+from ..services.moderation_pool import ModerationUnavailable
+from ..services.premoderation import decode_proxy_url, moderate_image, render_thumbnail
+from ..services.thumbnail_cache import CachedThumbnail, get_thumbnail_cache, thumbnail_key
+from ..utils.metrics import counter
+from ..utils.settings import get_cached_settings, peek_cached_settings
 from ..models import FilterMode
-from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import DbRunner, get_db_runner
 
 router = APIRouter(prefix="/media", tags=["media"])
 
+THUMBNAIL_CACHE_LOOKUPS = counter(
+    "netsentinel_thumbnail_cache_lookups_total",
+    "Media proxy thumbnail cache lookups (not_modified: answered with a 304).",
+    labelnames=("result",),
+)
+
+
+def _cache_headers(entry: CachedThumbnail, explicit_mode: bool) -> dict:
+    # Without ?mode= the output depends on the admin's filter mode, which can
+    # change at any time: let clients keep it but always revalidate (cheap 304).
+    if explicit_mode:
+        cache_control = f"public, max-age={app_settings.THUMBNAIL_CACHE_MAX_AGE}"
+    else:
+        cache_control = "no-cache"
+    return {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.created_at, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+def _not_modified(request: Request, entry: CachedThumbnail) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry.created_at) <= since
+    return False
+
+
+async def _moderate(url: str, mode: FilterMode) -> tuple[bytes, str]:
+    try:
+        content, media_type, _ = await moderate_image(url, mode)
+        return content, media_type
+    except ImageFetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ModerationUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 
 @router.get("/proxy")
-def proxy_image(
+async def proxy_image(
+    request: Request,
     url: str = Query(..., description="Original image URL (URL-encoded)"),
     mode: FilterMode | None = Query(
         None,
         description="Optional override for filter mode: relaxed/moderate/strict",
     ),
-    db: Session = Depends(get_db),
+    db: DbRunner = Depends(get_db_runner),
 ):
     """
     Downloads an image from the given URL, applies censorship depending
     on filter_mode (relaxed / moderate / strict), and returns the (possibly blurred) image.
 
+    Final bytes are cached on disk per (url, mode) and served with
+    ETag/Last-Modified, so revalidation gets a 304 without any download or
+    model run.
+
     Frontend should always use this endpoint for thumbnails:
         <img src={`/api/media/proxy?url=${encodeURIComponent(img_src)}&mode=${filterMode}`} />
     """
-    decoded_url = unquote_plus(url)
+    decoded_url = decode_proxy_url(url)
 
-    if not decoded_url.startswith(("http://", "https://")):
+    if decoded_url is None:
         raise HTTPException(status_code=400, detail="Invalid image URL")
 
-    try:
-        resp = requests.get(decoded_url, timeout=10)
-    except requests.RequestException:
-        raise HTTPException(status_code=502, detail="Failed to fetch remote image")
-
-    if resp.status_code != 200:
-        raise HTTPException(status_code=404, detail="Image not found")
-
-    content_type = resp.headers.get("content-type", "")
-    if not content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="URL does not point to an image")
-
-    original_bytes = resp.content
-
-    settings = get_or_create_global_settings(db)
-    effective_mode = mode or settings.filter_mode
-
-    # Relaxed: no censorship at all
-    if effective_mode == FilterMode.relaxed:
-        censored_bytes = original_bytes
-
-    # Moderate: only very obvious nudity/NSFW gets blurred
-    elif effective_mode == FilterMode.moderate:
-        censored_bytes, _ = censor_if_needed(original_bytes, threshold=0.8)
-
-    # Strict: more aggressive – catches explicit + many intimate NSFW images
-    else:  # strict
-        censored_bytes, _ = censor_if_needed(original_bytes, threshold=0.6)
-
-    return StreamingResponse(BytesIO(censored_bytes), media_type="image/jpeg")
+    if mode is None:
+        settings = peek_cached_settings() or await db.run(get_cached_settings)
+        effective_mode = settings.filter_mode
+    else:
+        effective_mode = mode
+
+    cache = get_thumbnail_cache()
+    key = thumbnail_key(decoded_url, effective_mode)
+
+    entry: Optional[CachedThumbnail] = None
+    if cache is not None:
+        conditional = "if-none-match" in request.headers or "if-modified-since" in request.headers
+        if conditional:
+            entry = await run_in_threadpool(cache.get, key, False)
+            if entry is not None and _not_modified(request, entry):
+                THUMBNAIL_CACHE_LOOKUPS.inc(result="not_modified")
+                return Response(status_code=304, headers=_cache_headers(entry, mode is not None))
+        entry = await run_in_threadpool(cache.get, key)
+        THUMBNAIL_CACHE_LOOKUPS.inc(result="hit" if entry is not None else "miss")
+
+    if cache is None:
+        content, media_type = await _moderate(decoded_url, effective_mode)
+        return Response(content=content, media_type=media_type)
+
+    if entry is None:
+        # joins the background pre-moderation if it is already on this image
+        try:
+            entry = await render_thumbnail(decoded_url, effective_mode)
+        except ImageFetchError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except ModerationUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    return Response(
+        content=entry.content,
+        media_type=entry.media_type,
+        headers=_cache_headers(entry, mode is not None),
+    )
@@ -0,0 +1,15 @@
+# app/routers/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..utils.metrics import render_prometheus
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus scrape endpoint (per worker process).
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
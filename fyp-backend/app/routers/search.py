@@ -1,20 +1,50 @@
 # app/routers/search.py
+import asyncio
+import json
+import logging
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-import requests
+import httpx
 from typing import Dict
 from .. import models, schemas
-from ..database import get_db
-from ..services.search_providers import get_provider
-from ..services.filtering import filter_results, classify_result_type
-from ..utils.settings import get_or_create_global_settings
-from ..models import ResultType  
+from ..database import DbRunner, get_db_runner
+from ..services.history_writer import HistoryEntry, HistoryWriter, get_history_writer
+from ..services.image_fetch import ImageFetchError
+from ..services.moderation_pool import ModerationUnavailable
+from ..services.premoderation import enqueue_previews, image_url, image_verdict
+from ..services.search_providers import SearchUnavailable, get_provider
+from ..services.stats_rollup import RollupAccumulator, apply_rollups
+from ..services.search_pager import (
+    Cursor,
+    InvalidCursor,
+    PageResult,
+    collect_page,
+    decode_cursor,
+    encode_cursor,
+)
+from ..services.filtering import classify_result_type
+from ..utils.metrics import STAGE_SECONDS, counter
+from ..utils.settings import SettingsSnapshot, get_cached_settings, peek_cached_settings
+from ..models import FilterMode, ResultType
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULTS = counter(
+    "netsentinel_search_results_total",
+    "Upstream results that passed or were blocked by filtering, by filter mode.",
+    labelnames=("filter_mode", "outcome"),
+)
 
 router = APIRouter(prefix="/search", tags=["search"])
 
+# history writes of streamed searches, referenced until they finish
+_background: Set[asyncio.Future] = set()
+
 
 
 def infer_result_type(r: Dict) -> ResultType:
@@ -28,89 +58,53 @@ def infer_result_type(r: Dict) -> ResultType:
 
 
 
-@router.post("", response_model=schemas.SearchResponse)
-def perform_search(
+def _save_history(
+    db: Session,
     payload: schemas.SearchRequest,
-    db: Session = Depends(get_db),
-):
-    if not payload.query.strip():
-        raise HTTPException(status_code=400, detail="Query cannot be empty")
-
-    provider = get_provider()
-
-    try:
-        raw_results = provider.search(payload.query, limit=payload.limit)
-        has_more = len(raw_results) == payload.limit
-    except requests.HTTPError as e:
-        # Upstream returned HTTP error (e.g. 500)
-        logger.exception("Upstream search provider HTTP error")
-        # 👉 Either raise 502 (strict)...
-        # raise HTTPException(
-        #     status_code=502,
-        #     detail=f"Upstream search provider error: {e.response.status_code}",
-        # )
-        # ...or degrade gracefully:
-        return schemas.SearchResponse(results=[], has_more=False)
-    except requests.RequestException as e:
-        # Timeouts / connection issues / DNS, etc.
-        logger.exception("Failed to contact upstream search provider")
-        # 👉 Again, either raise...
-        # raise HTTPException(
-        #     status_code=502,
-        #     detail=f"Failed to contact upstream search provider: {e}",
-        # )
-        # ...or degrade gracefully:
-        return schemas.SearchResponse(results=[], has_more=False)
-
-    settings = get_or_create_global_settings(db)
-    effective_mode = payload.filter_mode or settings.filter_mode
+    effective_mode: FilterMode,
+    page: PageResult,
+    query_id: Optional[int],
+) -> Tuple[List[schemas.SearchResultOut], int]:
+    """
+    Save query + results but still return "live" preview URLs.
+    Follow-up pages are added to the query row of the first page.
+    Sync ORM code, run through DbRunner.
+    """
+    filtered = page.results
+    now = datetime.utcnow()
+    q = db.get(models.SearchQuery, query_id) if query_id else None
+    if q is not None and q.query == payload.query:
+        q.total_results += page.total
+        q.safe_results += len(filtered)
+        q.blocked_results += page.blocked
+        new_query = False
+    else:
+        q = models.SearchQuery(
+            query=payload.query,
+            filter_mode=effective_mode,
+            created_at=now,
+            total_results=page.total,
+            safe_results=len(filtered),
+            blocked_results=page.blocked,
+        )
+        db.add(q)
+        new_query = True
+    db.flush()
 
-    filtered, blocked_count = filter_results(
-        raw_results,
-        filter_mode=effective_mode,
-        blocked_keywords=settings.blocked_keywords or "",
-        allowed_domains=settings.allowed_domains or "",
+    # follow-up pages count towards the query's own bucket and mode
+    rollups = RollupAccumulator()
+    rollups.add(
+        q.created_at,
+        q.filter_mode,
+        1 if new_query else 0,
+        page.total,
+        len(filtered),
+        page.blocked,
     )
-
-    total = len(raw_results)
-    safe = len(filtered)
-
-    # CASE 1: Don't save history; just respond
-    if not settings.save_search_history:
-        now = datetime.utcnow()
-        out: List[schemas.SearchResultOut] = []
-        for idx, r in enumerate(filtered, start=1):
-            url = (r.get("url") or "").strip()
-            if not url:
-                # skip results with no URL
-                continue
-
-            out.append(
-                schemas.SearchResultOut(
-                    id=idx,
-                    title=r["title"],
-                    url=url,
-                    snippet=r["snippet"],
-                    type=infer_result_type(r),
-                    timestamp=now,
-                    preview_url=r.get("preview_url"),
-                )
-            )
-        return schemas.SearchResponse(results=out, has_more=has_more)
-
-
-    # CASE 2: Save query + results but still return "live" preview URLs
-    q = models.SearchQuery(
-        query=payload.query,
-        filter_mode=effective_mode,
-        total_results=total,
-        safe_results=safe,
-        blocked_results=blocked_count,
-    )
-    db.add(q)
-    db.flush()
+    apply_rollups(db, rollups)
 
     db_results: List[models.SearchResult] = []
+    kept: List[Dict] = []
     for r in filtered:
         url = (r.get("url") or "").strip()
         if not url:
@@ -126,13 +120,15 @@ def perform_search(
         )
         db.add(row)
         db_results.append(row)
+        kept.append(r)
 
 
-    db.commit()
+    with STAGE_SECONDS.timer(stage="db_commit"):
+        db.commit()
     db.refresh(q)
 
     out: List[schemas.SearchResultOut] = []
-    for r, row in zip(filtered, db_results):
+    for r, row in zip(kept, db_results):
         out.append(
             schemas.SearchResultOut(
                 id=row.id,
@@ -144,4 +140,349 @@ def perform_search(
                 preview_url=r.get("preview_url"),
             )
         )
-    return schemas.SearchResponse(results=out, has_more=has_more)
\ No newline at end of file
+    return out, q.id
+
+
+async def _history_entry(
+    writer: HistoryWriter,
+    payload: schemas.SearchRequest,
+    effective_mode: FilterMode,
+    page: PageResult,
+    query_id: Optional[int],
+) -> Tuple[List[schemas.SearchResultOut], HistoryEntry]:
+    """
+    Write-behind variant of _save_history: ids are reserved from the
+    sequences, the entry is written later in a batch (writer.submit).
+    """
+    kept = [r for r in page.results if (r.get("url") or "").strip()]
+    new_query_id, result_ids = await writer.reserve_ids(query_id is None, len(kept))
+    query_id = query_id or new_query_id
+    now = datetime.utcnow()
+
+    rows: List[Dict] = []
+    out: List[schemas.SearchResultOut] = []
+    for r, result_id in zip(kept, result_ids):
+        row = {
+            "id": result_id,
+            "query_id": query_id,
+            "title": r["title"],
+            "url": r["url"].strip(),
+            "snippet": r["snippet"],
+            "type": infer_result_type(r),
+            "is_blocked": False,
+            "created_at": now,
+        }
+        rows.append(row)
+        out.append(
+            schemas.SearchResultOut(
+                id=result_id,
+                title=row["title"],
+                url=row["url"],
+                snippet=row["snippet"],
+                type=row["type"],
+                timestamp=now,
+                preview_url=r.get("preview_url"),
+            )
+        )
+
+    entry = HistoryEntry(
+        query_id=query_id,
+        new_query=new_query_id is not None,
+        query=payload.query,
+        filter_mode=effective_mode,
+        created_at=now,
+        total_results=page.total,
+        safe_results=len(page.results),
+        blocked_results=page.blocked,
+        results=rows,
+    )
+    return out, entry
+
+
+async def _search_page(
+    payload: schemas.SearchRequest, db: DbRunner
+) -> Tuple[Optional[PageResult], FilterMode, Optional[Cursor], SettingsSnapshot]:
+    """
+    Validate the request and fetch + filter one page of results.
+    The page is None when the upstream providers failed.
+    """
+    if not payload.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    cursor = None
+    if payload.cursor:
+        try:
+            cursor = decode_cursor(payload.cursor, payload.query)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    settings = peek_cached_settings() or await db.run(get_cached_settings)
+    effective_mode = payload.filter_mode or settings.filter_mode
+
+    provider = get_provider()
+
+    try:
+        page = await collect_page(
+            provider,
+            payload.query,
+            max(1, payload.limit),
+            settings.policy(effective_mode),
+            cursor,
+        )
+    except SearchUnavailable:
+        # Every upstream failed (HTTP errors, timeouts, DNS, ...)
+        logger.exception("Failed to contact upstream search providers")
+        # 👉 Either raise...
+        # raise HTTPException(status_code=502, detail="Upstream search provider error")
+        # ...or degrade gracefully:
+        return None, effective_mode, cursor, settings
+    except (httpx.HTTPError, ValueError):
+        # Upstream returned garbage (e.g. non-JSON body)
+        logger.exception("Upstream search provider error")
+        return None, effective_mode, cursor, settings
+
+    SEARCH_RESULTS.inc(len(page.results), filter_mode=effective_mode.value, outcome="passed")
+    SEARCH_RESULTS.inc(page.blocked, filter_mode=effective_mode.value, outcome="blocked")
+    return page, effective_mode, cursor, settings
+
+
+def _unsaved_out(
+    page: PageResult, cursor: Optional[Cursor]
+) -> List[schemas.SearchResultOut]:
+    # not history rows: number the results, continuing from earlier pages
+    now = datetime.utcnow()
+    out: List[schemas.SearchResultOut] = []
+    first_id = (cursor.returned if cursor else 0) + 1
+    for idx, r in enumerate(page.results, start=first_id):
+        url = (r.get("url") or "").strip()
+        if not url:
+            # skip results with no URL
+            continue
+
+        out.append(
+            schemas.SearchResultOut(
+                id=idx,
+                title=r["title"],
+                url=url,
+                snippet=r["snippet"],
+                type=infer_result_type(r),
+                timestamp=now,
+                preview_url=r.get("preview_url"),
+            )
+        )
+    return out
+
+
+async def _results_out(
+    db: DbRunner,
+    payload: schemas.SearchRequest,
+    effective_mode: FilterMode,
+    page: PageResult,
+    cursor: Optional[Cursor],
+    settings: SettingsSnapshot,
+) -> List[schemas.SearchResultOut]:
+    # CASE 1: Don't save history; just respond
+    if not settings.save_search_history:
+        return _unsaved_out(page, cursor)
+
+    # CASE 2: Save query + results but still return "live" preview URLs
+    writer = get_history_writer()
+    if writer is not None:
+        out, entry = await _history_entry(
+            writer, payload, effective_mode, page, cursor.query_id if cursor else None
+        )
+        await writer.submit(entry)
+        query_id = entry.query_id
+    else:
+        out, query_id = await db.run(
+            _save_history,
+            payload,
+            effective_mode,
+            page,
+            cursor.query_id if cursor else None,
+        )
+    if page.next_cursor:
+        page.next_cursor.query_id = query_id
+    return out
+
+
+@router.post("", response_model=schemas.SearchResponse)
+async def perform_search(
+    payload: schemas.SearchRequest,
+    db: DbRunner = Depends(get_db_runner),
+):
+    page, effective_mode, cursor, settings = await _search_page(payload, db)
+    if page is None:
+        return schemas.SearchResponse(results=[], has_more=False)
+
+    # start moderating the thumbnails before the browser asks for them
+    if effective_mode != FilterMode.relaxed:
+        enqueue_previews(page.results, effective_mode)
+
+    out = await _results_out(db, payload, effective_mode, page, cursor, settings)
+
+    next_cursor = encode_cursor(page.next_cursor, payload.query) if page.next_cursor else None
+    return schemas.SearchResponse(
+        results=out, has_more=next_cursor is not None, next_cursor=next_cursor
+    )
+
+
+# ---------- STREAMING ----------
+
+def _ndjson_event(event: str, data: Dict) -> str:
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _verdict(
+    item: schemas.SearchResultOut, mode: FilterMode
+) -> schemas.SearchStreamImage:
+    url = image_url(item.preview_url or "")
+    if mode == FilterMode.relaxed:
+        verdict = "unmoderated"
+    elif url is None:
+        verdict = "unavailable"
+    else:
+        try:
+            verdict = "blurred" if await image_verdict(url, mode) else "clean"
+        except asyncio.CancelledError:
+            raise
+        except (ImageFetchError, ModerationUnavailable):
+            verdict = "unavailable"
+        except Exception:
+            logger.exception("Moderation of %s failed", url)
+            verdict = "unavailable"
+    return schemas.SearchStreamImage(**item.model_dump(), verdict=verdict)
+
+
+async def _stream_history(
+    db: DbRunner,
+    payload: schemas.SearchRequest,
+    effective_mode: FilterMode,
+    page: PageResult,
+    cursor: Optional[Cursor],
+    settings: SettingsSnapshot,
+) -> Tuple[List[schemas.SearchResultOut], Optional[Awaitable[None]]]:
+    """
+    The results to stream and the write-behind history submit to await once
+    they are out (None if there is nothing left to write). Result ids are
+    the history row ids, as in POST /search.
+    """
+    writer = get_history_writer()
+    if not settings.save_search_history or writer is None:
+        # history off, or the synchronous insert (which is where the ORM
+        # path gets its row ids) before anything is streamed
+        return await _results_out(db, payload, effective_mode, page, cursor, settings), None
+
+    # ids are reserved up front, so the streamed ids are the stored ones
+    query_id = cursor.query_id if cursor else None
+    out, entry = await _history_entry(writer, payload, effective_mode, page, query_id)
+    if page.next_cursor:
+        page.next_cursor.query_id = entry.query_id
+    return out, writer.submit(entry)
+
+
+async def _search_events(
+    payload: schemas.SearchRequest,
+    effective_mode: FilterMode,
+    page: Optional[PageResult],
+    out: List[schemas.SearchResultOut],
+    persist: Optional[Awaitable[None]],
+    format_event: Callable[[str, Dict], str],
+) -> AsyncIterator[str]:
+    # history is written alongside the stream, not before it; it runs on
+    # even if the client goes away
+    saved: Optional[asyncio.Future] = None
+    if persist is not None:
+        saved = asyncio.ensure_future(persist)
+        _background.add(saved)
+        saved.add_done_callback(_background.discard)
+
+    # text results right away
+    images: List[schemas.SearchResultOut] = []
+    for item in out:
+        if item.preview_url:
+            images.append(item)
+        else:
+            yield format_event("result", jsonable_encoder(item))
+
+    # image results as their moderation finishes
+    blurred = 0
+    tasks = [asyncio.ensure_future(_verdict(item, effective_mode)) for item in images]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            image = await next_done
+            blurred += image.verdict == "blurred"
+            yield format_event("image", jsonable_encoder(image))
+    finally:
+        # client went away: the thumbnails still finish into the cache
+        for t in tasks:
+            t.cancel()
+
+    if saved is not None:
+        try:
+            # the next cursor carries the history query id
+            await asyncio.shield(saved)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Saving search history failed")
+
+    next_cursor = None
+    if page is not None and page.next_cursor:
+        next_cursor = encode_cursor(page.next_cursor, payload.query)
+    summary = schemas.SearchStreamSummary(
+        total=page.total if page else 0,
+        safe=len(page.results) if page else 0,
+        blocked=page.blocked if page else 0,
+        images_blurred=blurred,
+        has_more=next_cursor is not None,
+        next_cursor=next_cursor,
+    )
+    yield format_event("summary", jsonable_encoder(summary))
+
+
+@router.post("/stream")
+async def stream_search(
+    payload: schemas.SearchRequest,
+    request: Request,
+    db: DbRunner = Depends(get_db_runner),
+):
+    """
+    Same search as POST /search, streamed as it completes:
+      - "result": a text result (SearchResultOut), as soon as it passed filtering;
+      - "image": an image result with its moderation verdict (SearchStreamImage),
+        in the order moderation finishes;
+      - "summary": counts, has_more and next_cursor (SearchStreamSummary), last.
+
+    NDJSON ({"event": ..., "data": ...} per line) by default, Server-Sent
+    Events with `Accept: text/event-stream`. The moderated thumbnails land
+    in the thumbnail cache, so the preview_url fetches that follow are hits.
+
+    Result ids are the history row ids, as in POST /search. With
+    write-behind the ids are reserved and history is saved while the stream
+    runs; the synchronous ORM path inserts before the first event.
+    """
+    page, effective_mode, cursor, settings = await _search_page(payload, db)
+
+    out: List[schemas.SearchResultOut] = []
+    persist: Optional[Awaitable[None]] = None
+    if page is not None:
+        out, persist = await _stream_history(db, payload, effective_mode, page, cursor, settings)
+    # nothing left for the session once the history is in
+    await db.close()
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        format_event, media_type = _sse_event, "text/event-stream"
+    else:
+        format_event, media_type = _ndjson_event, "application/x-ndjson"
+
+    return StreamingResponse(
+        _search_events(payload, effective_mode, page, out, persist, format_event),
+        media_type=media_type,
+        # no buffering in nginx & co, or the events arrive all at once
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,39 +3,43 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from .. import schemas
-from ..database import get_db
-from ..utils.settings import get_or_create_global_settings
+from ..database import DbRunner, get_db_runner
+from ..utils.settings import (
+    SettingsSnapshot,
+    get_cached_settings,
+    get_or_create_global_settings,
+    peek_cached_settings,
+    save_global_settings,
+)
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
 
-@router.get("", response_model=schemas.SettingsOut)
-def read_settings(db: Session = Depends(get_db)):
-    s = get_or_create_global_settings(db)
+def _to_out(s: SettingsSnapshot) -> schemas.SettingsOut:
     return schemas.SettingsOut(
         filter_mode=s.filter_mode,
         parental_controls=s.parental_controls,
         notifications=s.notifications,
         save_search_history=s.save_search_history,
-        blocked_keywords=s.blocked_keywords or "",
-        allowed_domains=s.allowed_domains or "",
+        blocked_keywords=s.blocked_keywords,
+        allowed_domains=s.allowed_domains,
+        blocked_domains=s.blocked_domains,
     )
 
 
-@router.put("", response_model=schemas.SettingsOut)
-def update_settings(payload: schemas.SettingsUpdate, db: Session = Depends(get_db)):
+def _update(db: Session, payload: schemas.SettingsUpdate) -> SettingsSnapshot:
     s = get_or_create_global_settings(db)
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(s, field, value)
-    db.add(s)
-    db.commit()
-    db.refresh(s)
 
-    return schemas.SettingsOut(
-        filter_mode=s.filter_mode,
-        parental_controls=s.parental_controls,
-        notifications=s.notifications,
-        save_search_history=s.save_search_history,
-        blocked_keywords=s.blocked_keywords or "",
-        allowed_domains=s.allowed_domains or "",
-    )
+    return save_global_settings(db, s)
+
+
+@router.get("", response_model=schemas.SettingsOut)
+async def read_settings(db: DbRunner = Depends(get_db_runner)):
+    return _to_out(peek_cached_settings() or await db.run(get_cached_settings))
+
+
+@router.put("", response_model=schemas.SettingsOut)
+async def update_settings(payload: schemas.SettingsUpdate, db: DbRunner = Depends(get_db_runner)):
+    return _to_out(await db.run(_update, payload))
@@ -1,28 +1,68 @@
 # app/routers/stats.py
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from ..database import get_db
+from ..database import DbRunner, get_db_runner
+from ..models import FilterMode
+from ..services.activity_history import (
+    InvalidHistoryCursor,
+    decode_history_cursor,
+    encode_history_cursor,
+    history_select,
+)
+from ..services.stats_rollup import ALL_TIME, bucket_start
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
+# widest range /timeseries returns per granularity
+_MAX_RANGE = {"hour": timedelta(days=31), "day": timedelta(days=366 * 2)}
+_DEFAULT_RANGE = {"hour": timedelta(hours=24), "day": timedelta(days=30)}
 
-@router.get("/overview", response_model=schemas.OverviewStats)
-def overview(db: Session = Depends(get_db)):
-    total_searches = db.query(func.count(models.SearchQuery.id)).scalar() or 0
-    blocked_content = (
-        db.query(func.coalesce(func.sum(models.SearchQuery.blocked_results), 0)).scalar()
-        or 0
-    )
-    safe_results = (
-        db.query(func.coalesce(func.sum(models.SearchQuery.safe_results), 0)).scalar()
-        or 0
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # created_at / bucket_start are naive UTC
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _scalars(db: Session, stmt) -> list:
+    return list(db.scalars(stmt).all())
+
+
+def _overview(db: Session) -> schemas.OverviewStats:
+    # all-time rollup: one row per filter mode, however long the history
+    R = models.SearchStatsRollup
+    row = (
+        db.query(
+            func.count(),
+            func.coalesce(func.sum(R.searches), 0),
+            func.coalesce(func.sum(R.blocked_results), 0),
+            func.coalesce(func.sum(R.safe_results), 0),
+        )
+        .filter(R.granularity == "all", R.bucket_start == ALL_TIME)
+        .one()
     )
 
+    if row[0]:
+        total_searches, blocked_content, safe_results = row[1], row[2], row[3]
+    else:
+        # rollups not backfilled yet (scripts/backfill_stats_rollups.py)
+        total_searches = db.query(func.count(models.SearchQuery.id)).scalar() or 0
+        blocked_content = (
+            db.query(func.coalesce(func.sum(models.SearchQuery.blocked_results), 0)).scalar()
+            or 0
+        )
+        safe_results = (
+            db.query(func.coalesce(func.sum(models.SearchQuery.safe_results), 0)).scalar()
+            or 0
+        )
+
     # simple heuristic: ~1 minute per search
     active_time_hours = round(total_searches / 60.0, 2)
 
@@ -34,22 +74,122 @@ def overview(db: Session = Depends(get_db)):
     )
 
 
-@router.get("/recent", response_model=List[schemas.ActivityItem])
-def recent(db: Session = Depends(get_db), limit: int = 10):
-    rows = (
-        db.query(models.SearchQuery)
-        .order_by(models.SearchQuery.created_at.desc())
-        .limit(limit)
-        .all()
+@router.get("/overview", response_model=schemas.OverviewStats)
+async def overview(db: DbRunner = Depends(get_db_runner)):
+    return await db.run(_overview)
+
+
+def _timeseries(
+    db: Session,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    filter_mode: Optional[FilterMode],
+) -> List[schemas.StatsBucket]:
+    R = models.SearchStatsRollup
+    q = db.query(
+        R.bucket_start,
+        func.sum(R.searches),
+        func.sum(R.total_results),
+        func.sum(R.safe_results),
+        func.sum(R.blocked_results),
+    ).filter(
+        R.granularity == granularity,
+        # include the bucket that contains `start`
+        R.bucket_start >= bucket_start(start, granularity),
+        R.bucket_start < end,
     )
+    if filter_mode is not None:
+        q = q.filter(R.filter_mode == filter_mode)
 
+    rows = q.group_by(R.bucket_start).order_by(R.bucket_start).all()
     return [
-        schemas.ActivityItem(
-            id=row.id,
-            query=row.query,
-            created_at=row.created_at,
-            safe_results=row.safe_results,
-            blocked_results=row.blocked_results,
+        schemas.StatsBucket(
+            bucket_start=row[0],
+            searches=row[1] or 0,
+            total_results=row[2] or 0,
+            safe_results=row[3] or 0,
+            blocked_results=row[4] or 0,
         )
         for row in rows
     ]
+
+
+@router.get("/timeseries", response_model=List[schemas.StatsBucket])
+async def timeseries(
+    granularity: Literal["hour", "day"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    filter_mode: Optional[FilterMode] = None,
+    db: DbRunner = Depends(get_db_runner),
+):
+    """
+    Search counts per hour/day bucket in [start, end) (UTC), from the
+    rollups. Buckets without searches are omitted. Defaults to the last
+    24 hours (hourly) or 30 days (daily).
+    """
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - _DEFAULT_RANGE[granularity]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > _MAX_RANGE[granularity]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for granularity={granularity}",
+        )
+
+    return await db.run(_timeseries, granularity, start, end, filter_mode)
+
+
+def _activity_item(row: models.SearchQuery) -> schemas.ActivityItem:
+    return schemas.ActivityItem(
+        id=row.id,
+        query=row.query,
+        created_at=row.created_at,
+        safe_results=row.safe_results,
+        blocked_results=row.blocked_results,
+        filter_mode=row.filter_mode,
+    )
+
+
+@router.get("/recent", response_model=List[schemas.ActivityItem])
+async def recent(db: DbRunner = Depends(get_db_runner), limit: int = 10):
+    rows = await db.run(_scalars, history_select(limit))
+    return [_activity_item(row) for row in rows]
+
+
+@router.get("/history", response_model=schemas.HistoryPage)
+async def history(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    filter_mode: Optional[FilterMode] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: DbRunner = Depends(get_db_runner),
+):
+    """
+    Search history, newest first, with keyset pagination: pass the returned
+    next_cursor to get the following (older) page. Filters: filter_mode and
+    a created_at range [start, end).
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_history_cursor(cursor)
+        except InvalidHistoryCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # one extra row tells us whether there is a next page
+    rows = await db.run(
+        _scalars,
+        history_select(limit + 1, after, filter_mode, _naive_utc(start), _naive_utc(end)),
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1].created_at, rows[-1].id)
+
+    return schemas.HistoryPage(
+        items=[_activity_item(row) for row in rows], next_cursor=next_cursor
+    )
@@ -11,6 +11,8 @@ class SearchRequest(BaseModel):
     query: str
     filter_mode: Optional[FilterMode] = None
     limit: int = 10
+    # opaque, from a previous response's next_cursor
+    cursor: Optional[str] = None
 
 
 class SearchResultOut(BaseModel):
@@ -32,6 +34,24 @@ class SearchResultOut(BaseModel):
 class SearchResponse(BaseModel):
     results: List[SearchResultOut]
     has_more: bool
+    next_cursor: Optional[str] = None
+
+
+# ---------- /search/stream events ----------
+
+class SearchStreamImage(SearchResultOut):
+    # "blurred" / "clean"; "unmoderated" in relaxed mode;
+    # "unavailable" if the image could not be fetched
+    verdict: str
+
+
+class SearchStreamSummary(BaseModel):
+    total: int
+    safe: int
+    blocked: int
+    images_blurred: int
+    has_more: bool
+    next_cursor: Optional[str] = None
 
 
 class SettingsOut(BaseModel):
@@ -41,6 +61,7 @@ class SettingsOut(BaseModel):
     save_search_history: bool
     blocked_keywords: str
     allowed_domains: str
+    blocked_domains: str
 
 
 class SettingsUpdate(BaseModel):
@@ -50,6 +71,7 @@ class SettingsUpdate(BaseModel):
     save_search_history: Optional[bool] = None
     blocked_keywords: Optional[str] = None
     allowed_domains: Optional[str] = None
+    blocked_domains: Optional[str] = None
 
 
 class OverviewStats(BaseModel):
@@ -59,9 +81,24 @@ class OverviewStats(BaseModel):
     active_time_hours: float
 
 
+class StatsBucket(BaseModel):
+    bucket_start: datetime
+    searches: int
+    total_results: int
+    safe_results: int
+    blocked_results: int
+
+
 class ActivityItem(BaseModel):
     id: int
     query: str
     created_at: datetime
     safe_results: int
     blocked_results: int
+    filter_mode: Optional[FilterMode] = None
+
+
+class HistoryPage(BaseModel):
+    items: List[ActivityItem]
+    # pass back as ?cursor= for the next (older) page
+    next_cursor: Optional[str] = None
@@ -0,0 +1,59 @@
+# app/services/activity_history.py
+"""
+Keyset pagination over search_queries, newest first.
+
+The cursor is the (created_at, id) of the last row returned; the next page
+is everything strictly before it in (created_at DESC, id DESC) order, which
+ix_search_queries_created_at_id (or the filter_mode variant) serves
+directly, no OFFSET scan however deep the client pages.
+"""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import Select, select, tuple_
+
+from .. import models
+from ..models import FilterMode
+
+
+class InvalidHistoryCursor(ValueError):
+    pass
+
+
+def encode_history_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(token: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidHistoryCursor("Malformed cursor")
+
+
+def history_select(
+    limit: int,
+    after: Optional[Tuple[datetime, int]] = None,
+    filter_mode: Optional[FilterMode] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Select:
+    """
+    One page of search_queries in [start, end), strictly after `after`.
+    """
+    Q = models.SearchQuery
+    stmt = select(Q)
+    if filter_mode is not None:
+        stmt = stmt.where(Q.filter_mode == filter_mode)
+    if start is not None:
+        stmt = stmt.where(Q.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(Q.created_at < end)
+    if after is not None:
+        # row comparison, so the index range scan starts right at the cursor
+        stmt = stmt.where(tuple_(Q.created_at, Q.id) < tuple_(*after))
+    return stmt.order_by(Q.created_at.desc(), Q.id.desc()).limit(limit)
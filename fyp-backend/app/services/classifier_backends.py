@@ -0,0 +1,119 @@
+# app/services/classifier_backends.py
+"""
+Pluggable inference backends for the Falconsai/nsfw_image_detection classifier.
+
+  - "torch": the original full-precision PyTorch model
+  - "onnx":  ONNX Runtime on CPU, typically the dynamically int8-quantized
+             export produced by scripts/export_classifier_onnx.py
+
+Both share the same ViT preprocessing and return one NSFW probability per image.
+Heavy libraries are imported inside the backends, so only the selected one loads.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from ..config import settings
+
+MODEL_ID = "Falconsai/nsfw_image_detection"
+
+
+def nsfw_label_index(id2label: Dict) -> Optional[int]:
+    # Find which index corresponds to "nsfw"
+    # model.config.id2label might be e.g. {0: 'DRAWINGS', 1: 'HENTAI', ...}
+    for idx, lab in id2label.items():
+        if lab.lower().startswith("nsfw") or lab.lower() == "nsfw":
+            return int(idx)
+    return None
+
+
+def _nsfw_scores(probs: np.ndarray, nsfw_idx: Optional[int]) -> List[float]:
+    scores: List[float] = []
+    for row in probs:
+        # Fallback: assume class with highest probability,
+        # but ideally this branch never hits.
+        idx = nsfw_idx if nsfw_idx is not None else int(row.argmax())
+        scores.append(float(row[idx]))
+    return scores
+
+
+class ClassifierBackend:
+    name = "base"
+
+    def predict(self, images: List[Image.Image]) -> List[float]:
+        """
+        NSFW probability for each RGB image, computed in a single forward pass.
+        """
+        raise NotImplementedError
+
+
+class TorchClassifierBackend(ClassifierBackend):
+    name = "torch"
+
+    def __init__(self, model_id: str = MODEL_ID, device: str = "cpu"):
+        import torch
+        from transformers import AutoModelForImageClassification, ViTImageProcessor
+
+        if settings.MODERATION_TORCH_THREADS > 0:
+            # keep torch's intra-op pool from competing with request threads
+            torch.set_num_threads(settings.MODERATION_TORCH_THREADS)
+
+        self._torch = torch
+        self.device = device
+        self.model = AutoModelForImageClassification.from_pretrained(model_id).to(device)
+        self.model.eval()
+        self.processor = ViTImageProcessor.from_pretrained(model_id)
+        self.nsfw_idx = nsfw_label_index(self.model.config.id2label)
+
+    def predict(self, images: List[Image.Image]) -> List[float]:
+        torch = self._torch
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            logits = outputs.logits  # shape [N, 2] -> [normal, nsfw] or similar
+
+        probs = torch.nn.functional.softmax(logits, dim=-1).cpu().numpy()
+        return _nsfw_scores(probs, self.nsfw_idx)
+
+
+class OnnxClassifierBackend(ClassifierBackend):
+    name = "onnx"
+
+    def __init__(self, model_path: str, model_id: str = MODEL_ID):
+        import onnxruntime as ort
+        from transformers import AutoConfig, ViTImageProcessor
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.MODERATION_TORCH_THREADS > 0:
+            options.intra_op_num_threads = settings.MODERATION_TORCH_THREADS
+
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.processor = ViTImageProcessor.from_pretrained(model_id)
+        self.nsfw_idx = nsfw_label_index(AutoConfig.from_pretrained(model_id).id2label)
+
+    def predict(self, images: List[Image.Image]) -> List[float]:
+        inputs = self.processor(images=images, return_tensors="np")
+        (logits,) = self.session.run(None, {self.input_name: inputs["pixel_values"]})
+
+        # softmax
+        shifted = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(shifted)
+        probs = exp / exp.sum(axis=-1, keepdims=True)
+        return _nsfw_scores(probs, self.nsfw_idx)
+
+
+def create_backend(name: Optional[str] = None) -> ClassifierBackend:
+    name = (name or settings.CLASSIFIER_BACKEND).lower()
+    if name == "onnx":
+        return OnnxClassifierBackend(settings.CLASSIFIER_ONNX_PATH)
+    if name == "torch":
+        return TorchClassifierBackend()
+    raise ValueError(f"Unknown CLASSIFIER_BACKEND: {name!r} (expected 'torch' or 'onnx')")
@@ -0,0 +1,268 @@
+# app/services/domain_policy.py
+"""
+Domain allow/block lists matched by suffix: the entry "example.org" covers
+example.org and all of its subdomains (www.example.org, a.b.example.org).
+
+Host names are compared as reversed label sequences (org, example, www), so
+"covers" means "is a label prefix of". Two representations:
+
+- DomainTrie: nested dicts of labels, for the admin's short lists in
+  global_settings (allowed_domains / blocked_domains).
+- MappedDomainList: a sorted file of reversed names written by
+  scripts/import_domain_list.py, for bulk lists with hundreds of thousands
+  of entries. It is mmap'ed read-only and searched by bisection, so all
+  workers on a host share one copy in the page cache and nothing is loaded
+  into Python objects.
+
+A host matching both an allow and a block entry gets the more specific
+(longer) entry's verdict; a tie goes to the block entry. With a non-empty
+allowlist, hosts matching no allow entry are blocked.
+
+File format (little endian):
+    magic    8 bytes   b"NSDOMS01"
+    count    uint32
+    offsets  (count + 1) x uint32, into the names blob
+    names    reversed names ("org.example.www"), ASCII, sorted bytewise
+"""
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NSDOMS01"
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<I")
+_SPAN = struct.Struct("<II")
+
+_LABEL_RE = re.compile(r"^[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?$")
+
+
+def normalize_domain(name: str) -> Optional[str]:
+    """
+    Lower-case ASCII (IDNA) form of a domain list entry, or None if it isn't
+    a usable name. Leading "*." / "." and a trailing dot are ignored.
+    """
+    name = name.strip().lower().rstrip(".")
+    if name.startswith("*."):
+        name = name[2:]
+    name = name.lstrip(".")
+    if not name:
+        return None
+    try:
+        name = name.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+    if len(name) > 253:
+        return None
+    if not all(_LABEL_RE.match(label) for label in name.split(".")):
+        return None
+    return name
+
+
+def host_labels(host: str) -> List[str]:
+    """
+    Reversed labels of a host name: "www.example.org" -> [org, example, www].
+    """
+    host = host.strip().lower().rstrip(".")
+    if not host:
+        return []
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            pass
+    return host.split(".")[::-1]
+
+
+def _reversed_key(name: str) -> str:
+    return ".".join(name.split(".")[::-1])
+
+
+# ---------- IN MEMORY ----------
+
+# marks a listed name inside a trie node (labels are never empty)
+_END = ""
+
+
+class DomainTrie:
+    def __init__(self, names: Iterable[str] = ()):
+        self._root: Dict[str, dict] = {}
+        self._size = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, name: str) -> None:
+        normalized = normalize_domain(name)
+        if normalized is None:
+            return
+        node = self._root
+        for label in normalized.split(".")[::-1]:
+            node = node.setdefault(label, {})
+        if _END not in node:
+            node[_END] = {}
+            self._size += 1
+
+    def longest_match(self, labels: Sequence[str]) -> int:
+        """
+        Number of labels of the longest listed suffix of the host (0: none).
+        """
+        node = self._root
+        best = 0
+        for depth, label in enumerate(labels, start=1):
+            node = node.get(label)
+            if node is None:
+                break
+            if _END in node:
+                best = depth
+        return best
+
+
+# ---------- ON DISK ----------
+
+def write_domain_list(names: Iterable[str], path: str) -> int:
+    """
+    Write normalized, de-duplicated names to `path` (atomically). Names
+    covered by a shorter entry are dropped. Returns the number written.
+    """
+    keys = sorted({_reversed_key(n) for n in (normalize_domain(x) for x in names) if n})
+
+    kept: List[bytes] = []
+    seen = set()
+    for key in keys:
+        labels = key.split(".")
+        # a parent domain in the list already covers this one
+        if any(".".join(labels[:depth]) in seen for depth in range(1, len(labels))):
+            continue
+        seen.add(key)
+        kept.append(key.encode("ascii"))
+
+    offsets = [0]
+    for key in kept:
+        offsets.append(offsets[-1] + len(key))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(kept)))
+            f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+            f.write(b"".join(kept))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(kept)
+
+
+class MappedDomainList:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size + _OFFSET.size:
+                raise ValueError(f"{path}: not a domain list")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a domain list")
+        self._offsets_at = _HEADER.size
+        self._names_at = self._offsets_at + _OFFSET.size * (self._count + 1)
+        # hosts repeat a lot across searches
+        self.longest_match = lru_cache(maxsize=8192)(self._longest_match)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _key(self, i: int) -> bytes:
+        start, end = _SPAN.unpack_from(self._mm, self._offsets_at + _OFFSET.size * i)
+        return self._mm[self._names_at + start : self._names_at + end]
+
+    def __contains__(self, key: bytes) -> bool:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self._count and self._key(lo) == key
+
+    def _longest_match(self, labels: Tuple[str, ...]) -> int:
+        for depth in range(len(labels), 0, -1):
+            if ".".join(labels[:depth]).encode("ascii", "replace") in self:
+                return depth
+        return 0
+
+
+_loaded: Dict[str, Tuple[Tuple[int, int, int], Optional[MappedDomainList], float]] = {}
+_loaded_lock = threading.Lock()
+
+
+def get_domain_list(path: str) -> Optional[MappedDomainList]:
+    """
+    The mapped list at `path`, re-opened when the file is replaced (checked
+    every DOMAIN_LIST_RELOAD_SECONDS). None if `path` is empty or unusable.
+    """
+    if not path:
+        return None
+    now = time.monotonic()
+    entry = _loaded.get(path)
+    if entry is not None and now - entry[2] < settings.DOMAIN_LIST_RELOAD_SECONDS:
+        return entry[1]
+
+    with _loaded_lock:
+        entry = _loaded.get(path)
+        try:
+            st = os.stat(path)
+            stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            if entry is None or entry[1] is not None:
+                logger.warning("Domain list %s not found", path)
+            _loaded[path] = ((0, 0, 0), None, now)
+            return None
+
+        current = entry[1] if entry is not None and entry[0] == stamp else None
+        if current is None:
+            try:
+                current = MappedDomainList(path)
+                logger.info("Loaded domain list %s (%d entries)", path, len(current))
+            except (OSError, ValueError):
+                logger.exception("Loading domain list %s failed", path)
+                current = entry[1] if entry is not None else None
+        _loaded[path] = (stamp, current, now)
+        return current
+
+
+# ---------- POLICY ----------
+
+class DomainPolicy:
+    def __init__(self, allow: Sequence, block: Sequence):
+        self.allow = [s for s in allow if s is not None and len(s)]
+        self.block = [s for s in block if s is not None and len(s)]
+
+    def blocks(self, host: str) -> bool:
+        if not self.allow and not self.block:
+            return False
+        labels = tuple(host_labels(host))
+        allowed = max((s.longest_match(labels) for s in self.allow), default=0)
+        blocked = max((s.longest_match(labels) for s in self.block), default=0)
+        if blocked and blocked >= allowed:
+            return True
+        return bool(self.allow) and not allowed
@@ -1,8 +1,12 @@
 # app/services/filtering.py
+from functools import lru_cache
 from typing import Dict, List, Tuple
 from urllib.parse import urlparse
 
+from ..config import settings
 from ..models import FilterMode, ResultType
+from .domain_policy import DomainPolicy, DomainTrie, get_domain_list
+from .keyword_matcher import KeywordMatcher, get_matcher
 
 
 # Very simple keyword lists – you can extend these
@@ -22,8 +26,8 @@ def get_base_keywords(mode: FilterMode) -> set[str]:
 
 
 def text_contains_banned(text: str, banned: set[str]) -> bool:
-    lowered = text.lower()
-    return any(word in lowered for word in banned)
+    matcher = get_matcher(frozenset(banned), settings.KEYWORD_MATCH_WORD_BOUNDARY)
+    return matcher.contains(text)
 
 
 def parse_csv(text: str) -> List[str]:
@@ -32,35 +36,103 @@ def parse_csv(text: str) -> List[str]:
     return [x.strip().lower() for x in text.split(",") if x.strip()]
 
 
+@lru_cache(maxsize=16)
+def get_banned_matcher(filter_mode: FilterMode, blocked_keywords: str) -> KeywordMatcher:
+    """
+    Base keywords for the mode + admin keywords, compiled once per
+    (mode, blocked_keywords) pair instead of re-parsed on every request.
+    """
+    banned = get_base_keywords(filter_mode).union(parse_csv(blocked_keywords))
+    return get_matcher(frozenset(banned), settings.KEYWORD_MATCH_WORD_BOUNDARY)
+
+
+@lru_cache(maxsize=16)
+def get_domain_trie(domains: str) -> DomainTrie:
+    # "example.org" also covers www.example.org etc.
+    return DomainTrie(parse_csv(domains))
+
+
+class FilterPolicy:
+    """
+    Pre-parsed filter inputs for one filter mode: the compiled banned-keyword
+    matcher and the admin's allowed / blocked domain tries. Built once per
+    settings version.
+    """
+
+    def __init__(
+        self,
+        matcher: KeywordMatcher,
+        allowed: DomainTrie,
+        blocked: DomainTrie,
+        filter_mode: FilterMode,
+    ):
+        self.matcher = matcher
+        self.allowed = allowed
+        self.blocked = blocked
+        self.filter_mode = filter_mode
+
+    def domains(self) -> DomainPolicy:
+        """
+        Admin lists plus the bulk lists (DOMAIN_*LIST_PATH) if they apply to
+        this mode. The bulk files are looked up on every call so a replaced
+        file is picked up without a settings change.
+        """
+        allow, block = [self.allowed], [self.blocked]
+        if self.filter_mode.value in parse_csv(settings.DOMAIN_LIST_MODES):
+            allow.append(get_domain_list(settings.DOMAIN_ALLOWLIST_PATH))
+            block.append(get_domain_list(settings.DOMAIN_BLOCKLIST_PATH))
+        return DomainPolicy(allow, block)
+
+
+def build_policy(
+    filter_mode: FilterMode,
+    blocked_keywords: str,
+    allowed_domains: str,
+    blocked_domains: str = "",
+) -> FilterPolicy:
+    return FilterPolicy(
+        matcher=get_banned_matcher(filter_mode, blocked_keywords or ""),
+        allowed=get_domain_trie(allowed_domains or ""),
+        blocked=get_domain_trie(blocked_domains or ""),
+        filter_mode=filter_mode,
+    )
+
+
 def filter_results(
     raw_results: List[Dict],
     filter_mode: FilterMode,
     blocked_keywords: str,
     allowed_domains: str,
+    blocked_domains: str = "",
 ) -> Tuple[List[Dict], int]:
-    base_keywords = get_base_keywords(filter_mode)
-    extra_blocked = set(parse_csv(blocked_keywords))
-    banned = base_keywords.union(extra_blocked)
+    policy = build_policy(filter_mode, blocked_keywords, allowed_domains, blocked_domains)
+    return filter_with_policy(raw_results, policy)
 
-    allowed = set(parse_csv(allowed_domains))
 
-    filtered: List[Dict] = []
+def filter_with_policy(raw_results: List[Dict], policy: FilterPolicy) -> Tuple[List[Dict], int]:
+    domains = policy.domains()
+
+    candidates: List[Dict] = []
     blocked_count = 0
 
     for r in raw_results:
-        url = r["url"]
-        text = f"{r['title']} {r['snippet']}"
-        domain = (urlparse(url).hostname or "").lower()
+        domain = urlparse(r["url"]).hostname or ""
 
-        # If allowed_domains defined, only allow those
-        if allowed and domain not in allowed:
+        # allow/block lists by domain suffix; with an allowlist, only those
+        if domains.blocks(domain):
             blocked_count += 1
             continue
 
-        if text_contains_banned(text, banned):
+        candidates.append(r)
+
+    # title + snippet of the whole batch in a single automaton pass
+    hits = policy.matcher.match_many([f"{r['title']} {r['snippet']}" for r in candidates])
+
+    filtered: List[Dict] = []
+    for r, banned in zip(candidates, hits):
+        if banned:
             blocked_count += 1
             continue
-
         filtered.append(r)
 
     return filtered, blocked_count
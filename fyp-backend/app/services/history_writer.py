@@ -0,0 +1,402 @@
+# app/services/history_writer.py
+"""
+Write-behind persistence of search history.
+
+perform_search reserves ids up front, hands the rows to a bounded queue and
+answers right away. A writer thread drains the queue in batches (size or
+time trigger) and writes each batch in one transaction with bulk
+executemany INSERTs, instead of an ORM flush/commit/refresh per search.
+
+Ids stay stable because they are taken from the tables' own Postgres
+sequences, preallocated in blocks (one nextval round trip per block), so
+what the client sees is exactly what lands in the table.
+
+HISTORY_DURABILITY:
+  - "buffered":     respond once queued; a crash can lose the last batch
+  - "group_commit": wait until the batch holding the entry has committed
+                    (still one transaction per batch, not per request); an
+                    entry that fails is logged and counted, the search
+                    still succeeds
+
+HISTORY_QUEUE_FULL (backpressure once HISTORY_QUEUE_SIZE entries wait):
+  - "block": wait up to HISTORY_ENQUEUE_TIMEOUT for room, then drop
+  - "drop":  drop the entry (counted in netsentinel_history_entries_total)
+  - "sync":  write the entry in the request (threadpool) instead
+
+Only Postgres is supported; other databases keep the synchronous ORM path.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, insert, select, text, update
+from sqlalchemy.engine import Engine
+
+from .. import models
+from ..config import settings
+from ..models import FilterMode
+from ..utils.metrics import STAGE_SECONDS, counter, histogram
+from .stats_rollup import RollupAccumulator, apply_rollups
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ENTRIES = counter(
+    "netsentinel_history_entries_total",
+    "Search history entries by outcome (written, dropped, failed).",
+    labelnames=("result",),
+)
+HISTORY_BATCH_SIZE = histogram(
+    "netsentinel_history_batch_size",
+    "Search history entries per write-behind batch.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+HISTORY_FLUSH_SECONDS = histogram(
+    "netsentinel_history_flush_seconds",
+    "Time to write one write-behind batch.",
+)
+
+
+@dataclass
+class HistoryEntry:
+    query_id: int
+    # False: follow-up page, add the counts to the existing query row
+    new_query: bool
+    query: str
+    filter_mode: FilterMode
+    created_at: datetime
+    total_results: int
+    safe_results: int
+    blocked_results: int
+    # search_results rows, ids already assigned
+    results: List[Dict] = field(default_factory=list)
+    done: Optional[Future] = None
+
+
+def _query_row(e: HistoryEntry) -> Dict:
+    return {
+        "id": e.query_id,
+        "query": e.query,
+        "filter_mode": e.filter_mode,
+        "created_at": e.created_at,
+        "total_results": e.total_results,
+        "safe_results": e.safe_results,
+        "blocked_results": e.blocked_results,
+    }
+
+
+class IdAllocator:
+    """
+    Hands out ids from a Postgres sequence, fetched in blocks.
+    """
+
+    def __init__(self, engine: Engine, table: str, block_size: int):
+        self.engine = engine
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._ids: List[int] = []
+        with engine.connect() as conn:
+            self.sequence = conn.execute(
+                text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}
+            ).scalar_one()
+
+    def take_nowait(self, n: int) -> Optional[List[int]]:
+        """
+        Ids from the current block, or None if that would mean waiting: for
+        the event loop, where take() may hold the lock during a round trip.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if len(self._ids) < n:
+                return None
+            taken, self._ids = self._ids[:n], self._ids[n:]
+            return taken
+        finally:
+            self._lock.release()
+
+    def take(self, n: int) -> List[int]:
+        with self._lock:
+            if len(self._ids) < n:
+                with self.engine.connect() as conn:
+                    self._ids.extend(
+                        conn.execute(
+                            text("SELECT nextval(:seq) FROM generate_series(1, :n)"),
+                            {"seq": self.sequence, "n": max(n - len(self._ids), self.block_size)},
+                        ).scalars()
+                    )
+            taken, self._ids = self._ids[:n], self._ids[n:]
+            return taken
+
+
+class HistoryWriter:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.batch_size = max(1, settings.HISTORY_BATCH_SIZE)
+        self.flush_interval = max(0.0, settings.HISTORY_FLUSH_INTERVAL_MS) / 1000.0
+        self.durability = settings.HISTORY_DURABILITY.lower()
+        self.on_full = settings.HISTORY_QUEUE_FULL.lower()
+
+        self.query_ids = IdAllocator(engine, "search_queries", settings.HISTORY_ID_BLOCK_SIZE)
+        self.result_ids = IdAllocator(
+            engine, "search_results", settings.HISTORY_ID_BLOCK_SIZE * 10
+        )
+
+        self._queue: "queue.Queue[Optional[HistoryEntry]]" = queue.Queue(
+            maxsize=max(1, settings.HISTORY_QUEUE_SIZE)
+        )
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- REQUEST SIDE ----------
+
+    async def reserve_ids(
+        self, new_query: bool, n_results: int
+    ) -> Tuple[Optional[int], List[int]]:
+        async def _take(allocator: IdAllocator, n: int) -> List[int]:
+            ids = allocator.take_nowait(n)
+            if ids is None:
+                # block used up: one round trip for the next one
+                ids = await run_in_threadpool(allocator.take, n)
+            return ids
+
+        query_id = (await _take(self.query_ids, 1))[0] if new_query else None
+        result_ids = await _take(self.result_ids, n_results) if n_results else []
+        return query_id, result_ids
+
+    async def submit(self, entry: HistoryEntry) -> None:
+        if self.durability == "group_commit":
+            entry.done = Future()
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.on_full == "sync":
+                try:
+                    await run_in_threadpool(self._write_one, entry)
+                except Exception:
+                    # the search itself succeeded, don't turn it into a 500
+                    logger.exception("History entry for query %d failed", entry.query_id)
+                    HISTORY_ENTRIES.inc(result="failed")
+                return
+            if self.on_full != "block" or not await self._put_blocking(entry):
+                logger.warning("History queue full, dropping entry for query %d", entry.query_id)
+                HISTORY_ENTRIES.inc(result="dropped")
+                return
+
+        if entry.done is not None:
+            try:
+                await asyncio.wrap_future(entry.done)
+            except Exception:
+                # already logged and counted by the writer thread; as with
+                # "sync", a failed write doesn't turn the search into a 500
+                pass
+
+    async def _put_blocking(self, entry: HistoryEntry) -> bool:
+        try:
+            await run_in_threadpool(
+                self._queue.put, entry, True, settings.HISTORY_ENQUEUE_TIMEOUT
+            )
+            return True
+        except queue.Full:
+            return False
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Write out everything still queued, then stop the thread.
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # ---------- WRITER THREAD ----------
+
+    def _collect(self) -> Tuple[List[HistoryEntry], bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+
+            HISTORY_BATCH_SIZE.observe(len(batch))
+            started = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception:
+                # one bad entry (e.g. a stale cursor's query id) must not
+                # take the whole batch down: retry them one by one
+                logger.exception("History batch of %d failed, retrying singly", len(batch))
+                for entry in batch:
+                    try:
+                        self._write_one(entry)
+                    except Exception as exc:
+                        logger.exception("History entry for query %d failed", entry.query_id)
+                        HISTORY_ENTRIES.inc(result="failed")
+                        if entry.done is not None:
+                            entry.done.set_exception(exc)
+                continue
+            HISTORY_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+            HISTORY_ENTRIES.inc(len(batch), result="written")
+            for entry in batch:
+                if entry.done is not None:
+                    entry.done.set_result(None)
+
+    def _write_one(self, entry: HistoryEntry) -> None:
+        self._write([entry])
+        HISTORY_ENTRIES.inc(result="written")
+        if entry.done is not None and not entry.done.done():
+            entry.done.set_result(None)
+
+    def _owned(self, conn, batch: List[HistoryEntry]) -> List[HistoryEntry]:
+        """
+        The batch with follow-up pages checked against their query row, as
+        _save_history does: the query id comes from the client's cursor, so
+        a page whose row is missing or holds another query is written as a
+        new query instead of being attached to it. Attached pages take the
+        row's created_at and filter_mode, which is where they are rolled up.
+        """
+        follow_ups = {e.query_id for e in batch if not e.new_query}
+        if not follow_ups:
+            return batch
+        q = models.SearchQuery.__table__
+        owners = {
+            row.id: row
+            for row in conn.execute(
+                select(q.c.id, q.c.query, q.c.created_at, q.c.filter_mode).where(
+                    q.c.id.in_(follow_ups)
+                )
+            )
+        }
+
+        checked: List[HistoryEntry] = []
+        for e in batch:
+            owner = owners.get(e.query_id)
+            if not e.new_query and owner is not None and owner.query == e.query:
+                e = replace(e, created_at=owner.created_at, filter_mode=owner.filter_mode)
+            elif not e.new_query:
+                new_id = self.query_ids.take(1)[0]
+                logger.warning(
+                    "History page for query %d doesn't match its query, stored as %d",
+                    e.query_id,
+                    new_id,
+                )
+                e = replace(
+                    e,
+                    query_id=new_id,
+                    new_query=True,
+                    results=[{**row, "query_id": new_id} for row in e.results],
+                )
+            checked.append(e)
+        return checked
+
+    def _write(self, batch: List[HistoryEntry]) -> None:
+        q = models.SearchQuery.__table__
+        # observed once per batch (the sync path: once per request)
+        with STAGE_SECONDS.timer(stage="db_commit"), self.engine.begin() as conn:
+            queries = [_query_row(e) for e in batch if e.new_query]
+            if queries:
+                conn.execute(insert(q), queries)
+
+            # first pages are in now, follow-ups in the same batch find them
+            checked = self._owned(conn, batch)
+            moved = [
+                _query_row(e)
+                for e, orig in zip(checked, batch)
+                if e.new_query and not orig.new_query
+            ]
+            if moved:
+                conn.execute(insert(q), moved)
+
+            increments = [
+                {
+                    "b_id": e.query_id,
+                    "b_total": e.total_results,
+                    "b_safe": e.safe_results,
+                    "b_blocked": e.blocked_results,
+                }
+                for e in checked
+                if not e.new_query
+            ]
+            results = [row for e in checked for row in e.results]
+
+            rollups = RollupAccumulator()
+            for e in checked:
+                rollups.add(
+                    e.created_at,
+                    e.filter_mode,
+                    1 if e.new_query else 0,
+                    e.total_results,
+                    e.safe_results,
+                    e.blocked_results,
+                )
+
+            if results:
+                conn.execute(insert(models.SearchResult.__table__), results)
+            if increments:
+                conn.execute(
+                    update(q)
+                    .where(q.c.id == bindparam("b_id"))
+                    .values(
+                        total_results=q.c.total_results + bindparam("b_total"),
+                        safe_results=q.c.safe_results + bindparam("b_safe"),
+                        blocked_results=q.c.blocked_results + bindparam("b_blocked"),
+                    ),
+                    increments,
+                )
+            apply_rollups(conn, rollups)
+
+
+_writer: Optional[HistoryWriter] = None
+
+
+def start_history_writer(engine: Engine) -> None:
+    global _writer
+    if not settings.HISTORY_WRITE_BEHIND:
+        return
+    if engine.dialect.name != "postgresql":
+        logger.info("History write-behind needs Postgres sequences, writing synchronously")
+        return
+    try:
+        _writer = HistoryWriter(engine)
+    except Exception:
+        logger.exception("History writer disabled, writing synchronously")
+        _writer = None
+
+
+def stop_history_writer() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.close(timeout=10.0)
+        _writer = None
+
+
+def get_history_writer() -> Optional[HistoryWriter]:
+    return _writer
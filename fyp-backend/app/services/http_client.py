@@ -0,0 +1,42 @@
+# app/services/http_client.py
+"""
+Shared async HTTP client: one connection pool per worker, with keep-alive,
+so outbound calls reuse TCP/TLS connections instead of opening new ones.
+"""
+from typing import Optional
+
+import httpx
+
+from ..config import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+USER_AGENT = "NetSentinelSafeSearch/1.0 (student project; contact: youremail@example.com)"
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30.0,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                read=settings.HTTP_READ_TIMEOUT,
+                write=settings.HTTP_READ_TIMEOUT,
+                pool=settings.HTTP_CONNECT_TIMEOUT,
+            ),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,125 @@
+# app/services/image_fetch.py
+"""
+Streaming image download for the media proxy.
+
+Uses the shared pooled client, caps the body at IMAGE_FETCH_MAX_BYTES and
+limits how many downloads run at once against a single upstream host, so a
+slow image host can only tie up its own slots. Redirects are followed here,
+not by the client, so the target host's limit applies to them too.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from ..config import settings
+from ..utils.metrics import STAGE_SECONDS
+from .http_client import get_http_client
+
+
+class ImageFetchError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class FetchedImage:
+    def __init__(self, content: bytes, content_type: str):
+        self.content = content
+        self.content_type = content_type
+
+
+# redirects followed per download; each hop takes a slot on its own host
+_MAX_REDIRECTS = 5
+
+
+class _HostLimit:
+    def __init__(self, limit: int):
+        self.sem = asyncio.Semaphore(limit)
+        # downloads holding or waiting for a slot
+        self.users = 0
+
+
+_host_limits: Dict[str, _HostLimit] = {}
+
+
+@asynccontextmanager
+async def _host_slot(host: str) -> AsyncIterator[None]:
+    limit = _host_limits.get(host)
+    if limit is None:
+        if len(_host_limits) > 4096:
+            # forget hosts nobody is using so the dict doesn't grow forever
+            for name, other in list(_host_limits.items()):
+                if other.users == 0:
+                    del _host_limits[name]
+        limit = _HostLimit(settings.IMAGE_FETCH_PER_HOST_LIMIT)
+        _host_limits[host] = limit
+
+    limit.users += 1
+    try:
+        try:
+            await asyncio.wait_for(
+                limit.sem.acquire(), timeout=settings.IMAGE_FETCH_QUEUE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise ImageFetchError(503, "Image host busy, try again later")
+        try:
+            yield
+        finally:
+            limit.sem.release()
+    finally:
+        limit.users -= 1
+
+
+async def _download(url: str) -> Tuple[Optional[FetchedImage], Optional[str]]:
+    """
+    One hop: the image, or the URL a redirect points to.
+    """
+    client = get_http_client()
+    max_bytes = settings.IMAGE_FETCH_MAX_BYTES
+
+    async with client.stream("GET", url, follow_redirects=False) as resp:
+        if resp.next_request is not None:
+            return None, str(resp.next_request.url)
+
+        if resp.status_code != 200:
+            raise ImageFetchError(404, "Image not found")
+
+        content_type = resp.headers.get("content-type", "")
+        if not content_type.startswith("image/"):
+            raise ImageFetchError(400, "URL does not point to an image")
+
+        declared = resp.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ImageFetchError(413, "Remote image too large")
+
+        body = bytearray()
+        async for chunk in resp.aiter_bytes():
+            body += chunk
+            if len(body) > max_bytes:
+                raise ImageFetchError(413, "Remote image too large")
+
+    return FetchedImage(bytes(body), content_type), None
+
+
+async def fetch_image(url: str) -> FetchedImage:
+    for _ in range(_MAX_REDIRECTS + 1):
+        host = (urlsplit(url).hostname or "").lower()
+        async with _host_slot(host):
+            try:
+                # connect/read timeouts come from the client; this bounds
+                # slow-drip bodies
+                with STAGE_SECONDS.timer(stage="image_download"):
+                    fetched, url = await asyncio.wait_for(
+                        _download(url), timeout=settings.IMAGE_FETCH_TOTAL_TIMEOUT
+                    )
+            except asyncio.TimeoutError:
+                raise ImageFetchError(504, "Timed out fetching remote image")
+            except httpx.HTTPError:
+                raise ImageFetchError(502, "Failed to fetch remote image")
+        if fetched is not None:
+            return fetched
+    raise ImageFetchError(502, "Too many redirects fetching remote image")
@@ -1,25 +1,45 @@
 # app/services/image_moderation.py
 from __future__ import annotations
 
+import logging
 from io import BytesIO
-from typing import Tuple, Optional
+from typing import TYPE_CHECKING, List, Tuple, Optional, Union
 
 from PIL import Image, ImageFilter
-from nudenet import NudeDetector
 
-import torch
-from torch.nn import functional as F
-from transformers import AutoModelForImageClassification, ViTImageProcessor
+from ..config import settings
+from ..models import FilterMode
+from ..utils.metrics import STAGE_SECONDS, counter
+from .classifier_backends import ClassifierBackend, create_backend
+from .image_pipeline import DecodedImage, as_decoded
+from .inference_batcher import MicroBatcher
+from .moderation_cache import ModerationScores, content_key, get_score_cache
+from .moderation_cascade import (
+    CASCADE_DECISIONS,
+    get_cascade,
+    get_host_reputation,
+    host_of,
+    model_version,
+)
+
+if TYPE_CHECKING:
+    from nudenet import NudeDetector
+
+
+logger = logging.getLogger(__name__)
+
+MODERATION_FALLBACKS = counter(
+    "netsentinel_moderation_fallbacks_total",
+    "Model failures censor_if_needed swallowed, by model.",
+    labelnames=("model",),
+)
 
 
 # ---------- GLOBAL SINGLETONS ----------
 
 _detector: NudeDetector | None = None
-_clf_model: Optional[AutoModelForImageClassification] = None
-_clf_processor: Optional[ViTImageProcessor] = None
-
-# If you have a GPU and want to use it, change this to "cuda"
-_DEVICE = "cpu"
+_clf_backend: Optional[ClassifierBackend] = None
+_clf_batcher: Optional[MicroBatcher] = None
 
 
 # ---------- LOADING HELPERS ----------
@@ -30,24 +50,23 @@ def get_detector() -> NudeDetector:
     """
     global _detector
     if _detector is None:
+        # imported here: onnxruntime/opencv are slow to import and only
+        # needed once the first image is moderated (or during warm-up)
+        from nudenet import NudeDetector
+
         _detector = NudeDetector()
     return _detector
 
 
-def get_classifier() -> tuple[AutoModelForImageClassification, ViTImageProcessor]:
+def get_classifier() -> ClassifierBackend:
     """
-    Lazy-load Falconsai/nsfw_image_detection classifier (whole image NSFW/normal).
+    Lazy-load Falconsai/nsfw_image_detection classifier (whole image NSFW/normal)
+    on the backend selected by CLASSIFIER_BACKEND ("torch" or "onnx").
     """
-    global _clf_model, _clf_processor
-    if _clf_model is None:
-        _clf_model = AutoModelForImageClassification.from_pretrained(
-            "Falconsai/nsfw_image_detection"
-        ).to(_DEVICE)
-        _clf_model.eval()
-        _clf_processor = ViTImageProcessor.from_pretrained(
-            "Falconsai/nsfw_image_detection"
-        )
-    return _clf_model, _clf_processor
+    global _clf_backend
+    if _clf_backend is None:
+        _clf_backend = create_backend()
+    return _clf_backend
 
 
 # ---------- NUDE DETECTION (NudeNet) ----------
@@ -77,127 +96,211 @@ def _is_explicit_label(label: str) -> bool:
     return any(part in lab for part in _EXPLICIT_PART_KEYWORDS)
 
 
-def is_nude_by_detector(image_bytes: bytes, threshold: float) -> bool:
+def detector_explicit_score(image: Union[bytes, DecodedImage]) -> float:
     """
-    Use NudeNet detector to see if there are explicit exposed parts
-    with confidence >= threshold.
+    Highest NudeNet confidence among explicit exposed parts (0.0 if none).
     """
     det = get_detector()
-    detections = det.detect(image_bytes)
+    detections = det.detect(as_decoded(image).bgr)
 
     # Uncomment for debugging:
     # print("NudeNet detections:", detections)
 
+    best = 0.0
     for r in detections:
         label = (r.get("label") or r.get("class") or "").upper()
         score = float(r.get("score", 0.0))
 
-        if _is_explicit_label(label) and score >= threshold:
-            return True
+        if _is_explicit_label(label):
+            best = max(best, score)
 
-    return False
+    return best
 
 
-# ---------- NSFW CLASSIFIER (Falconsai/nsfw_image_detection) ----------
-
-def nsfw_score_classifier(image_bytes: bytes) -> float:
+def is_nude_by_detector(image_bytes: bytes, threshold: float) -> bool:
     """
-    Returns probability that image is NSFW according to Falconsai/nsfw_image_detection.
+    Use NudeNet detector to see if there are explicit exposed parts
+    with confidence >= threshold.
     """
-    model, processor = get_classifier()
-    img = Image.open(BytesIO(image_bytes)).convert("RGB")
-    inputs = processor(images=img, return_tensors="pt").to(_DEVICE)
-
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits  # shape [1, 2] -> [normal, nsfw] or similar
-
-    probs = F.softmax(logits, dim=-1)[0]
-    # Find which index corresponds to "nsfw"
-    # model.config.id2label might be e.g. {0: 'DRAWINGS', 1: 'HENTAI', ...}
-    id2label = model.config.id2label
-    nsfw_idx = None
-    for idx, lab in id2label.items():
-        if lab.lower().startswith("nsfw") or lab.lower() == "nsfw":
-            nsfw_idx = int(idx)
-            break
+    return detector_explicit_score(image_bytes) >= threshold
+
 
-    if nsfw_idx is None:
-        # Fallback: assume class with label containing "nsfw" or just last index
-        # but ideally this branch never hits.
-        nsfw_idx = int(probs.argmax().item())
+# ---------- NSFW CLASSIFIER (Falconsai/nsfw_image_detection) ----------
 
-    return float(probs[nsfw_idx].item())
+def nsfw_scores_batch(images: List[Image.Image]) -> List[float]:
+    """
+    NSFW probability for each RGB image, computed in a single forward pass.
+    """
+    return get_classifier().predict(images)
 
 
-def _classifier_threshold_for_detector_threshold(detector_threshold: float) -> float:
+def get_classifier_batcher() -> MicroBatcher:
     """
-    Map the NudeNet threshold to a reasonable NSFW probability threshold.
+    Shared micro-batcher: concurrent proxy requests are grouped into one
+    classifier forward pass instead of running batch-size-1 inference each.
+    """
+    global _clf_batcher
+    if _clf_batcher is None:
+        _clf_batcher = MicroBatcher(
+            nsfw_scores_batch,
+            max_batch_size=settings.CLASSIFIER_MAX_BATCH_SIZE,
+            max_wait_ms=settings.CLASSIFIER_MAX_WAIT_MS,
+            name="nsfw_classifier",
+            timeout=settings.CLASSIFIER_BATCH_TIMEOUT,
+        )
+    return _clf_batcher
 
-    - Moderate mode calls censor_if_needed with threshold ~0.8
-      -> require high classifier confidence to blur (e.g. 0.9)
 
-    - Strict mode calls censor_if_needed with threshold ~0.6
-      -> accept lower classifier confidence (e.g. 0.75)
+def nsfw_score_classifier(image: Union[bytes, DecodedImage]) -> float:
+    """
+    Returns probability that image is NSFW according to Falconsai/nsfw_image_detection.
     """
-    if detector_threshold >= 0.75:
-        # moderate / very strict detector -> use high NSFW prob
-        return 0.90
-    else:
-        # strict detector -> allow more aggressive classification-based blur
-        return 0.75
+    img = as_decoded(image).image
+    if settings.CLASSIFIER_BATCHING:
+        return get_classifier_batcher().submit(img)
+    return nsfw_scores_batch([img])[0]
 
 
 # ---------- BLUR + MAIN ENTRYPOINT ----------
 
-def blur_image(image_bytes: bytes, radius: int = 25) -> bytes:
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    blurred = image.filter(ImageFilter.GaussianBlur(radius=radius))
+def blur_image(image: Union[bytes, DecodedImage], radius: int = 25) -> bytes:
+    # blurs the downsampled copy: cheaper, and relative to the original
+    # resolution the blur is only stronger
+    blurred = as_decoded(image).image.filter(ImageFilter.GaussianBlur(radius=radius))
     out = BytesIO()
     blurred.save(out, format="JPEG", quality=85)
     return out.getvalue()
 
 
+def _is_tiny(image_bytes: bytes) -> bool:
+    # header only, no pixel decode
+    with Image.open(BytesIO(image_bytes)) as img:
+        return max(img.size) <= settings.MODERATION_TINY_MAX_SIDE
+
+
 def censor_if_needed(
     image_bytes: bytes,
     threshold: float = 0.5,
     use_classifier: bool = True,
+    source_url: Optional[str] = None,
+    mode: Optional[FilterMode] = None,
 ) -> Tuple[bytes, bool]:
     """
-    Hybrid censorship:
-      1) NudeNet detector for explicit exposed parts
-      2) NSFW classifier for overall sexual/NSFW context (e.g. couple intimacy)
+    Cascade of checks (see app/services/moderation_cascade.py), in the order
+    configured for `mode`:
+      - images from a host with a run of clearly safe verdicts are safe
+      - tiny images are safe without running any model
+      - NSFW classifier on a small decode, decisive when clearly safe/unsafe
+      - NudeNet detector for explicit exposed parts
+    Without a mode: detector first, then classifier (the original order).
 
     'threshold' is the detector (NudeNet) confidence threshold.
     Classifier threshold is derived from it (more strict for "moderate" mode,
     more aggressive for "strict" mode).
+
+    Raw scores are cached by image content, so the models run at most once
+    per image whatever mode asks for it (source_url is not part of the key:
+    the image behind a URL can change).
+    The image is decoded at most once at full moderation size (plus once
+    small for the classifier stage) and shared by all stages.
     """
-    nude = False
+    cascade = get_cascade(threshold, mode, use_classifier)
+    decoded: Optional[DecodedImage] = None
+
+    def _decoded() -> DecodedImage:
+        nonlocal decoded
+        if decoded is None:
+            decoded = DecodedImage(image_bytes)
+        return decoded
+
+    cache = get_score_cache()
+    # scores from another model (or decode size) don't carry over
+    key = f"{model_version()}:{content_key(image_bytes)}"
+    scores = (cache.get(key=key) if cache else None) or ModerationScores()
+    computed = False
+
+    host = host_of(source_url) if "host" in cascade.stages else None
+    reputation = get_host_reputation() if host else None
+
+    nude: Optional[bool] = None
+    decided_by = "final"
+    for stage in cascade.stages:
+        if stage == "host":
+            if reputation is not None and reputation.trusted(cascade.label, host):
+                nude = False
+
+        elif stage == "tiny":
+            try:
+                if _is_tiny(image_bytes):
+                    nude = False
+            except Exception:
+                # not an image PIL can read; later stages will tell
+                pass
+
+        elif stage == "classifier":
+            if scores.classifier_score is None:
+                try:
+                    # the classifier looks at 224px: a small decode is enough
+                    small = decoded or DecodedImage(
+                        image_bytes, max_side=settings.MODERATION_CASCADE_CLASSIFIER_SIDE
+                    )
+                    with STAGE_SECONDS.timer(stage="classifier"):
+                        scores.classifier_score = nsfw_score_classifier(small)
+                    computed = True
+                except Exception:
+                    # Don't break search on ML failure
+                    MODERATION_FALLBACKS.inc(model="classifier")
+                    logger.debug("NSFW classifier failed", exc_info=True)
+            if scores.classifier_score is not None:
+                if scores.classifier_score >= cascade.unsafe_above:
+                    nude = True
+                elif scores.classifier_score < cascade.safe_below:
+                    nude = False
+
+        elif stage == "detector":
+            if scores.detector_score is None:
+                try:
+                    with STAGE_SECONDS.timer(stage="nudenet"):
+                        scores.detector_score = detector_explicit_score(_decoded())
+                    computed = True
+                except Exception:
+                    # If NudeNet fails, the classifier score decides
+                    MODERATION_FALLBACKS.inc(model="nudenet")
+                    logger.debug("NudeNet failed, falling back to the classifier", exc_info=True)
+            if scores.detector_score is not None and scores.detector_score >= threshold:
+                nude = True
 
-    # 1) Try NudeNet detector
-    try:
-        if is_nude_by_detector(image_bytes, threshold=threshold):
-            nude = True
-    except Exception:
-        # If NudeNet fails, we fall back to classifier only (if enabled)
-        nude = False
+        if nude is not None:
+            decided_by = stage
+            break
 
-    # 2) Classifier fallback / complement
-    if not nude and use_classifier:
-        try:
-            nsfw_prob = nsfw_score_classifier(image_bytes)
-            clf_thresh = _classifier_threshold_for_detector_threshold(threshold)
+    if nude is None:
+        # nothing was decisive: blur if either score passed its threshold
+        nude = (scores.detector_score is not None and scores.detector_score >= threshold) or (
+            scores.classifier_score is not None
+            and scores.classifier_score >= cascade.classifier_threshold
+        )
 
-            # Uncomment to debug:
-            # print(f"NSFW prob={nsfw_prob:.3f}, threshold={clf_thresh:.3f}")
+    CASCADE_DECISIONS.inc(
+        mode=cascade.label, stage=decided_by, verdict="unsafe" if nude else "safe"
+    )
+
+    # only what the models said about the image counts toward trusting its
+    # host (tiny images say nothing about it)
+    if reputation is not None and decided_by not in ("host", "tiny"):
+        clearly_safe = (
+            not nude
+            and scores.classifier_score is not None
+            and scores.classifier_score < cascade.safe_below
+            and (scores.detector_score is None or scores.detector_score < threshold)
+        )
+        reputation.record(cascade.label, host, clearly_safe)
 
-            if nsfw_prob >= clf_thresh:
-                nude = True
-        except Exception:
-            # Don't break search on ML failure
-            nude = False
+    if cache is not None and computed:
+        cache.put(scores, key=key)
 
     if nude:
-        return blur_image(image_bytes), True
+        with STAGE_SECONDS.timer(stage="blur"):
+            return blur_image(_decoded()), True
 
     return image_bytes, False
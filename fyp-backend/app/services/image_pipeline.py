@@ -0,0 +1,71 @@
+# app/services/image_pipeline.py
+"""
+Decode-once image pipeline for moderation.
+
+The source bytes are decoded a single time, downsampled as early as possible
+(JPEG draft mode lets libjpeg decode straight at 1/2, 1/4 or 1/8 scale) and
+the same RGB image is then shared by the detector, the classifier
+preprocessing and the blur stage.
+"""
+from __future__ import annotations
+
+from io import BytesIO
+from typing import Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from ..config import settings
+
+
+class DecodedImage:
+    def __init__(self, image_bytes: bytes, max_side: Optional[int] = None):
+        max_side = max_side or settings.MODERATION_MAX_SIDE
+
+        self.source_bytes = image_bytes
+        img = Image.open(BytesIO(image_bytes))
+        self.format = img.format
+        self.original_size = img.size
+
+        if img.format == "JPEG":
+            # picks the smallest DCT scale that is still >= max_side
+            img.draft("RGB", (max_side, max_side))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.BILINEAR)
+
+        self.image: Image.Image = img
+        self._bgr: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_image(cls, img: Image.Image) -> "DecodedImage":
+        """
+        Wrap an already decoded PIL image (e.g. a synthetic warm-up input).
+        """
+        decoded = cls.__new__(cls)
+        decoded.source_bytes = b""
+        decoded.format = img.format
+        decoded.original_size = img.size
+        decoded.image = img.convert("RGB") if img.mode != "RGB" else img
+        decoded._bgr = None
+        return decoded
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """
+        HxWx3 uint8 BGR array (OpenCV layout), as NudeNet expects.
+        """
+        if self._bgr is None:
+            self._bgr = np.ascontiguousarray(np.asarray(self.image)[:, :, ::-1])
+        return self._bgr
+
+
+def as_decoded(image: Union[bytes, DecodedImage]) -> DecodedImage:
+    if isinstance(image, DecodedImage):
+        return image
+    return DecodedImage(image)
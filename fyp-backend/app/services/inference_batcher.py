@@ -0,0 +1,114 @@
+# app/services/inference_batcher.py
+"""
+Dynamic micro-batching for model inference.
+
+Request threads call `submit(item)` and block; a single worker thread drains
+the queue into batches of up to `max_batch_size`, waiting at most
+`max_wait_ms` for more items after the first one arrives, and runs the
+batch function once per batch.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+from ..utils.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BATCH_SIZE = histogram(
+    "netsentinel_inference_batch_size",
+    "Number of items per batched model call.",
+    labelnames=("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+QUEUE_WAIT = histogram(
+    "netsentinel_inference_queue_wait_seconds",
+    "Time an item waited in the batching queue before its batch ran.",
+    labelnames=("model",),
+)
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        batch_fn: Callable[[List[T]], List[R]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        name: str = "model",
+        timeout: float = 30.0,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        # default wait for a result, so a stuck batch can't hang callers
+        self.timeout = timeout
+
+        self._queue: "queue.Queue[Tuple[T, Future, float]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, item: T, timeout: Optional[float] = None) -> R:
+        """
+        Result for `item`. Raises concurrent.futures.TimeoutError after
+        `timeout` (default: the batcher's) seconds.
+        """
+        fut: Future = Future()
+        self._queue.put((item, fut, time.perf_counter()))
+        self._ensure_worker()
+        return fut.result(timeout=self.timeout if timeout is None else timeout)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"batcher-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[T, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # don't wait any more, but take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+
+            started = time.perf_counter()
+            BATCH_SIZE.observe(len(batch), model=self.name)
+            for _, _, enqueued in batch:
+                QUEUE_WAIT.observe(started - enqueued, model=self.name)
+
+            try:
+                results = list(self.batch_fn([item for item, _, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: {len(results)} results for a batch of {len(batch)}"
+                    )
+            except Exception as exc:
+                logger.exception("Batched inference failed (%s)", self.name)
+                for _, fut, _ in batch:
+                    fut.set_exception(exc)
+                continue
+
+            for (_, fut, _), result in zip(batch, results):
+                fut.set_result(result)
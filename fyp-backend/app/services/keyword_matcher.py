@@ -0,0 +1,174 @@
+# app/services/keyword_matcher.py
+"""
+Compiled multi-keyword matcher (Aho-Corasick automaton).
+
+The naive check (`word in text` for every banned word) costs K substring
+scans per result. The automaton is built once per keyword set and then walks
+each text a single time, no matter how many keywords there are.
+"""
+from __future__ import annotations
+
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+# Joins the texts of a batch so they can be scanned in one pass.
+# No keyword can contain it, so a match never spans two texts.
+_SEPARATOR = "\x00"
+
+# Below this many keywords the C-level `in` scan beats walking the automaton
+# in Python (see benchmarks/bench_keyword_matcher.py), so we use it directly.
+_NAIVE_MAX_KEYWORDS = 128
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    """
+    Case-insensitive matcher for a fixed set of keywords.
+
+    word_boundary=False keeps the historical substring semantics
+    ("sex" matches "sexy"); word_boundary=True only accepts matches that are
+    not surrounded by letters/digits ("sex" no longer matches "Essex").
+    """
+
+    def __init__(self, keywords: Iterable[str], word_boundary: bool = False):
+        self.word_boundary = word_boundary
+        self.keywords: Tuple[str, ...] = tuple(
+            sorted({k.lower() for k in keywords if k and _SEPARATOR not in k})
+        )
+
+        # state -> {char: next_state}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # state -> lengths of all keywords ending in this state (incl. via fail links)
+        self._out: List[Tuple[int, ...]] = [()]
+
+        self._naive = not word_boundary and len(self.keywords) <= _NAIVE_MAX_KEYWORDS
+        if not self._naive:
+            self._build()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    # ---------- CONSTRUCTION ----------
+
+    def _build(self) -> None:
+        goto, fail, out = self._goto, self._fail, self._out
+
+        for word in self.keywords:
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                state = nxt
+            out[state] = out[state] + (len(word),)
+
+        # BFS to compute failure links and merge outputs along them
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+    # ---------- MATCHING ----------
+
+    def _boundary_ok(self, text: str, end: int, lengths: Tuple[int, ...]) -> bool:
+        """
+        'end' is the index of the last matched character.
+        """
+        if end + 1 < len(text) and _is_word_char(text[end + 1]):
+            return False
+        for length in lengths:
+            start = end - length + 1
+            if start == 0 or not _is_word_char(text[start - 1]):
+                return True
+        return False
+
+    def _scan(self, lowered: str, start: int, stop: int) -> int:
+        """
+        Return the index of the first match end in lowered[start:stop], or -1.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        word_boundary = self.word_boundary
+        state = 0
+
+        for i in range(start, stop):
+            ch = lowered[i]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                if not word_boundary or self._boundary_ok(lowered, i, out[state]):
+                    return i
+        return -1
+
+    def contains(self, text: str) -> bool:
+        if not self.keywords or not text:
+            return False
+        lowered = text.lower()
+        if self._naive:
+            return any(word in lowered for word in self.keywords)
+        return self._scan(lowered, 0, len(lowered)) != -1
+
+    def match_many(self, texts: Sequence[str]) -> List[bool]:
+        """
+        Match a whole batch (e.g. "title snippet" of every result) in one pass.
+        Returns one flag per input text.
+        """
+        if not self.keywords or not texts:
+            return [False] * len(texts)
+        if self._naive:
+            return [self.contains(t or "") for t in texts]
+
+        # lower per text: lower() can change the length of some characters
+        cleaned = [(t or "").replace(_SEPARATOR, " ").lower() for t in texts]
+        lowered = _SEPARATOR.join(cleaned)
+
+        # [start, stop) offsets of each text in the joined string
+        bounds: List[Tuple[int, int]] = []
+        pos = 0
+        for t in cleaned:
+            bounds.append((pos, pos + len(t)))
+            pos += len(t) + 1
+
+        hits = [False] * len(texts)
+        idx = 0
+        pos = 0
+        total = len(lowered)
+        while pos < total and idx < len(bounds):
+            # the separator resets the automaton, so scanning to the end is safe;
+            # we only need to know which text the first match falls into
+            end = self._scan(lowered, pos, total)
+            if end == -1:
+                break
+            while bounds[idx][1] <= end:
+                idx += 1
+            hits[idx] = True
+            # skip the rest of the matched text
+            pos = bounds[idx][1] + 1
+            idx += 1
+
+        return hits
+
+
+@lru_cache(maxsize=32)
+def get_matcher(keywords: FrozenSet[str], word_boundary: bool = False) -> KeywordMatcher:
+    """
+    Cached matcher per keyword set, so the automaton is only built when
+    the keywords actually change.
+    """
+    return KeywordMatcher(keywords, word_boundary=word_boundary)
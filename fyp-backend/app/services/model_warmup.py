@@ -0,0 +1,132 @@
+# app/services/model_warmup.py
+"""
+Background model loading + warm-up, started from the app lifespan.
+
+Importing the app stays cheap (no torch/transformers/nudenet); the models
+load in the background right after start-up and each runs one dummy
+inference, so the first real image request doesn't pay for it.
+/ready reports the progress.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from ..config import settings
+from . import moderation_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ModelStatus:
+    def __init__(self):
+        self.state = "pending"  # pending | loading | ready | failed
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> Dict:
+        return {"state": self.state, "seconds": self.seconds, "error": self.error}
+
+
+_status: Dict[str, ModelStatus] = {
+    "detector": ModelStatus(),
+    "classifier": ModelStatus(),
+}
+_task: Optional[asyncio.Task] = None
+
+
+def _dummy_image():
+    from PIL import Image
+
+    from .image_pipeline import DecodedImage
+
+    return DecodedImage.from_image(Image.new("RGB", (224, 224), (128, 128, 128)))
+
+
+def _warm(name: str) -> None:
+    from . import image_moderation
+
+    status = _status[name]
+    status.state = "loading"
+    start = time.perf_counter()
+    try:
+        dummy = _dummy_image()
+        if name == "detector":
+            image_moderation.detector_explicit_score(dummy)
+        else:
+            image_moderation.nsfw_scores_batch([dummy.image])
+    except Exception as e:
+        logger.exception("Warm-up of %s failed", name)
+        status.state = "failed"
+        status.error = f"{type(e).__name__}: {e}"
+    else:
+        status.state = "ready"
+    status.seconds = round(time.perf_counter() - start, 3)
+
+
+def warm_in_process() -> None:
+    for name in _status:
+        _warm(name)
+
+
+def worker_ready() -> bool:
+    """
+    Runs inside a moderation worker process, whose initializer already ran
+    the warm-up.
+    """
+    return all(s.state == "ready" for s in _status.values())
+
+
+async def _run() -> None:
+    loop = asyncio.get_running_loop()
+    if moderation_pool.use_process_pool():
+        for status in _status.values():
+            status.state = "loading"
+        start = time.perf_counter()
+        pool = moderation_pool.get_moderation_pool()
+        try:
+            # every worker warms up in its initializer before taking work;
+            # these probes start the workers and wait for that
+            results = await asyncio.gather(
+                *[
+                    loop.run_in_executor(pool, worker_ready)
+                    for _ in range(max(1, settings.MODERATION_WORKERS))
+                ]
+            )
+            state, error = ("ready", None) if all(results) else ("failed", "worker warm-up failed")
+        except Exception as e:
+            logger.exception("Moderation worker warm-up failed")
+            state, error = "failed", f"{type(e).__name__}: {e}"
+        for status in _status.values():
+            status.state, status.error = state, error
+            status.seconds = round(time.perf_counter() - start, 3)
+    else:
+        await loop.run_in_executor(None, warm_in_process)
+
+
+def start_model_warmup() -> None:
+    global _task
+    if settings.MODEL_WARMUP and _task is None:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_model_warmup() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _task = None
+
+
+def model_readiness() -> Dict:
+    if not settings.MODEL_WARMUP:
+        # models load lazily on the first image request
+        return {"ready": True, "models": {}, "warmup": False}
+    return {
+        "ready": all(s.state == "ready" for s in _status.values()),
+        "models": {name: s.as_dict() for name, s in _status.items()},
+        "warmup": True,
+    }
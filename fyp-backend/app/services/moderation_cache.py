@@ -0,0 +1,226 @@
+# app/services/moderation_cache.py
+"""
+Content-addressed cache of raw moderation scores.
+
+Entries are keyed by the SHA-256 of the image bytes (censor_if_needed
+prefixes it with the model fingerprint). There is no index by source URL:
+the bytes are needed to serve the image anyway, and the image behind a URL
+can change. We store the raw detector/classifier scores (not the blur
+decision), so strict, moderate and relaxed requests all reuse the same
+entry and only apply their own thresholds.
+
+Two tiers:
+  - bounded in-memory LRU per worker
+  - SQLite file on local disk shared by all workers on the host
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from ..config import settings
+from ..utils.cache import LRUCache
+from ..utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = counter(
+    "netsentinel_moderation_cache_lookups_total",
+    "Moderation score cache lookups by outcome.",
+    labelnames=("result",),
+)
+
+# run the TTL/size eviction on the persistent tier every N writes
+_EVICT_EVERY = 500
+
+
+@dataclass
+class ModerationScores:
+    # highest NudeNet confidence among explicit labels (0.0 = nothing found)
+    detector_score: Optional[float] = None
+    # Falconsai NSFW probability
+    classifier_score: Optional[float] = None
+
+
+def content_key(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def normalize_url(url: str) -> str:
+    """
+    Lower-case scheme/host, drop default ports and fragments, sort the query.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class _SQLiteTier:
+    """
+    Persistent tier. One connection per thread; WAL mode lets several
+    worker processes read while one writes.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_rows: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                key TEXT PRIMARY KEY,
+                detector_score REAL,
+                classifier_score REAL,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_scores_accessed_at ON scores (accessed_at);
+            DROP TABLE IF EXISTS urls;
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[ModerationScores]:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT detector_score, classifier_score, updated_at FROM scores WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None or now - row[2] > self.ttl_seconds:
+            return None
+        self._conn().execute("UPDATE scores SET accessed_at = ? WHERE key = ?", (now, key))
+        return ModerationScores(detector_score=row[0], classifier_score=row[1])
+
+    def put(self, key: str, scores: ModerationScores) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+            (key, scores.detector_score, scores.classifier_score, now, now),
+        )
+
+        self._writes += 1
+        if self._writes % _EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        conn = self._conn()
+        cutoff = time.time() - self.ttl_seconds
+        conn.execute("DELETE FROM scores WHERE updated_at < ?", (cutoff,))
+        # least recently used beyond max_rows
+        conn.execute(
+            """
+            DELETE FROM scores WHERE key IN (
+                SELECT key FROM scores ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_rows,),
+        )
+
+
+class ModerationScoreCache:
+    def __init__(
+        self,
+        memory_items: int,
+        ttl_seconds: float,
+        path: str = "",
+        max_rows: int = 200_000,
+    ):
+        self._memory = LRUCache(memory_items, ttl_seconds=ttl_seconds)
+        self._disk: Optional[_SQLiteTier] = None
+        if path:
+            try:
+                self._disk = _SQLiteTier(path, ttl_seconds, max_rows)
+            except (sqlite3.Error, OSError):
+                logger.warning("Moderation cache: persistent tier disabled", exc_info=True)
+
+    def get(
+        self, image_bytes: Optional[bytes] = None, key: Optional[str] = None
+    ) -> Optional[ModerationScores]:
+        """
+        Look up by content hash (or a key derived from it). Returns a copy,
+        so callers may fill in missing scores and put() it back.
+        """
+        if key is None:
+            key = content_key(image_bytes or b"")
+
+        scores = self._memory.get(key)
+        if scores is not None:
+            CACHE_LOOKUPS.inc(result="memory_hit")
+        elif self._disk is not None:
+            try:
+                scores = self._disk.get(key)
+            except sqlite3.Error:
+                logger.warning("Moderation cache read failed", exc_info=True)
+                scores = None
+            if scores is not None:
+                CACHE_LOOKUPS.inc(result="disk_hit")
+                self._memory.set(key, scores)
+
+        if scores is None:
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+        return ModerationScores(scores.detector_score, scores.classifier_score)
+
+    def put(
+        self,
+        scores: ModerationScores,
+        image_bytes: Optional[bytes] = None,
+        key: Optional[str] = None,
+    ) -> None:
+        if key is None:
+            key = content_key(image_bytes or b"")
+
+        stored = ModerationScores(scores.detector_score, scores.classifier_score)
+        self._memory.set(key, stored)
+
+        if self._disk is not None:
+            try:
+                self._disk.put(key, stored)
+            except sqlite3.Error:
+                logger.warning("Moderation cache write failed", exc_info=True)
+
+
+_cache: Optional[ModerationScoreCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_score_cache() -> Optional[ModerationScoreCache]:
+    global _cache
+    if not settings.MODERATION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ModerationScoreCache(
+                    memory_items=settings.MODERATION_CACHE_MEMORY_ITEMS,
+                    ttl_seconds=settings.MODERATION_CACHE_TTL_SECONDS,
+                    path=settings.MODERATION_CACHE_PATH,
+                    max_rows=settings.MODERATION_CACHE_MAX_ROWS,
+                )
+    return _cache
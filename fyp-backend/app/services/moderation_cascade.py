@@ -0,0 +1,216 @@
+# app/services/moderation_cascade.py
+"""
+Per-mode configuration of the moderation cascade run by censor_if_needed.
+
+Stages run in the configured order and each answers "safe", "unsafe" or
+undecided; the first answer wins and later (more expensive) stages are
+skipped:
+
+  host        the image's host had MODERATION_HOST_TRUST_AFTER clearly safe
+              verdicts in a row in this mode (classifier below `safe_below`,
+              nothing from the detector): safe. Only verdicts the models
+              made count, and trust lapses MODERATION_HOST_TRUST_SECONDS
+              after the last one, so a trusted host is still re-checked
+              that often. Streaks are kept per process.
+  tiny        longer side <= MODERATION_TINY_MAX_SIDE (icons, spacers): safe.
+              Only reads the image header.
+  classifier  NSFW classifier on a small decode of the image: safe below
+              `safe_below`, unsafe at/above `unsafe_above`.
+  detector    NudeNet: unsafe at/above the mode's detector threshold.
+
+If no stage decides, the image is blurred when either score reached its
+regular threshold (the pre-cascade rule). With the default unsafe_above equal
+to that classifier threshold, the cascade only changes outcomes for images
+the classifier scores below safe_below, which skip the detector.
+
+netsentinel_moderation_decisions_total counts which stage decided, per mode.
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib.metadata
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from ..config import settings
+from ..models import FilterMode
+from ..utils.cache import LRUCache
+from ..utils.metrics import counter
+
+STAGES = ("host", "tiny", "classifier", "detector")
+
+# NudeNet thresholds per mode (relaxed: no censorship at all)
+DETECTOR_THRESHOLDS = {
+    # Moderate: only very obvious nudity/NSFW gets blurred
+    FilterMode.moderate: 0.8,
+    # Strict: more aggressive – catches explicit + many intimate NSFW images
+    FilterMode.strict: 0.6,
+}
+
+CASCADE_DECISIONS = counter(
+    "netsentinel_moderation_decisions_total",
+    "Moderation verdicts by filter mode and the cascade stage that decided "
+    "(final: no stage was decisive).",
+    labelnames=("mode", "stage", "verdict"),
+)
+
+
+@dataclass(frozen=True)
+class CascadeConfig:
+    stages: Tuple[str, ...]
+    detector_threshold: float
+    # blur threshold on the classifier score when no stage decided
+    classifier_threshold: float
+    safe_below: float = 0.0
+    unsafe_above: float = 1.01
+    label: str = "custom"
+
+
+def classifier_threshold_for(detector_threshold: float) -> float:
+    """
+    Map the NudeNet threshold to a reasonable NSFW probability threshold.
+
+    - Moderate mode calls censor_if_needed with threshold ~0.8
+      -> require high classifier confidence to blur (e.g. 0.9)
+
+    - Strict mode calls censor_if_needed with threshold ~0.6
+      -> accept lower classifier confidence (e.g. 0.75)
+    """
+    if detector_threshold >= 0.75:
+        # moderate / very strict detector -> use high NSFW prob
+        return 0.90
+    else:
+        # strict detector -> allow more aggressive classification-based blur
+        return 0.75
+
+
+def _parse_stages(value: str) -> Tuple[str, ...]:
+    stages = tuple(s.strip().lower() for s in value.split(",") if s.strip())
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown moderation cascade stage(s): {', '.join(unknown)}")
+    return stages
+
+
+@lru_cache(maxsize=32)
+def get_cascade(
+    threshold: float, mode: Optional[FilterMode] = None, use_classifier: bool = True
+) -> CascadeConfig:
+    """
+    Cascade for `mode` (MODERATION_CASCADE_<MODE> settings). Without a mode,
+    the pre-cascade behaviour: detector, then classifier.
+    """
+    if mode == FilterMode.moderate:
+        stages = _parse_stages(settings.MODERATION_CASCADE_MODERATE)
+        safe_below = settings.MODERATION_CASCADE_SAFE_BELOW_MODERATE
+        unsafe_above = settings.MODERATION_CASCADE_UNSAFE_ABOVE_MODERATE
+    elif mode == FilterMode.strict:
+        stages = _parse_stages(settings.MODERATION_CASCADE_STRICT)
+        safe_below = settings.MODERATION_CASCADE_SAFE_BELOW_STRICT
+        unsafe_above = settings.MODERATION_CASCADE_UNSAFE_ABOVE_STRICT
+    else:
+        stages, safe_below, unsafe_above = ("detector", "classifier"), 0.0, 1.01
+
+    if not use_classifier:
+        stages = tuple(s for s in stages if s != "classifier")
+
+    return CascadeConfig(
+        stages=stages,
+        detector_threshold=threshold,
+        classifier_threshold=classifier_threshold_for(threshold),
+        safe_below=safe_below,
+        unsafe_above=unsafe_above,
+        label=mode.value if mode is not None else "custom",
+    )
+
+
+def _fingerprint(*parts) -> str:
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=1)
+def model_version() -> str:
+    """
+    Fingerprint of the models and the decode sizes they see, for the raw
+    score cache. Models are loaded once per process, so computing it once
+    is enough.
+    """
+    from .classifier_backends import MODEL_ID
+
+    backend = settings.CLASSIFIER_BACKEND.lower()
+    if backend == "onnx":
+        try:
+            st = os.stat(settings.CLASSIFIER_ONNX_PATH)
+            model = f"onnx:{settings.CLASSIFIER_ONNX_PATH}:{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            model = f"onnx:{settings.CLASSIFIER_ONNX_PATH}"
+    else:
+        model = f"{backend}:{MODEL_ID}"
+    try:
+        detector = importlib.metadata.version("nudenet")
+    except importlib.metadata.PackageNotFoundError:
+        detector = "unknown"
+
+    return _fingerprint(
+        model,
+        f"nudenet:{detector}",
+        settings.MODERATION_MAX_SIDE,
+        settings.MODERATION_CASCADE_CLASSIFIER_SIDE,
+    )
+
+
+@lru_cache(maxsize=None)
+def moderation_version(mode: FilterMode) -> str:
+    """
+    Fingerprint of everything that decides a verdict in `mode` (models,
+    cascade, thresholds), for stored verdicts such as the thumbnail cache.
+    """
+    threshold = DETECTOR_THRESHOLDS.get(mode)
+    if threshold is None:
+        # not moderated
+        return "none"
+    return _fingerprint(
+        model_version(), repr(get_cascade(threshold, mode)), settings.MODERATION_TINY_MAX_SIDE
+    )
+
+
+def host_of(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    try:
+        return urlsplit(url).hostname or None
+    except ValueError:
+        return None
+
+
+class HostReputation:
+    """
+    Streak of clearly safe verdicts per (mode, host); any other verdict
+    resets it. Entries expire ttl_seconds after the last recorded verdict.
+    """
+
+    def __init__(self, trust_after: int, ttl_seconds: float, max_hosts: int):
+        self.trust_after = trust_after
+        self._streaks = LRUCache(max_hosts, ttl_seconds=ttl_seconds)
+
+    def trusted(self, mode: str, host: str) -> bool:
+        if self.trust_after <= 0:
+            return False
+        return (self._streaks.get((mode, host)) or 0) >= self.trust_after
+
+    def record(self, mode: str, host: str, clearly_safe: bool) -> None:
+        streak = (self._streaks.get((mode, host)) or 0) + 1 if clearly_safe else 0
+        self._streaks.set((mode, host), streak)
+
+
+@lru_cache(maxsize=1)
+def get_host_reputation() -> HostReputation:
+    return HostReputation(
+        trust_after=settings.MODERATION_HOST_TRUST_AFTER,
+        ttl_seconds=settings.MODERATION_HOST_TRUST_SECONDS,
+        max_hosts=settings.MODERATION_HOST_TRUST_MAX_HOSTS,
+    )
@@ -0,0 +1,159 @@
+# app/services/moderation_pool.py
+"""
+Where censor_if_needed runs.
+
+"thread" (default): FastAPI's threadpool in the API process.
+"process": a pool of worker processes. Each worker loads NudeNet and the
+classifier once at start-up; image bytes and results travel over the
+executor's pipes. Torch threads and the GIL then no longer compete with
+request handling in the API process. With MODEL_WARMUP each worker also
+runs the warm-up inferences in its initializer, before it takes any image.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..models import FilterMode
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ModerationUnavailable(Exception):
+    """
+    The moderation worker handling the image died (the image was not
+    moderated).
+    """
+
+
+# ---------- WORKER SIDE ----------
+
+def _init_worker(torch_threads: int, warmup: bool) -> None:
+    if torch_threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+        settings.MODERATION_TORCH_THREADS = torch_threads
+
+    from . import image_moderation
+
+    # a worker handles one image at a time, nothing to micro-batch
+    settings.CLASSIFIER_BATCHING = False
+    if warmup:
+        from .model_warmup import warm_in_process
+
+        # loads the models too; failures are recorded, not raised (that
+        # would break the pool)
+        warm_in_process()
+    else:
+        image_moderation.get_detector()
+        image_moderation.get_classifier()
+
+
+def _censor_in_worker(
+    image_bytes: bytes,
+    threshold: float,
+    source_url: Optional[str],
+    mode: Optional[FilterMode] = None,
+) -> Tuple[bytes, bool]:
+    from .image_moderation import censor_if_needed
+
+    return censor_if_needed(image_bytes, threshold=threshold, source_url=source_url, mode=mode)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ---------- API SIDE ----------
+
+def use_process_pool() -> bool:
+    return settings.MODERATION_BACKEND.lower() == "process"
+
+
+def get_moderation_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=max(1, settings.MODERATION_WORKERS),
+            # "spawn": forking a process that already runs threads/torch is unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(settings.MODERATION_TORCH_THREADS, settings.MODEL_WARMUP),
+        )
+    return _pool
+
+
+def start_moderation_pool() -> None:
+    """
+    Spawn the workers at start-up so model loading doesn't hit the first request.
+    """
+    if use_process_pool():
+        pool = get_moderation_pool()
+        for _ in range(max(1, settings.MODERATION_WORKERS)):
+            pool.submit(_ping)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    # requests that were on the same broken pool all land here; only the
+    # first one replaces it
+    if _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        get_moderation_pool()
+
+
+def shutdown_moderation_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def censor_async(
+    image_bytes: bytes,
+    threshold: float,
+    source_url: Optional[str] = None,
+    mode: Optional[FilterMode] = None,
+) -> Tuple[bytes, bool]:
+    """
+    Awaitable censor_if_needed on the configured backend. Raises
+    ModerationUnavailable if the moderation worker handling the image died.
+    """
+    from .image_moderation import censor_if_needed
+
+    if not use_process_pool():
+        return await run_in_threadpool(
+            censor_if_needed, image_bytes, threshold=threshold, source_url=source_url, mode=mode
+        )
+
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_moderation_pool()
+        try:
+            future = loop.run_in_executor(
+                pool, _censor_in_worker, image_bytes, threshold, source_url, mode
+            )
+        except BrokenProcessPool:
+            # broken before this image got to it: retry once on a new pool
+            logger.warning("Moderation worker pool broken, restarting it")
+            _discard_pool(pool)
+            continue
+        try:
+            return await future
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image). Rebuild the pool for
+            # the next requests, but don't retry this image: it may be what
+            # killed the worker, and running it in the API process would
+            # load the models here too.
+            logger.exception("Moderation worker pool broken, restarting it")
+            _discard_pool(pool)
+            break
+    raise ModerationUnavailable("Image moderation unavailable")
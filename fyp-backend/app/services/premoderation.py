@@ -0,0 +1,284 @@
+# app/services/premoderation.py
+"""
+Moderating preview images ahead of the browser.
+
+perform_search hands the preview URLs of its results to a bounded per-worker
+queue. A few background tasks download + moderate them into the thumbnail
+cache, so /api/media/proxy usually finds the final bytes already there.
+
+- render_thumbnail() is the one path that moderates and stores a thumbnail;
+  it is coalesced per (url, mode), so the proxy joins work already running
+  in the background instead of doing it twice.
+- Each search is a batch. Workers always serve the newest batch first, a
+  URL queued again moves to the newer batch, and when the queue is full the
+  oldest batches are dropped. Jobs already running are left to finish
+  (model inference can't be interrupted, and the result is still cached).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote_plus, urlparse
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..models import FilterMode
+from ..utils.metrics import counter
+from .image_fetch import ImageFetchError, fetch_image
+from .moderation_cascade import DETECTOR_THRESHOLDS
+from .moderation_pool import ModerationUnavailable, censor_async
+from .thumbnail_cache import CachedThumbnail, get_thumbnail_cache, thumbnail_key
+
+logger = logging.getLogger(__name__)
+
+PREMODERATION_JOBS = counter(
+    "netsentinel_premoderation_jobs_total",
+    "Background pre-moderation jobs by outcome (unavailable: the moderation "
+    "worker died).",
+    labelnames=("result",),
+)
+
+# ---------- MODERATE + STORE ----------
+
+async def moderate_image(url: str, mode: FilterMode) -> Tuple[bytes, str, bool]:
+    """
+    Download and censor one image for `mode`: (bytes, media type, blurred).
+    Raises ImageFetchError or ModerationUnavailable.
+    """
+    fetched = await fetch_image(url)
+    original_bytes = fetched.content
+
+    threshold = DETECTOR_THRESHOLDS.get(mode)
+    if threshold is None:
+        # Relaxed: no censorship at all
+        censored_bytes, blurred = original_bytes, False
+    else:
+        censored_bytes, blurred = await censor_async(
+            original_bytes, threshold=threshold, source_url=url, mode=mode
+        )
+
+    # blurred output is re-encoded as JPEG, otherwise pass the original through
+    media_type = "image/jpeg" if blurred else fetched.content_type
+    return censored_bytes, media_type, blurred
+
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def _render(url: str, mode: FilterMode, key: str) -> CachedThumbnail:
+    try:
+        content, media_type, blurred = await moderate_image(url, mode)
+        return await run_in_threadpool(
+            get_thumbnail_cache().put, key, content, media_type, blurred
+        )
+    finally:
+        _inflight.pop(key, None)
+
+
+async def render_thumbnail(url: str, mode: FilterMode) -> CachedThumbnail:
+    """
+    Moderate `url` for `mode` and store it in the thumbnail cache (which must
+    be enabled). Concurrent calls for the same key share one run.
+    """
+    key = thumbnail_key(url, mode)
+    fut = _inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_render(url, mode, key))
+        # mark the error retrieved even if every waiter went away
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        _inflight[key] = fut
+    # shield: a client disconnect must not cancel work others wait on
+    return await asyncio.shield(fut)
+
+
+async def image_verdict(url: str, mode: FilterMode) -> bool:
+    """
+    Whether `url` gets blurred in `mode`. Uses (and fills) the thumbnail
+    cache when enabled, so the proxy then serves the image without
+    moderating it again. Raises ImageFetchError or ModerationUnavailable.
+    """
+    cache = get_thumbnail_cache()
+    if cache is None:
+        _, _, blurred = await moderate_image(url, mode)
+        return blurred
+
+    key = thumbnail_key(url, mode)
+    if key not in _inflight:
+        entry = await run_in_threadpool(cache.get, key, False)
+        if entry is not None and entry.blurred is not None:
+            return entry.blurred
+    return (await render_thumbnail(url, mode)).blurred
+
+
+# ---------- BACKGROUND QUEUE ----------
+
+@dataclass
+class _Job:
+    key: str
+    url: str
+    mode: FilterMode
+    enqueued_at: float
+    dropped: bool = False
+
+
+class PreModerationQueue:
+    def __init__(self, max_items: int, workers: int, max_age: float):
+        self.max_items = max(1, max_items)
+        self.workers = max(1, workers)
+        self.max_age = max_age
+        # one deque per search, newest on the right
+        self._batches: Deque[Deque[_Job]] = deque()
+        self._pending: Dict[str, _Job] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.ensure_future(self._worker()))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def enqueue(self, urls: Iterable[str], mode: FilterMode) -> None:
+        """
+        Queue one search's image URLs, ahead of everything queued before.
+        """
+        batch: Deque[_Job] = deque()
+        now = time.monotonic()
+        for url in urls:
+            key = thumbnail_key(url, mode)
+            if key in _inflight:
+                continue
+            old = self._pending.pop(key, None)
+            if old is not None:
+                # re-queued by a newer search: move it up
+                old.dropped = True
+            job = _Job(key, url, mode, now)
+            self._pending[key] = job
+            batch.append(job)
+
+        if not batch:
+            return
+        self._batches.append(batch)
+
+        # over capacity: the stalest searches go first
+        while len(self._pending) > self.max_items and self._batches:
+            oldest = self._batches[0]
+            if not oldest:
+                self._batches.popleft()
+                continue
+            job = oldest.popleft()
+            if job.dropped:
+                continue
+            job.dropped = True
+            self._pending.pop(job.key, None)
+            PREMODERATION_JOBS.inc(result="dropped")
+
+        self._wakeup.set()
+
+    def _pop(self) -> Optional[_Job]:
+        while self._batches:
+            batch = self._batches[-1]
+            while batch:
+                job = batch.popleft()
+                if job.dropped:
+                    continue
+                self._pending.pop(job.key, None)
+                if self.max_age and time.monotonic() - job.enqueued_at > self.max_age:
+                    PREMODERATION_JOBS.inc(result="stale")
+                    continue
+                return job
+            self._batches.pop()
+        return None
+
+    async def _worker(self) -> None:
+        cache = get_thumbnail_cache()
+        while True:
+            job = self._pop()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            try:
+                # the browser may have got there first
+                if job.key in _inflight or await run_in_threadpool(cache.get, job.key, False):
+                    PREMODERATION_JOBS.inc(result="skipped")
+                    continue
+
+                await render_thumbnail(job.url, job.mode)
+                PREMODERATION_JOBS.inc(result="done")
+            except asyncio.CancelledError:
+                raise
+            except ImageFetchError:
+                PREMODERATION_JOBS.inc(result="failed")
+            except ModerationUnavailable:
+                PREMODERATION_JOBS.inc(result="unavailable")
+            except Exception:
+                logger.exception("Pre-moderation of %s failed", job.url)
+                PREMODERATION_JOBS.inc(result="failed")
+
+
+_queue: Optional[PreModerationQueue] = None
+
+
+def start_premoderation() -> None:
+    global _queue
+    if not settings.PREMODERATION_ENABLED or get_thumbnail_cache() is None:
+        # nowhere to keep the results
+        return
+    _queue = PreModerationQueue(
+        settings.PREMODERATION_QUEUE_SIZE,
+        settings.PREMODERATION_WORKERS,
+        settings.PREMODERATION_MAX_AGE_SECONDS,
+    )
+    _queue.start()
+
+
+async def stop_premoderation() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+
+def decode_proxy_url(url: str) -> Optional[str]:
+    """
+    The remote image URL from the proxy's `url` parameter (as already
+    decoded from the query string), or None if it isn't http(s). The proxy
+    and everything that predicts its thumbnail_key must decode alike.
+    """
+    decoded = unquote_plus(url)
+    if not decoded.startswith(("http://", "https://")):
+        return None
+    return decoded
+
+
+def image_url(preview_url: str) -> Optional[str]:
+    # preview_url looks like /api/media/proxy?url=<encoded remote url>
+    values = parse_qs(urlparse(preview_url).query).get("url")
+    if not values:
+        return None
+    return decode_proxy_url(values[0])
+
+
+def enqueue_previews(results: Iterable[Dict], mode: FilterMode) -> None:
+    """
+    Queue the preview images of one search response for pre-moderation.
+    """
+    if _queue is None:
+        return
+    urls = [u for u in (image_url(r.get("preview_url") or "") for r in results) if u]
+    if urls:
+        _queue.enqueue(urls, mode)
@@ -0,0 +1,246 @@
+# app/services/retention.py
+"""
+Retention of search history.
+
+On Postgres with the monthly range partitions from
+migrations/0004_partition_search_history.sql, a purge:
+  1. creates the partitions for the next PARTITION_PREMAKE_MONTHS months, so
+     new rows never land in the default partition;
+  2. drops every monthly partition that lies entirely before the cutoff
+     (search_queries and search_results together), which is a metadata
+     operation instead of deleting row by row;
+  3. deletes what is left before the cutoff (the partly expired month, the
+     default partition) in bounded batches, each in its own transaction.
+
+Results go with their query, not by their own created_at: follow-up pages
+add results to a query later, possibly in a later month. So before a
+query is purged, its newer results are deleted by query_id (this is what
+ON DELETE CASCADE did before the partitioned tables lost the foreign key).
+A result is never older than its query, so dropping an expired results
+partition can't leave a live query without its results.
+
+Without partitions (SQLite, or before the migration) only step 3 runs.
+
+The purge runs every RETENTION_PURGE_INTERVAL_SECONDS in each API worker;
+a Postgres advisory lock makes sure only one of them works at a time.
+Rollups (search_stats_rollups) are kept: dashboard totals stay all-time.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from ..config import settings
+from ..utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+RETENTION_PURGED = counter(
+    "netsentinel_retention_purged_total",
+    "Search history purged by retention, by table and method.",
+    labelnames=("table", "method"),
+)
+
+# children first: search_results rows point at search_queries
+_TABLES = ("search_results", "search_queries")
+
+# arbitrary key for pg_try_advisory_lock
+_LOCK_KEY = 0x4E53_5254  # "NSRT"
+
+_PARTITION_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def _month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _is_partitioned(conn: Connection, table: str) -> bool:
+    return bool(
+        conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+            ),
+            {"table": table},
+        ).scalar()
+    )
+
+
+def _monthly_partitions(conn: Connection, table: str) -> List[Tuple[str, datetime]]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table"
+        ),
+        {"table": table},
+    ).scalars()
+
+    partitions = []
+    for name in rows:
+        m = _PARTITION_RE.search(name)
+        if m:
+            partitions.append((name, datetime(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(engine: Engine, now: Optional[datetime] = None) -> None:
+    month = _month_start(now or datetime.utcnow())
+    with engine.begin() as conn:
+        for table in _TABLES:
+            if not _is_partitioned(conn, table):
+                continue
+            existing = {start for _, start in _monthly_partitions(conn, table)}
+            for n in range(settings.PARTITION_PREMAKE_MONTHS + 1):
+                start = _add_months(month, n)
+                if start in existing:
+                    continue
+                conn.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {table}_p{start:%Y%m} "
+                        f"PARTITION OF {table} FOR VALUES FROM (:start) TO (:end)"
+                    ),
+                    {"start": start, "end": _add_months(start, 1)},
+                )
+
+
+def drop_expired_partitions(engine: Engine, cutoff: datetime) -> None:
+    with engine.begin() as conn:
+        for table in _TABLES:
+            if not _is_partitioned(conn, table):
+                continue
+            for name, start in _monthly_partitions(conn, table):
+                if _add_months(start, 1) > cutoff:
+                    break
+                if table == "search_queries":
+                    # results added by later follow-up pages live in newer
+                    # partitions
+                    deleted = conn.execute(
+                        text(
+                            "DELETE FROM search_results "
+                            f'WHERE query_id IN (SELECT id FROM "{name}")'
+                        )
+                    ).rowcount
+                    if deleted:
+                        RETENTION_PURGED.inc(deleted, table="search_results", method="delete")
+                conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                RETENTION_PURGED.inc(table=table, method="partition")
+                logger.info("Dropped expired partition %s", name)
+
+
+def _delete_batches(
+    engine: Engine, table: str, sql: str, cutoff: datetime, batch_size: int
+) -> None:
+    while True:
+        # one short transaction per batch: no long locks, bounded WAL
+        with engine.begin() as conn:
+            deleted = conn.execute(
+                text(sql), {"cutoff": cutoff, "limit": batch_size}
+            ).rowcount
+        if deleted:
+            RETENTION_PURGED.inc(deleted, table=table, method="delete")
+        if deleted < batch_size:
+            break
+
+
+def delete_expired_rows(engine: Engine, cutoff: datetime, batch_size: int) -> None:
+    for table in _TABLES:
+        # ids are unique (one sequence); the outer created_at bound lets
+        # Postgres prune to the expired partitions
+        _delete_batches(
+            engine,
+            table,
+            f"DELETE FROM {table} WHERE created_at < :cutoff AND id IN ("
+            f"SELECT id FROM {table} WHERE created_at < :cutoff LIMIT :limit)",
+            cutoff,
+            batch_size,
+        )
+        if table == "search_results":
+            # newer results of queries about to be purged
+            _delete_batches(
+                engine,
+                table,
+                "DELETE FROM search_results WHERE id IN ("
+                "SELECT id FROM search_results WHERE query_id IN ("
+                "SELECT id FROM search_queries WHERE created_at < :cutoff) LIMIT :limit)",
+                cutoff,
+                batch_size,
+            )
+
+
+def purge_history(engine: Engine, now: Optional[datetime] = None) -> None:
+    now = now or datetime.utcnow()
+    postgres = engine.dialect.name == "postgresql"
+
+    with engine.connect() as lock_conn:
+        if postgres:
+            got = lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}
+            ).scalar()
+            if not got:
+                # another worker is on it
+                return
+        try:
+            if postgres:
+                try:
+                    ensure_partitions(engine, now)
+                except Exception:
+                    # e.g. rows for that month already sit in the default
+                    # partition; purging must still go ahead
+                    logger.exception("Creating upcoming history partitions failed")
+
+            if settings.HISTORY_RETENTION_DAYS <= 0:
+                return
+            cutoff = now - timedelta(days=settings.HISTORY_RETENTION_DAYS)
+            if postgres:
+                drop_expired_partitions(engine, cutoff)
+            delete_expired_rows(engine, cutoff, max(1, settings.RETENTION_DELETE_BATCH_SIZE))
+        finally:
+            if postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+
+_task: Optional[asyncio.Task] = None
+
+
+async def _purge_loop(engine: Engine) -> None:
+    while True:
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(purge_history, engine)
+        except Exception:
+            logger.exception("History retention purge failed")
+        else:
+            logger.debug("Retention purge took %.2fs", time.perf_counter() - started)
+        await asyncio.sleep(settings.RETENTION_PURGE_INTERVAL_SECONDS)
+
+
+def start_retention(engine: Engine) -> None:
+    global _task
+    if settings.RETENTION_PURGE_INTERVAL_SECONDS <= 0:
+        return
+    _task = asyncio.ensure_future(_purge_loop(engine))
+
+
+async def stop_retention() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
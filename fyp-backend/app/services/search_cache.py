@@ -0,0 +1,91 @@
+# app/services/search_cache.py
+"""
+Per-worker cache of normalized provider results, in front of the fan-out.
+
+Keyed by (normalized query, categories, limit, page). Only the raw provider results
+are cached: filtering runs on every request, so settings changes apply
+immediately. Concurrent misses for the same key share one upstream call
+(single-flight), so a burst of a trending query goes upstream once.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..utils.cache import LRUCache
+from ..utils.metrics import counter
+from .search_providers import BaseProvider
+
+SEARCH_CACHE_LOOKUPS = counter(
+    "netsentinel_search_cache_lookups_total",
+    "Search result cache lookups by outcome (hit, miss, coalesced).",
+    labelnames=("result",),
+)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class CachedProvider(BaseProvider):
+    """
+    Wraps a provider with a TTL'd LRU and single-flight coalescing.
+    Failed or empty upstream answers are not cached.
+    """
+
+    name = "cached"
+
+    def __init__(self, provider: BaseProvider, max_items: int, ttl_seconds: float):
+        self.provider = provider
+        self.categories = settings.SEARXNG_CATEGORIES
+        self._cache = LRUCache(max_items, ttl_seconds=ttl_seconds)
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
+    def _key(self, query: str, limit: int, page: int) -> Tuple:
+        return (normalize_query(query), self.categories, limit, page)
+
+    async def asearch(self, query: str, limit: int = 10, page: int = 1) -> List[Dict]:
+        key = self._key(query, limit, page)
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            SEARCH_CACHE_LOOKUPS.inc(result="hit")
+            return [dict(r) for r in cached]
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            SEARCH_CACHE_LOOKUPS.inc(result="coalesced")
+            # shield: a cancelled follower must not cancel the shared call
+            results = await asyncio.shield(fut)
+            return [dict(r) for r in results]
+
+        SEARCH_CACHE_LOOKUPS.inc(result="miss")
+        fut = asyncio.ensure_future(self._fetch(key, query, limit, page))
+        # mark the error retrieved even if every waiter was cancelled
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = fut
+        results = await asyncio.shield(fut)
+        return [dict(r) for r in results]
+
+    async def _fetch(self, key: Tuple, query: str, limit: int, page: int) -> List[Dict]:
+        try:
+            results = await self.provider.asearch(query, limit, page)
+            if results:
+                self._cache.set(key, tuple(dict(r) for r in results))
+            return results
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+def wrap_with_cache(provider: BaseProvider) -> BaseProvider:
+    if settings.SEARCH_CACHE_TTL_SECONDS <= 0 or settings.SEARCH_CACHE_MAX_ITEMS <= 0:
+        return provider
+    return CachedProvider(
+        provider,
+        max_items=settings.SEARCH_CACHE_MAX_ITEMS,
+        ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+    )
@@ -0,0 +1,220 @@
+# app/services/search_pager.py
+"""
+Cursor pagination over upstream result pages.
+
+A cursor is opaque to the client but fully self-describing: it records the
+upstream page and the offset inside it where the next response starts, so
+any worker can serve the follow-up request without shared state. Cursors
+are HMAC-signed (they carry the history query id follow-up pages are added
+to), with SEARCH_CURSOR_SECRET or a secret generated per host.
+
+Upstream pages are fetched lazily until `limit` results survive filtering.
+The following page is prefetched in the background; through the query cache
+(and its single-flight) the next request picks it up without waiting.
+
+With several search providers, an "upstream page" is the merged fan-out
+page, cut to SEARCH_UPSTREAM_PAGE_SIZE: results beyond that are not carried
+over, and results are only de-duplicated within a page, so one that two
+providers return on different pages can show up twice.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from ..config import settings
+from ..utils.metrics import STAGE_SECONDS
+from .filtering import FilterPolicy, filter_with_policy
+from .search_cache import normalize_query
+from .search_providers import BaseProvider, SearchUnavailable
+
+logger = logging.getLogger(__name__)
+
+_background: Set[asyncio.Task] = set()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class Cursor:
+    # upstream page (1-based) and offset of the first unread result in it
+    page: int = 1
+    offset: int = 0
+    # results already returned, so ids stay unique across pages
+    returned: int = 0
+    # history row of the first page, follow-up pages are added to it
+    query_id: Optional[int] = None
+
+
+@dataclass
+class PageResult:
+    results: List[Dict] = field(default_factory=list)
+    # raw results consumed / blocked while building this response
+    total: int = 0
+    blocked: int = 0
+    next_cursor: Optional[Cursor] = None
+
+
+def _query_tag(query: str) -> str:
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=1)
+def _secret() -> bytes:
+    if settings.SEARCH_CURSOR_SECRET:
+        return settings.SEARCH_CURSOR_SECRET.encode("utf-8")
+
+    path = settings.SEARCH_CURSOR_SECRET_FILE
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    try:
+        # the first worker to get here creates it, the others read it
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path, "rb") as f:
+                secret = f.read()
+            if secret:
+                return secret
+            # created but not written yet
+            time.sleep(0.01)
+        raise RuntimeError(f"Cursor secret file {path} is empty")
+    secret = secrets.token_hex(32).encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    logger.info("Generated a cursor secret in %s", path)
+    return secret
+
+
+def _sign(payload: bytes) -> str:
+    digest = hmac.new(_secret(), payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def encode_cursor(cursor: Cursor, query: str) -> str:
+    payload = json.dumps(
+        {
+            "q": _query_tag(query),
+            "p": cursor.page,
+            "o": cursor.offset,
+            "n": cursor.returned,
+            "h": cursor.query_id,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    token = base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+    return f"{token}.{_sign(payload)}"
+
+
+def decode_cursor(token: str, query: str) -> Cursor:
+    body, _, signature = token.partition(".")
+    try:
+        payload = _b64decode(body)
+        data = json.loads(payload)
+        cursor = Cursor(
+            page=int(data["p"]),
+            offset=int(data["o"]),
+            returned=int(data["n"]),
+            query_id=int(data["h"]) if data.get("h") is not None else None,
+        )
+        tag = data["q"]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise InvalidCursor("Malformed cursor")
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidCursor("Cursor signature mismatch")
+    if tag != _query_tag(query):
+        raise InvalidCursor("Cursor belongs to a different query")
+    if cursor.page < 1 or cursor.offset < 0 or cursor.returned < 0:
+        raise InvalidCursor("Malformed cursor")
+    return cursor
+
+
+def _prefetch(provider: BaseProvider, query: str, page: int) -> None:
+    async def _run() -> None:
+        try:
+            await provider.asearch(query, limit=settings.SEARCH_UPSTREAM_PAGE_SIZE, page=page)
+        except Exception:
+            logger.debug("Prefetch of page %d failed", page, exc_info=True)
+
+    task = asyncio.ensure_future(_run())
+    # keep a reference so the task isn't garbage-collected mid-flight
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def collect_page(
+    provider: BaseProvider,
+    query: str,
+    limit: int,
+    policy: FilterPolicy,
+    cursor: Optional[Cursor] = None,
+) -> PageResult:
+    """
+    Walk upstream pages from `cursor` until `limit` results pass `policy`,
+    the upstream runs dry, or SEARCH_MAX_PAGES_PER_REQUEST pages were read.
+    """
+    cursor = cursor or Cursor()
+    out = PageResult()
+    page, offset = cursor.page, cursor.offset
+
+    for _ in range(settings.SEARCH_MAX_PAGES_PER_REQUEST):
+        try:
+            raw = await provider.asearch(
+                query, limit=settings.SEARCH_UPSTREAM_PAGE_SIZE, page=page
+            )
+        except SearchUnavailable:
+            if not out.results:
+                raise
+            # keep what we have; the next request retries from here
+            out.next_cursor = Cursor(page, offset, cursor.returned + len(out.results))
+            return out
+
+        window = raw[offset:]
+        if not window:
+            # upstream exhausted
+            return out
+
+        need = limit - len(out.results)
+        with STAGE_SECONDS.timer(stage="filter"):
+            filtered = filter_with_policy(window, policy)[0]
+        taken = filtered[:need]
+
+        if len(filtered) > need:
+            # stop mid-page, right after the last result we keep
+            last = taken[-1]
+            consumed = next(i for i, r in enumerate(window) if r is last) + 1
+        else:
+            consumed = len(window)
+
+        out.results.extend(taken)
+        out.total += consumed
+        out.blocked += consumed - len(taken)
+
+        if consumed < len(window):
+            out.next_cursor = Cursor(page, offset + consumed, cursor.returned + len(out.results))
+            return out
+
+        page, offset = page + 1, 0
+        if len(out.results) >= limit:
+            break
+
+    out.next_cursor = Cursor(page, 0, cursor.returned + len(out.results))
+    if settings.SEARCH_PREFETCH:
+        _prefetch(provider, query, page)
+    return out
@@ -1,14 +1,44 @@
 # app/services/search_providers.py
-from typing import List, Dict, Optional
-from urllib.parse import quote_plus, urlparse, urlunparse
-
-import requests
+import asyncio
+import html
+import logging
+import re
+import time
+from typing import List, Dict, Optional, Sequence
+from urllib.parse import parse_qsl, quote, quote_plus, urlencode, urlparse, urlunparse
 
 from ..config import settings
+from ..utils.metrics import counter, histogram
+from .http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_SECONDS = histogram(
+    "netsentinel_upstream_search_seconds",
+    "Latency of successful upstream search calls, by provider.",
+    labelnames=("provider",),
+)
+UPSTREAM_ERRORS = counter(
+    "netsentinel_upstream_search_errors_total",
+    "Failed upstream search calls, by provider and error.",
+    labelnames=("provider", "error"),
+)
+
+
+class SearchUnavailable(Exception):
+    """
+    Every configured provider failed (or none answered before the deadline).
+    """
 
 
 class BaseProvider:
-    def search(self, query: str, limit: int = 10) -> List[Dict]:
+    name = "base"
+
+    async def asearch(self, query: str, limit: int = 10, page: int = 1) -> List[Dict]:
+        """
+        Up to `limit` results of upstream page `page` (1-based);
+        an empty list once the upstream has nothing more.
+        """
         raise NotImplementedError
 
 
@@ -18,9 +48,12 @@ class SearxNGProvider(BaseProvider):
     to {title, url, snippet, preview_url}.
     """
 
+    name = "searxng"
+
     def __init__(self, base_url: Optional[str] = None, categories: Optional[str] = None):
         self.base_url = (base_url or settings.SEARXNG_URL).rstrip("/")
         self.categories = categories or settings.SEARXNG_CATEGORIES
+        self.name = f"searxng:{urlparse(self.base_url).netloc}"
 
     def _normalize_img_url(self, img: str) -> str:
         if not img:
@@ -37,24 +70,17 @@ class SearxNGProvider(BaseProvider):
 
         return img
 
-    def search(self, query: str, limit: int = 10) -> List[Dict]:
-        params = {
+    def _params(self, query: str, page: int) -> Dict:
+        return {
             "q": query,
             "format": "json",
             "categories": self.categories,
             "language": "en",
             "safesearch": 0,
+            "pageno": page,
         }
 
-        url = f"{self.base_url}/search"
-        headers = {
-            "User-Agent": "NetSentinelSafeSearch/1.0 (student project; contact: youremail@example.com)"
-        }
-
-        resp = requests.get(url, params=params, headers=headers, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-
+    def _parse(self, data: Dict, limit: int) -> List[Dict]:
         raw_results: List[Dict] = []
         for item in data.get("results", [])[:limit]:
             title = item.get("title") or item.get("url") or "Untitled"
@@ -80,18 +106,241 @@ class SearxNGProvider(BaseProvider):
 
         return raw_results
 
+    async def asearch(self, query: str, limit: int = 10, page: int = 1) -> List[Dict]:
+        resp = await get_http_client().get(
+            f"{self.base_url}/search", params=self._params(query, page)
+        )
+        resp.raise_for_status()
+        return self._parse(resp.json(), limit)
+
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class WikipediaProvider(BaseProvider):
+    """
+    MediaWiki full-text search (list=search). Text results only.
+    """
+
+    name = "wikipedia"
+
+    def __init__(self, api_url: Optional[str] = None):
+        self.api_url = api_url or settings.WIKIPEDIA_API_URL
+        parsed = urlparse(self.api_url)
+        self.article_base = f"{parsed.scheme}://{parsed.netloc}/wiki/"
+
+    def _params(self, query: str, limit: int, page: int) -> Dict:
+        return {
+            "action": "query",
+            "list": "search",
+            "srsearch": query,
+            "srlimit": limit,
+            "sroffset": (page - 1) * limit,
+            "srprop": "snippet",
+            "format": "json",
+            "utf8": 1,
+        }
+
+    def _parse(self, data: Dict) -> List[Dict]:
+        raw_results: List[Dict] = []
+        for item in data.get("query", {}).get("search", []):
+            title = item.get("title") or "Untitled"
+            # snippets come with <span class="searchmatch"> highlighting
+            snippet = html.unescape(_TAG_RE.sub("", item.get("snippet") or ""))
+            raw_results.append(
+                {
+                    "title": title,
+                    "url": self.article_base + quote(title.replace(" ", "_")),
+                    "snippet": snippet,
+                    "preview_url": None,
+                }
+            )
+        return raw_results
+
+    async def asearch(self, query: str, limit: int = 10, page: int = 1) -> List[Dict]:
+        resp = await get_http_client().get(
+            self.api_url, params=self._params(query, limit, page)
+        )
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+
+# ---------- FAN-OUT ----------
+
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_result_url(url: str) -> str:
+    """
+    Key for de-duplicating results across providers: ignores scheme, "www.",
+    fragments, trailing slashes and tracking parameters.
+    """
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(
+        [
+            (k, v)
+            for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+            if not k.lower().startswith(_TRACKING_PARAMS)
+        ]
+    )
+    path = parsed.path.rstrip("/")
+    return f"{host}{path}?{query}" if query else f"{host}{path}"
+
+
+def merge_results(per_provider: Sequence[List[Dict]], limit: int) -> List[Dict]:
+    """
+    Round-robin by rank across providers (in configured order), keeping the
+    first occurrence of each URL. A duplicate can still contribute a preview.
+    """
+    merged: List[Dict] = []
+    seen: Dict[str, Dict] = {}
+    depth = max((len(r) for r in per_provider), default=0)
+
+    for rank in range(depth):
+        for results in per_provider:
+            if rank >= len(results):
+                continue
+            r = results[rank]
+            key = normalize_result_url(r.get("url") or "")
+            if not key:
+                continue
+            existing = seen.get(key)
+            if existing is not None:
+                if not existing.get("preview_url") and r.get("preview_url"):
+                    existing["preview_url"] = r["preview_url"]
+                continue
+            item = dict(r)
+            seen[key] = item
+            merged.append(item)
+
+    return merged[:limit]
+
+
+class FanoutProvider(BaseProvider):
+    """
+    Queries several providers concurrently under a global deadline.
+
+    If a provider hasn't answered after `hedge_delay`, a second identical
+    request is sent to it and whichever answers first wins. Providers that
+    miss the deadline are dropped from this response, so latency is bounded
+    by the deadline rather than the slowest upstream.
+    """
+
+    name = "fanout"
+
+    def __init__(self, providers: List[BaseProvider], deadline: float, hedge_delay: float = 0.0):
+        self.providers = providers
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+
+    async def _call(
+        self, provider: BaseProvider, query: str, limit: int, page: int
+    ) -> List[Dict]:
+        start = time.perf_counter()
+        try:
+            results = await provider.asearch(query, limit, page)
+        except asyncio.CancelledError:
+            # lost the hedge race or missed the deadline (counted there)
+            raise
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(provider=provider.name, error=type(e).__name__)
+            raise
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, provider=provider.name)
+        return results
+
+    async def _hedged(
+        self, provider: BaseProvider, query: str, limit: int, page: int
+    ) -> List[Dict]:
+        tasks = {asyncio.ensure_future(self._call(provider, query, limit, page))}
+        try:
+            if self.hedge_delay > 0:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+                if not done:
+                    logger.info("Hedging slow search provider %s", provider.name)
+                    tasks.add(asyncio.ensure_future(self._call(provider, query, limit, page)))
+
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def asearch(self, query: str, limit: int = 10, page: int = 1) -> List[Dict]:
+        tasks = [
+            asyncio.ensure_future(self._hedged(p, query, limit, page)) for p in self.providers
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for provider, t in zip(self.providers, tasks):
+            if t in pending:
+                logger.warning("Search provider %s missed the deadline", provider.name)
+                UPSTREAM_ERRORS.inc(provider=provider.name, error="deadline")
+                t.cancel()
+
+        per_provider: List[List[Dict]] = []
+        answered = 0
+        for provider, t in zip(self.providers, tasks):
+            if t not in done:
+                per_provider.append([])
+                continue
+            if t.exception() is not None:
+                logger.warning("Search provider %s failed: %r", provider.name, t.exception())
+                per_provider.append([])
+                continue
+            answered += 1
+            per_provider.append(t.result())
+
+        # an empty page would be stored (and cached) as a real 0-result search
+        if not answered:
+            raise SearchUnavailable("No search provider answered before the deadline")
+
+        return merge_results(per_provider, limit)
+
+
 _provider_singleton: BaseProvider | None = None
 
 
+def _build_providers() -> List[BaseProvider]:
+    providers: List[BaseProvider] = []
+    names = [n.strip().lower() for n in settings.SEARCH_PROVIDER.split(",") if n.strip()]
+
+    for name in names:
+        if name == "searxng":
+            providers.append(SearxNGProvider())
+            for extra in settings.SEARXNG_EXTRA_URLS.split(","):
+                if extra.strip():
+                    providers.append(SearxNGProvider(base_url=extra.strip()))
+        elif name == "wikipedia":
+            providers.append(WikipediaProvider())
+        else:
+            logger.warning("Unknown search provider %r, ignoring", name)
+
+    if not providers:
+        # fallback
+        providers.append(SearxNGProvider())
+    return providers
+
+
 def get_provider() -> BaseProvider:
     global _provider_singleton
     if _provider_singleton is not None:
         return _provider_singleton
 
-    if settings.SEARCH_PROVIDER.lower() == "searxng":
-        _provider_singleton = SearxNGProvider()
-    else:
-        # fallback
-        _provider_singleton = SearxNGProvider()
+    from .search_cache import wrap_with_cache
 
+    _provider_singleton = wrap_with_cache(
+        FanoutProvider(
+            _build_providers(),
+            deadline=settings.SEARCH_DEADLINE_MS / 1000.0,
+            hedge_delay=settings.SEARCH_HEDGE_DELAY_MS / 1000.0,
+        )
+    )
     return _provider_singleton
@@ -0,0 +1,97 @@
+# app/services/stats_rollup.py
+"""
+Incremental maintenance of search_stats_rollups.
+
+Every write of search history also upserts the hour, day and all-time
+buckets it falls into (counts are added, never recomputed), in the same
+transaction, so the dashboard reads a handful of rows however long the
+history is. scripts/backfill_stats_rollups.py rebuilds the table from
+search_queries.
+
+A search is bucketed by its query row's created_at and filter_mode on every
+path (synchronous write, write-behind, backfill): results of follow-up
+pages are added to the query's bucket, not to the hour they arrived in, so
+a backfill reproduces the live rollups.
+"""
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..models import FilterMode
+
+GRANULARITIES = ("hour", "day", "all")
+
+# bucket_start of the single all-time bucket
+ALL_TIME = datetime(1970, 1, 1)
+
+_COUNTS = ("searches", "total_results", "safe_results", "blocked_results")
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ALL_TIME
+
+
+class RollupAccumulator:
+    """
+    Sums history rows into rollup deltas, one per (granularity, bucket, mode).
+    """
+
+    def __init__(self):
+        self._deltas: Dict[Tuple[str, datetime, FilterMode], List[int]] = {}
+
+    def add(
+        self,
+        created_at: datetime,
+        filter_mode: FilterMode,
+        searches: int,
+        total_results: int,
+        safe_results: int,
+        blocked_results: int,
+    ) -> None:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(created_at, granularity), filter_mode)
+            delta = self._deltas.setdefault(key, [0, 0, 0, 0])
+            delta[0] += searches
+            delta[1] += total_results or 0
+            delta[2] += safe_results or 0
+            delta[3] += blocked_results or 0
+
+    def rows(self) -> List[Dict]:
+        return [
+            {
+                "granularity": granularity,
+                "bucket_start": start,
+                "filter_mode": mode,
+                **dict(zip(_COUNTS, delta)),
+            }
+            for (granularity, start, mode), delta in self._deltas.items()
+        ]
+
+
+def apply_rollups(bind: Union[Connection, Session], acc: RollupAccumulator) -> None:
+    """
+    Add the accumulated deltas to the rollup table (INSERT .. ON CONFLICT
+    DO UPDATE). Runs inside the caller's transaction.
+    """
+    rows = acc.rows()
+    if not rows:
+        return
+
+    dialect = bind.get_bind().dialect.name if isinstance(bind, Session) else bind.dialect.name
+    dml = postgresql if dialect == "postgresql" else sqlite
+
+    table = models.SearchStatsRollup.__table__
+    stmt = dml.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.granularity, table.c.bucket_start, table.c.filter_mode],
+        set_={name: table.c[name] + stmt.excluded[name] for name in _COUNTS},
+    )
+    bind.execute(stmt, rows)
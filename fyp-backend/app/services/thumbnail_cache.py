@@ -0,0 +1,234 @@
+# app/services/thumbnail_cache.py
+"""
+Disk cache of the final bytes served by /api/media/proxy.
+
+Keyed by (normalized source URL, effective filter mode, moderation version).
+The version fingerprints the models, cascade and thresholds of the mode, so
+changing any of them starts from fresh verdicts. Image bytes live in one file
+per entry; a small SQLite index next to them holds the ETag, content type,
+moderation verdict and access time, and is shared by all workers on the host.
+
+Entries expire after THUMBNAIL_CACHE_TTL_SECONDS, so a changed source image
+is picked up again. Eviction is LRU by access time once the total size
+passes the limit.
+
+A broken index or disk is not fatal: lookups miss and stores are skipped
+(logged), so the proxy keeps moderating uncached.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from ..config import settings
+from ..models import FilterMode
+from .moderation_cache import normalize_url
+from .moderation_cascade import moderation_version
+
+logger = logging.getLogger(__name__)
+
+# re-check the total size every N writes
+_EVICT_EVERY = 50
+
+
+class CachedThumbnail:
+    def __init__(
+        self,
+        key: str,
+        etag: str,
+        media_type: str,
+        created_at: float,
+        content: bytes,
+        blurred: Optional[bool] = None,
+    ):
+        self.key = key
+        self.etag = etag
+        self.media_type = media_type
+        self.created_at = created_at
+        self.content = content
+        # None: stored before verdicts were kept
+        self.blurred = blurred
+
+
+def thumbnail_key(url: str, mode: FilterMode) -> str:
+    raw = f"{normalize_url(url)}|{mode.value}|{moderation_version(mode)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ThumbnailCache:
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                blurred INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS ix_thumbnails_accessed_at ON thumbnails (accessed_at);
+            """
+        )
+        columns = {row[1] for row in self._conn().execute("PRAGMA table_info(thumbnails)")}
+        if "blurred" not in columns:
+            # index created by an older version
+            self._conn().execute("ALTER TABLE thumbnails ADD COLUMN blurred INTEGER")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.directory, "index.sqlite3"), timeout=5.0, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _path(self, key: str) -> str:
+        # two-level fan-out keeps directories small
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str, with_content: bool = True) -> Optional[CachedThumbnail]:
+        try:
+            return self._get(key, with_content)
+        except (sqlite3.Error, OSError):
+            logger.warning("Thumbnail cache read failed", exc_info=True)
+            return None
+
+    def _get(self, key: str, with_content: bool) -> Optional[CachedThumbnail]:
+        row = self._conn().execute(
+            "SELECT etag, media_type, created_at, blurred FROM thumbnails WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or time.time() - row[2] > self.ttl_seconds:
+            # expired ones are removed by evict()
+            return None
+
+        content = b""
+        if with_content:
+            try:
+                with open(self._path(key), "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                # evicted by another worker between the lookup and the read
+                self._conn().execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+                return None
+
+        self._conn().execute(
+            "UPDATE thumbnails SET accessed_at = ? WHERE key = ?", (time.time(), key)
+        )
+        blurred = None if row[3] is None else bool(row[3])
+        return CachedThumbnail(key, row[0], row[1], row[2], content, blurred)
+
+    def put(
+        self, key: str, content: bytes, media_type: str, blurred: Optional[bool] = None
+    ) -> CachedThumbnail:
+        """
+        Store an entry. If that fails, the entry is still returned (uncached)
+        for the caller to serve.
+        """
+        etag = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+        now = time.time()
+        try:
+            self._put(key, content, media_type, blurred, etag, now)
+        except (sqlite3.Error, OSError):
+            logger.warning("Thumbnail cache write failed", exc_info=True)
+        return CachedThumbnail(key, etag, media_type, now, content, blurred)
+
+    def _put(
+        self,
+        key: str,
+        content: bytes,
+        media_type: str,
+        blurred: Optional[bool],
+        etag: str,
+        now: float,
+    ) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        self._conn().execute(
+            "INSERT OR REPLACE INTO thumbnails "
+            "(key, etag, media_type, size, created_at, accessed_at, blurred) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, etag, media_type, len(content), now, now, blurred),
+        )
+
+        self._writes += 1
+        if self._writes % _EVICT_EVERY == 0:
+            self.evict()
+
+    def _remove(self, key: str) -> None:
+        self._conn().execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> None:
+        conn = self._conn()
+        for (key,) in conn.execute(
+            "SELECT key FROM thumbnails WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+        ).fetchall():
+            self._remove(key)
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # drop least recently used entries down to 90% of the limit
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        for key, size in conn.execute(
+            "SELECT key, size FROM thumbnails ORDER BY accessed_at"
+        ).fetchall():
+            if freed >= target:
+                break
+            self._remove(key)
+            freed += size
+
+
+_cache: Optional[ThumbnailCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> Optional[ThumbnailCache]:
+    global _cache
+    if not settings.THUMBNAIL_CACHE_DIR:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ThumbnailCache(
+                        settings.THUMBNAIL_CACHE_DIR,
+                        settings.THUMBNAIL_CACHE_MAX_BYTES,
+                        settings.THUMBNAIL_CACHE_TTL_SECONDS,
+                    )
+                except (sqlite3.Error, OSError):
+                    logger.warning("Thumbnail cache disabled", exc_info=True)
+                    return None
+    return _cache
@@ -0,0 +1,186 @@
+# app/utils/metrics.py
+"""
+Tiny in-process metrics registry rendered in the Prometheus text format.
+
+Counters and histograms are plain Python objects guarded by a lock, cheap
+enough to leave on in production. Values are per worker process.
+
+With MODERATION_BACKEND=process, censor_if_needed runs in the moderation
+worker processes, so what it records (the nudenet/classifier/blur stages,
+netsentinel_moderation_fallbacks_total, cascade decisions, score cache
+lookups) stays there and never shows up on /metrics.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# default latency buckets (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = row
+            row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def timer(self, **labels) -> Iterator[None]:
+        """
+        Observe the wall time of the `with` block (also when it raises).
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(row[-1])}")
+        return lines
+
+
+# ---------- REGISTRY ----------
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, *args, **kwargs):
+    with _registry_lock:
+        existing = _registry.get(name)
+        if existing is None:
+            existing = cls(name, *args, **kwargs)
+            _registry[name] = existing
+        return existing
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, documentation, labelnames)
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    return _register(Histogram, name, documentation, labelnames, buckets)
+
+
+# shared by the search and moderation code: one series per stage
+# (filter, db_commit, image_download, nudenet, classifier, blur)
+STAGE_SECONDS = histogram(
+    "netsentinel_stage_seconds",
+    "Wall time of one request stage.",
+    labelnames=("stage",),
+)
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.documentation}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,189 @@
+# app/utils/profiling.py
+"""
+On-demand profiling of single requests with pyinstrument (sampling).
+
+install_profiling() only adds the middleware when PROFILING_ENABLED and a
+PROFILING_TOKEN are set, so a normal deployment doesn't pay anything.
+
+A request is profiled when it carries the token (`X-Profile: <token>`
+header or `?profile=<token>`), or at random with PROFILE_SAMPLE_RATE. The
+profile is written as a speedscope file (open it at speedscope.app) to
+PROFILE_DIR/<endpoint>/<duration>ms-<id>.speedscope.json; the id is sent back
+in the X-Profile-Id response header.
+
+Per endpoint each worker keeps the PROFILE_KEEP_SLOWEST slowest profiles and
+deletes the ones that drop out. Sampled requests that wouldn't make the cut
+are not written at all; explicitly requested ones are always written.
+
+Only the event loop thread is sampled: work in the threadpool or the
+moderation processes shows up as the await that waited for it. One request
+per worker is profiled at a time, the others pass through.
+"""
+from __future__ import annotations
+
+import heapq
+import hmac
+import itertools
+import logging
+import os
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SlowestProfiles:
+    """
+    The `keep` slowest profile files per endpoint (min-heaps by duration).
+    """
+
+    def __init__(self, keep: int):
+        self.keep = max(1, keep)
+        self._heaps: Dict[str, List[Tuple[float, str]]] = {}
+
+    def qualifies(self, endpoint: str, duration: float) -> bool:
+        heap = self._heaps.get(endpoint)
+        return heap is None or len(heap) < self.keep or duration > heap[0][0]
+
+    def add(self, endpoint: str, duration: float, path: str) -> bool:
+        """
+        Track `path`; returns False if it isn't among the slowest (the file
+        is then left alone). Evicted files are deleted.
+        """
+        heap = self._heaps.setdefault(endpoint, [])
+        if len(heap) < self.keep:
+            heapq.heappush(heap, (duration, path))
+            return True
+        if duration <= heap[0][0]:
+            return False
+        _, evicted = heapq.heapreplace(heap, (duration, path))
+        _remove(evicted)
+        return True
+
+
+def _endpoint(scope: Dict) -> str:
+    # the router stores the matched route in the (shared) scope
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope['method']} {path}"
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app,
+        token: str,
+        sample_rate: float,
+        directory: str,
+        keep: int,
+        interval: float,
+    ):
+        self.app = app
+        self.token = token.encode("utf-8")
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.interval = interval
+        self.slowest = SlowestProfiles(keep)
+        self._active = False
+        self._ids = itertools.count(1)
+
+    def _requested(self, scope: Dict) -> bool:
+        supplied: Optional[bytes] = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                supplied = value
+                break
+        if supplied is None:
+            values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+            supplied = values[0].encode("utf-8") if values else None
+        return supplied is not None and hmac.compare_digest(supplied, self.token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            return await self.app(scope, receive, send)
+
+        requested = self._requested(scope)
+        if not requested and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return await self.app(scope, receive, send)
+
+        from pyinstrument import Profiler
+
+        profile_id = f"{int(time.time())}-{os.getpid()}-{next(self._ids)}"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start" and requested:
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", profile_id.encode("ascii")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        self._active = True
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            self._active = False
+            duration = time.perf_counter() - started
+            endpoint = _endpoint(scope)
+            if requested or self.slowest.qualifies(endpoint, duration):
+                try:
+                    await self._save(profiler, endpoint, duration, profile_id)
+                except Exception:
+                    logger.exception("Saving the profile of %s failed", endpoint)
+
+    async def _save(self, profiler, endpoint: str, duration: float, profile_id: str) -> None:
+        from pyinstrument.renderers import SpeedscopeRenderer
+
+        directory = os.path.join(self.directory, _UNSAFE_CHARS.sub("_", endpoint).strip("_"))
+        path = os.path.join(directory, f"{int(duration * 1000)}ms-{profile_id}.speedscope.json")
+
+        def write() -> None:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "w") as f:
+                f.write(profiler.output(SpeedscopeRenderer()))
+
+        await run_in_threadpool(write)
+        self.slowest.add(endpoint, duration, path)
+        logger.info("Profiled %s (%.0f ms): %s", endpoint, duration * 1000, path)
+
+
+def install_profiling(app: FastAPI) -> None:
+    if not settings.PROFILING_ENABLED:
+        return
+    if not settings.PROFILING_TOKEN:
+        logger.warning("PROFILING_ENABLED without PROFILING_TOKEN, profiling stays off")
+        return
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        logger.warning("PROFILING_ENABLED but pyinstrument is not installed, profiling stays off")
+        return
+
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=settings.PROFILING_TOKEN,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        directory=settings.PROFILE_DIR,
+        keep=settings.PROFILE_KEEP_SLOWEST,
+        interval=settings.PROFILE_INTERVAL_SECONDS,
+    )
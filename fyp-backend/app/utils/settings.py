@@ -1,7 +1,23 @@
 # app/utils/settings.py
+import logging
+import select
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import text, update
 from sqlalchemy.orm import Session
 
 from .. import models
+from ..config import settings as app_settings
+from ..models import FilterMode
+from ..services.filtering import FilterPolicy, build_policy
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel used to tell other workers that settings changed
+SETTINGS_CHANNEL = "netsentinel_settings"
 
 
 def get_or_create_global_settings(db: Session) -> models.GlobalSettings:
@@ -14,3 +30,193 @@ def get_or_create_global_settings(db: Session) -> models.GlobalSettings:
     db.commit()
     db.refresh(settings)
     return settings
+
+
+# ---------- CACHED SNAPSHOT ----------
+
+class SettingsSnapshot:
+    """
+    Read-only copy of the GlobalSettings row, safe to share between requests
+    (no ORM session attached). Filter policies are parsed once per mode.
+    """
+
+    def __init__(self, row: models.GlobalSettings):
+        self.id = row.id
+        self.version = row.version or 0
+        self.updated_at: Optional[datetime] = row.updated_at
+        self.filter_mode: FilterMode = row.filter_mode
+        self.parental_controls = row.parental_controls
+        self.notifications = row.notifications
+        self.save_search_history = row.save_search_history
+        self.blocked_keywords: str = row.blocked_keywords or ""
+        self.allowed_domains: str = row.allowed_domains or ""
+        self.blocked_domains: str = row.blocked_domains or ""
+
+        self._policies: Dict[FilterMode, FilterPolicy] = {}
+
+    def policy(self, mode: FilterMode) -> FilterPolicy:
+        policy = self._policies.get(mode)
+        if policy is None:
+            policy = build_policy(
+                mode, self.blocked_keywords, self.allowed_domains, self.blocked_domains
+            )
+            self._policies[mode] = policy
+        return policy
+
+
+_lock = threading.Lock()
+_snapshot: Optional[SettingsSnapshot] = None
+_checked_at = 0.0  # time.monotonic() of the last version check
+
+_listener: Optional["_SettingsListener"] = None
+
+
+def _max_age() -> float:
+    # With a live LISTEN connection we are told about changes right away,
+    # so the version poll is only a safety net.
+    if _listener is not None and _listener.connected:
+        return app_settings.SETTINGS_CACHE_MAX_AGE_SECONDS
+    return app_settings.SETTINGS_CACHE_POLL_SECONDS
+
+
+def _store(row: models.GlobalSettings) -> SettingsSnapshot:
+    global _snapshot, _checked_at
+    snap = SettingsSnapshot(row)
+    with _lock:
+        _snapshot = snap
+        _checked_at = time.monotonic()
+    return snap
+
+
+def invalidate_settings_cache() -> None:
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def peek_cached_settings() -> Optional[SettingsSnapshot]:
+    """
+    The cached snapshot if it is still fresh, without touching the DB.
+    Lets async endpoints skip the threadpool hop on the hot path.
+    """
+    snap = _snapshot
+    if snap is not None and time.monotonic() - _checked_at < _max_age():
+        return snap
+    return None
+
+
+def get_cached_settings(db: Session) -> SettingsSnapshot:
+    """
+    Settings for request handling. Served from memory; at most one cheap
+    `SELECT version` per poll interval, full reload only when it changed.
+    """
+    global _checked_at
+    snap = _snapshot
+    if snap is not None and time.monotonic() - _checked_at < _max_age():
+        return snap
+
+    if snap is not None:
+        current = (
+            db.query(models.GlobalSettings.version)
+            .filter(models.GlobalSettings.id == snap.id)
+            .scalar()
+        )
+        if current == snap.version:
+            _checked_at = time.monotonic()
+            return snap
+
+    return _store(get_or_create_global_settings(db))
+
+
+def save_global_settings(db: Session, row: models.GlobalSettings) -> SettingsSnapshot:
+    """
+    Commit changes to the settings row, bump its version and tell the
+    other workers (NOTIFY is delivered on commit).
+    """
+    row.updated_at = datetime.utcnow()
+    db.add(row)
+    db.flush()
+
+    # bumped in the database, not read-modify-write: two workers saving at
+    # once must end up with two distinct versions (the row lock orders them)
+    table = models.GlobalSettings.__table__
+    version = db.execute(
+        update(table)
+        .where(table.c.id == row.id)
+        .values(version=table.c.version + 1)
+        .returning(table.c.version)
+    ).scalar_one()
+
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": SETTINGS_CHANNEL, "payload": str(version)},
+        )
+
+    db.commit()
+    db.refresh(row)
+    return _store(row)
+
+
+# ---------- LISTEN/NOTIFY ----------
+
+class _SettingsListener(threading.Thread):
+    """
+    Background thread holding a LISTEN connection; drops the cached
+    snapshot as soon as another worker commits new settings.
+    """
+
+    def __init__(self, engine):
+        super().__init__(name="settings-listener", daemon=True)
+        self.engine = engine
+        self.connected = False
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.warning("Settings listener disconnected, retrying", exc_info=True)
+            self.connected = False
+            # anything may have changed while we were not listening
+            invalidate_settings_cache()
+            self._stop_event.wait(5.0)
+
+    def _listen(self) -> None:
+        raw = self.engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {SETTINGS_CHANNEL}")
+            self.connected = True
+
+            while not self._stop_event.is_set():
+                if select.select([conn], [], [], 5.0) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    invalidate_settings_cache()
+        finally:
+            raw.invalidate()
+
+
+def start_settings_listener(engine) -> None:
+    global _listener
+    if not app_settings.SETTINGS_CACHE_LISTEN or engine.dialect.name != "postgresql":
+        return
+    if _listener is None:
+        _listener = _SettingsListener(engine)
+        _listener.start()
+
+
+def stop_settings_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,349 @@
+# benchmarks/bench_api.py
+"""
+End-to-end latency/throughput of the API under load, offline.
+
+Starts benchmarks.fake_upstream (SearxNG + image host stand-in), creates a
+throwaway database (SQLite in a temp dir unless --database-url is given),
+runs the app under uvicorn and drives it with concurrent httpx clients:
+
+  search             POST /api/search, per filter mode
+  media_proxy_cold   GET /api/media/proxy, a new image every request, per mode
+  media_proxy_warm   GET /api/media/proxy, a few images over and over, per mode
+  stats_*            GET /api/stats/overview, /timeseries, /recent, /history
+
+Each scenario reports throughput and p50/p95/p99 latency. Results are
+written as JSON for benchmarks.compare_runs.
+
+moderate/strict run the real models, so they need nudenet, torch and
+transformers installed (or CLASSIFIER_BACKEND=onnx in the environment);
+without them use --modes relaxed.
+
+The app runs in a temp working directory, so a local .env is not picked up;
+settings go in through the environment (--env KEY=VALUE to add more).
+
+Run from fyp-backend/:
+    python -m benchmarks.bench_api --output bench-results/baseline.json
+    python -m benchmarks.bench_api --modes relaxed --requests 500 --concurrency 32
+    python -m benchmarks.bench_api --database-url postgresql+psycopg2://u:p@localhost:5435/bench
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("relaxed", "moderate", "strict")
+
+# (method, path, json body or None)
+Request = Tuple[str, str, Optional[Dict]]
+
+
+# ---------- PROCESSES ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(args: List[str], env: Dict[str, str], cwd: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(
+        [sys.executable] + args, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def _wait_until(url: str, timeout: float, proc: subprocess.Popen, ok=(200,)) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url}: process exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2.0).status_code in ok:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def _create_tables(env: Dict[str, str], cwd: str) -> None:
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from app import models\n"
+            "from app.database import Base, engine\n"
+            "Base.metadata.create_all(bind=engine)\n",
+        ],
+        env=env,
+        cwd=cwd,
+        check=True,
+    )
+
+
+# ---------- LOAD ----------
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest rank
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable[[int], Request],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> Dict:
+    async def send(i: int) -> Tuple[float, bool]:
+        method, path, body = make_request(i)
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, path, json=body)
+            ok = resp.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    for i in range(warmup):
+        await send(-1 - i)
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            elapsed, ok = await send(i)
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [v * 1000.0 for v in latencies]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+            "mean": round(sum(ms) / len(ms), 2) if ms else 0.0,
+            "max": round(ms[-1], 2) if ms else 0.0,
+        },
+    }
+
+
+def _proxy_request(upstream: str, mode: str, n: int) -> Request:
+    kind = "skin" if n % 2 else "safe"
+    size = (96, 320, 800, 1600)[n % 4]
+    url = quote(f"{upstream}/img/{kind}-{size}-{n}.jpg", safe="")
+    return "GET", f"/api/media/proxy?url={url}&mode={mode}", None
+
+
+def scenarios(
+    modes: List[str], upstream: str, query_pool: int
+) -> List[Tuple[str, Optional[str], Callable[[int], Request]]]:
+    out = []
+
+    for m, mode in enumerate(modes):
+        # separate image ranges per mode: moderation scores are cached by content
+        base = (m + 1) * 10_000_000
+
+        def search(i: int, mode=mode) -> Request:
+            n = i % query_pool if query_pool else i
+            body = {"query": f"bench {mode} {n}", "filter_mode": mode, "limit": 20}
+            return "POST", "/api/search", body
+
+        def proxy_cold(i: int, mode=mode, base=base) -> Request:
+            return _proxy_request(upstream, mode, base + i)
+
+        def proxy_warm(i: int, mode=mode, base=base) -> Request:
+            # 8 images, filled into the cache by the warmup requests
+            return _proxy_request(upstream, mode, base - 1000 + i % 8)
+
+        out += [
+            ("search", mode, search),
+            ("media_proxy_cold", mode, proxy_cold),
+            ("media_proxy_warm", mode, proxy_warm),
+        ]
+
+    out += [
+        ("stats_overview", None, lambda i: ("GET", "/api/stats/overview", None)),
+        ("stats_timeseries", None, lambda i: ("GET", "/api/stats/timeseries?granularity=hour", None)),
+        ("stats_recent", None, lambda i: ("GET", "/api/stats/recent?limit=10", None)),
+        ("stats_history", None, lambda i: ("GET", "/api/stats/history?limit=20", None)),
+    ]
+    return out
+
+
+async def drive(args: argparse.Namespace, base_url: str, upstream: str) -> List[Dict]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for name, mode, make_request in scenarios(args.modes, upstream, args.query_pool):
+            if args.only and name not in args.only:
+                continue
+            warmup = 8 if name == "media_proxy_warm" else args.warmup
+            stats = await run_scenario(
+                client, make_request, args.requests, args.concurrency, warmup
+            )
+            stats = {"scenario": name, "mode": mode, **stats}
+            results.append(stats)
+            lat = stats["latency_ms"]
+            print(
+                f"{name:<18} {mode or '-':<9} {stats['throughput_rps']:>9.1f} rps "
+                f"p50 {lat['p50']:>8.1f}  p95 {lat['p95']:>8.1f}  p99 {lat['p99']:>8.1f} ms  "
+                f"errors {stats['errors']}",
+                flush=True,
+            )
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--only", nargs="+", help="scenario names to run (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    parser.add_argument("--query-pool", type=int, default=0, help="distinct queries (0: all distinct)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0)
+    parser.add_argument("--database-url", help="throwaway database (default: temp SQLite)")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="extra app settings")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="model warmup wait")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="netsentinel-bench-")
+    upstream_port, app_port = _free_port(), _free_port()
+    upstream = f"http://127.0.0.1:{upstream_port}"
+    base_url = f"http://127.0.0.1:{app_port}"
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+            "DATABASE_URL": database_url,
+            "SEARCH_PROVIDER": "searxng",
+            "SEARXNG_URL": upstream,
+            "SEARXNG_EXTRA_URLS": "",
+            "THUMBNAIL_CACHE_DIR": os.path.join(workdir, "thumbnails"),
+            "MODERATION_CACHE_PATH": os.path.join(workdir, "moderation_cache.sqlite3"),
+        }
+    )
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    procs: List[subprocess.Popen] = []
+    try:
+        upstream_proc = _spawn(
+            [
+                "-m", "benchmarks.fake_upstream",
+                "--port", str(upstream_port),
+                "--latency-ms", str(args.upstream_latency_ms),
+            ],
+            env, workdir, os.path.join(workdir, "upstream.log"),
+        )
+        procs.append(upstream_proc)
+        _create_tables(env, workdir)
+        app_proc = _spawn(
+            [
+                "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1",
+                "--port", str(app_port),
+                "--workers", str(args.workers),
+                "--log-level", "warning",
+                "--no-access-log",
+            ],
+            env, workdir, os.path.join(workdir, "app.log"),
+        )
+        procs.append(app_proc)
+
+        if not _wait_until(f"{upstream}/search?q=ping", 30, upstream_proc):
+            raise RuntimeError("fake upstream did not start")
+        if not _wait_until(f"{base_url}/health", 60, app_proc):
+            raise RuntimeError("app did not start")
+        if set(args.modes) - {"relaxed"} and not _wait_until(
+            f"{base_url}/ready", args.ready_timeout, app_proc
+        ):
+            print("warning: models not ready, moderated scenarios will include loading", flush=True)
+
+        print(f"app {base_url}, upstream {upstream}, db {database_url}, logs in {workdir}")
+        results = asyncio.run(drive(args, base_url, upstream))
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "database": "sqlite" if database_url.startswith("sqlite") else database_url.split(":", 1)[0],
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "database_url")},
+        },
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/bench_classifier_batching.py
+"""
+Images/sec of the NSFW classifier under a burst of concurrent requests,
+with and without micro-batching. Needs torch + transformers (downloads the
+Falconsai model on first run).
+
+Run from fyp-backend/:
+    python -m benchmarks.bench_classifier_batching --images 48 --concurrency 32
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import List
+
+from PIL import Image
+
+from app.config import settings
+from app.services import image_moderation
+
+
+def make_images(count: int, size: int = 320) -> List[bytes]:
+    images = []
+    for i in range(count):
+        img = Image.new("RGB", (size, size), ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def run(images: List[bytes], concurrency: int, batching: bool) -> float:
+    settings.CLASSIFIER_BATCHING = batching
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(image_moderation.nsfw_score_classifier, images))
+    return len(images) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=48)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    images = make_images(args.images)
+    # load + warm the model outside of the measurement
+    image_moderation.nsfw_scores_batch([Image.open(BytesIO(images[0])).convert("RGB")])
+
+    unbatched = run(images, args.concurrency, batching=False)
+    batched = run(images, args.concurrency, batching=True)
+
+    print(f"{args.images} images, {args.concurrency} concurrent callers")
+    print(f"batch size 1 : {unbatched:8.1f} images/s")
+    print(
+        f"micro-batched: {batched:8.1f} images/s "
+        f"(max batch {settings.CLASSIFIER_MAX_BATCH_SIZE}, wait {settings.CLASSIFIER_MAX_WAIT_MS} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_image_pipeline.py
+"""
+Memory/latency of the image stages in censor_if_needed: the old path
+(full-resolution decode for detector, classifier and blur separately) vs.
+the decode-once DecodedImage pipeline. Model inference is left out so only
+the decode/resize/blur work is compared.
+
+Each variant runs in a fresh subprocess (reading a pre-generated file) so
+peak RSS is not shared and not inflated by generating the test image.
+
+Run from fyp-backend/:
+    python -m benchmarks.bench_image_pipeline
+    python -m benchmarks.bench_image_pipeline --width 4000 --height 3000 --repeat 5
+"""
+import argparse
+import json
+import resource
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+
+def make_image(width: int, height: int, fmt: str) -> bytes:
+    rng = np.random.default_rng(0)
+    # smooth gradient + noise, compresses like a photo rather than a flat fill
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noisy = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = BytesIO()
+    Image.fromarray(noisy).save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def legacy(data: bytes) -> None:
+    # NudeNet: cv2.imdecode of the full image
+    detector_input = np.asarray(Image.open(BytesIO(data)).convert("RGB"))[:, :, ::-1].copy()
+    # classifier: Image.open(...).convert("RGB")
+    classifier_input = Image.open(BytesIO(data)).convert("RGB")
+    # blur_image: decode again, blur at full size, encode
+    image = Image.open(BytesIO(data)).convert("RGB")
+    out = BytesIO()
+    image.filter(ImageFilter.GaussianBlur(radius=25)).save(out, format="JPEG", quality=85)
+    del detector_input, classifier_input
+
+
+def pipeline(data: bytes) -> None:
+    from app.services.image_pipeline import DecodedImage
+
+    decoded = DecodedImage(data)
+    detector_input = decoded.bgr
+    classifier_input = decoded.image
+    out = BytesIO()
+    decoded.image.filter(ImageFilter.GaussianBlur(radius=25)).save(out, format="JPEG", quality=85)
+    del detector_input, classifier_input
+
+
+def peak_rss_kb() -> int:
+    # VmHWM is per address space; ru_maxrss would inherit the parent's peak
+    # across fork/exec on Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_variant(variant: str, path: str, repeat: int) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+    fn = legacy if variant == "legacy" else pipeline
+    if variant == "pipeline":
+        import app.services.image_pipeline  # noqa: F401  (import outside of measurement)
+
+    rss_before = peak_rss_kb()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - start)
+    rss_after = peak_rss_kb()
+
+    return {
+        "variant": variant,
+        "bytes": len(data),
+        "best_ms": min(times) * 1000,
+        "mean_ms": sum(times) / len(times) * 1000,
+        "peak_rss_growth_mb": (rss_after - rss_before) / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--variant", choices=["legacy", "pipeline"])
+    parser.add_argument("--input", help="image file (used with --variant)")
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.input, args.repeat)))
+        return
+
+    print(f"{args.width}x{args.height} source, best/mean of {args.repeat}")
+    print(f"{'format':>6} {'variant':>9} {'best ms':>9} {'mean ms':>9} {'peak RSS +MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("JPEG", "PNG"):
+            path = os.path.join(tmp, f"source.{fmt.lower()}")
+            with open(path, "wb") as f:
+                f.write(make_image(args.width, args.height, fmt))
+
+            for variant in ("legacy", "pipeline"):
+                out = subprocess.run(
+                    [
+                        sys.executable, "-m", "benchmarks.bench_image_pipeline",
+                        "--variant", variant, "--input", path, "--repeat", str(args.repeat),
+                    ],
+                    check=True, capture_output=True, text=True,
+                )
+                r = json.loads(out.stdout)
+                print(
+                    f"{fmt:>6} {variant:>9} {r['best_ms']:>9.1f} {r['mean_ms']:>9.1f} "
+                    f"{r['peak_rss_growth_mb']:>13.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
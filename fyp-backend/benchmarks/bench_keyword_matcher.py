@@ -0,0 +1,83 @@
+# benchmarks/bench_keyword_matcher.py
+"""
+Naive per-keyword substring scan vs. the compiled KeywordMatcher.
+
+Run from fyp-backend/:
+    python -m benchmarks.bench_keyword_matcher
+    python -m benchmarks.bench_keyword_matcher --keywords 1000 10000 50000 --results 50
+"""
+import argparse
+import random
+import string
+import time
+from typing import List
+
+from app.services.keyword_matcher import KeywordMatcher
+
+
+def _random_word(rng: random.Random, lo: int = 4, hi: int = 10) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(lo, hi)))
+
+
+def make_results(rng: random.Random, count: int) -> List[str]:
+    texts = []
+    for _ in range(count):
+        title = " ".join(_random_word(rng) for _ in range(8))
+        snippet = " ".join(_random_word(rng) for _ in range(40))
+        texts.append(f"{title} {snippet}")
+    return texts
+
+
+def naive(texts: List[str], banned: set) -> List[bool]:
+    out = []
+    for text in texts:
+        lowered = text.lower()
+        out.append(any(word in lowered for word in banned))
+    return out
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keywords", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--results", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = make_results(rng, args.results)
+
+    print(f"{args.results} results/query, best of {args.repeat}")
+    print(f"{'keywords':>9} {'build ms':>10} {'naive ms':>10} {'matcher ms':>11} {'speedup':>8}")
+
+    for k in args.keywords:
+        # longer words than the text vocabulary mostly -> realistic low hit rate
+        banned = {_random_word(rng, 6, 14) for _ in range(k)}
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(banned)
+        build = time.perf_counter() - start
+
+        expected = naive(texts, banned)
+        assert matcher.match_many(texts) == expected
+
+        t_naive = timed(lambda: naive(texts, banned), args.repeat)
+        t_matcher = timed(lambda: matcher.match_many(texts), args.repeat)
+
+        print(
+            f"{k:>9} {build * 1000:>10.1f} {t_naive * 1000:>10.2f} "
+            f"{t_matcher * 1000:>11.2f} {t_naive / t_matcher:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
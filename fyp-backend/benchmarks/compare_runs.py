@@ -0,0 +1,82 @@
+# benchmarks/compare_runs.py
+"""
+Compare two benchmarks.bench_api result files and flag regressions.
+
+A scenario regresses when its p95 (or p99 with --p99) latency grows, or its
+throughput drops, by more than --threshold (relative) against the baseline,
+or when it has errors the baseline didn't. Exits 1 if anything regressed, so
+it can gate CI.
+
+Run from fyp-backend/:
+    python -m benchmarks.compare_runs bench-results/baseline.json bench-results/new.json
+    python -m benchmarks.compare_runs old.json new.json --threshold 0.15 --p99
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Optional, Tuple
+
+Key = Tuple[str, Optional[str]]
+
+
+def load(path: str) -> Dict[Key, Dict]:
+    with open(path) as f:
+        report = json.load(f)
+    return {(r["scenario"], r["mode"]): r for r in report["results"]}
+
+
+def _change(old: float, new: float) -> float:
+    if old <= 0:
+        return 0.0
+    return (new - old) / old
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--p99", action="store_true", help="judge latency on p99 instead of p95")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    pct = "p99" if args.p99 else "p95"
+
+    print(
+        f"{'scenario':<18} {'mode':<9} {pct + ' ms':>17} {'change':>8} "
+        f"{'rps':>19} {'change':>8}  verdict"
+    )
+    regressions = 0
+    for key in sorted(set(baseline) | set(candidate), key=lambda k: (k[0], k[1] or "")):
+        name, mode = key
+        old, new = baseline.get(key), candidate.get(key)
+        if old is None or new is None:
+            print(f"{name:<18} {mode or '-':<9} {'only in ' + ('candidate' if old is None else 'baseline')}")
+            continue
+
+        old_lat, new_lat = old["latency_ms"][pct], new["latency_ms"][pct]
+        old_rps, new_rps = old["throughput_rps"], new["throughput_rps"]
+        lat_change, rps_change = _change(old_lat, new_lat), _change(old_rps, new_rps)
+
+        problems = []
+        if lat_change > args.threshold:
+            problems.append("slower")
+        if rps_change < -args.threshold:
+            problems.append("less throughput")
+        if new["errors"] > old["errors"]:
+            problems.append("errors")
+        regressions += bool(problems)
+
+        print(
+            f"{name:<18} {mode or '-':<9} {old_lat:>8.1f}→{new_lat:<8.1f} {lat_change:>+8.1%} "
+            f"{old_rps:>9.1f}→{new_rps:<9.1f} {rps_change:>+8.1%}  "
+            f"{'REGRESSION: ' + ', '.join(problems) if problems else 'ok'}"
+        )
+
+    if regressions:
+        print(f"{regressions} scenario(s) regressed by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# benchmarks/fake_upstream.py
+"""
+Local stand-in for SearxNG and for the image hosts it links to, so the API
+benchmarks run offline and repeatably.
+
+- GET /search?q=...&pageno=N&format=json: canned SearxNG JSON. Results are
+  derived from (q, pageno); every other one has an img_src on this server
+  and a few titles contain blocked keywords.
+- GET /img/{kind}-{size}-{n}.jpg: synthetic JPEG, `kind` is "safe"
+  (landscape-like gradient) or "skin" (large skin-toned shapes, the kind
+  of image the detectors have to look at closely), `size` its longer side.
+  Each `n` gets different bytes, so content-keyed caches see a new image.
+
+Both live on one port on purpose: the SearxNG provider rewrites localhost
+image URLs to the SEARXNG_URL host.
+
+Started by benchmarks.bench_api; can also be run on its own:
+    python -m benchmarks.fake_upstream --port 8890
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+from PIL import Image, ImageDraw
+
+IMAGE_SIZES = (96, 320, 800, 1600)
+IMAGE_KINDS = ("safe", "skin")
+
+app = FastAPI()
+app.state.latency_ms = 0.0
+app.state.results_per_page = 20
+
+
+@lru_cache(maxsize=None)
+def _base_image(kind: str, size: int) -> bytes:
+    rng = np.random.default_rng(size)
+    width, height = size, size * 3 // 4
+    if kind == "safe":
+        # sky over grass, plus noise so it compresses like a photo
+        y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+        sky = np.array([110, 160, 230], dtype=np.float32)
+        grass = np.array([60, 140, 50], dtype=np.float32)
+        pixels = np.where(y < 0.6, sky, grass) + np.zeros((height, width, 3), np.float32)
+    else:
+        pixels = np.full((height, width, 3), (70, 60, 55), dtype=np.float32)
+    pixels = np.clip(pixels + rng.normal(0, 10, pixels.shape), 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels)
+
+    if kind == "skin":
+        draw = ImageDraw.Draw(image)
+        tones = [(224, 172, 140), (198, 134, 104), (241, 194, 164)]
+        for i in range(4):
+            cx, cy = width * (0.3 + 0.15 * i), height * (0.35 + 0.1 * (i % 2))
+            rx, ry = width * 0.18, height * 0.3
+            draw.ellipse((cx - rx, cy - ry, cx + rx, cy + ry), fill=tones[i % len(tones)])
+
+    buf = BytesIO()
+    image.save(buf, format="JPEG", quality=88)
+    return buf.getvalue()
+
+
+async def _delay() -> None:
+    if app.state.latency_ms > 0:
+        await asyncio.sleep(app.state.latency_ms / 1000.0)
+
+
+@app.get("/search")
+async def search(request: Request, q: str = "", pageno: int = 1):
+    await _delay()
+    seed = int(hashlib.sha256(f"{q}|{pageno}".encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    base = f"http://{request.url.netloc}"
+
+    results = []
+    for i in range(app.state.results_per_page):
+        n = seed % 100_000 * 100 + i
+        title = f"{q} result {pageno}-{i}"
+        if rng.random() < 0.1:
+            title += " porn"
+        item = {
+            "title": title,
+            "url": f"https://example-{n % 97}.com/{q.replace(' ', '-')}/{pageno}/{i}",
+            "content": f"Snippet for {q}, page {pageno}, result {i}. " * 3,
+        }
+        if i % 2:
+            kind = IMAGE_KINDS[rng.randrange(len(IMAGE_KINDS))]
+            size = IMAGE_SIZES[rng.randrange(len(IMAGE_SIZES))]
+            item["img_src"] = f"{base}/img/{kind}-{size}-{n}.jpg"
+        results.append(item)
+    return {"query": q, "results": results}
+
+
+@app.get("/img/{name}")
+async def image(name: str):
+    await _delay()
+    try:
+        kind, size, _ = name.rsplit(".", 1)[0].split("-", 2)
+        size = int(size)
+    except ValueError:
+        raise HTTPException(status_code=404)
+    if kind not in IMAGE_KINDS or size not in IMAGE_SIZES:
+        raise HTTPException(status_code=404)
+    # decoders ignore data after the JPEG end marker: unique bytes per name
+    return Response(content=_base_image(kind, size) + name.encode("utf-8"), media_type="image/jpeg")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8890)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--results-per-page", type=int, default=20)
+    args = parser.parse_args()
+
+    app.state.latency_ms = args.latency_ms
+    app.state.results_per_page = args.results_per_page
+    # render the base images before serving
+    for kind in IMAGE_KINDS:
+        for size in IMAGE_SIZES:
+            _base_image(kind, size)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
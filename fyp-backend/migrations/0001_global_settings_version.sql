@@ -0,0 +1,9 @@
+-- migrations/0001_global_settings_version.sql
+-- Version + updated_at on global_settings, used by the in-process settings cache.
+-- Apply with: psql -h localhost -p 5435 -U netsentinel -d netsentinel -f migrations/0001_global_settings_version.sql
+
+ALTER TABLE global_settings
+    ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE global_settings
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
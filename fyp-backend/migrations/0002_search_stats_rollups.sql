@@ -0,0 +1,15 @@
+-- migrations/0002_search_stats_rollups.sql
+-- Hourly / daily / all-time search counts per filter mode, read by /api/stats.
+-- Apply with: psql -h localhost -p 5435 -U netsentinel -d netsentinel -f migrations/0002_search_stats_rollups.sql
+-- then fill it from the existing history: python -m scripts.backfill_stats_rollups
+
+CREATE TABLE IF NOT EXISTS search_stats_rollups (
+    granularity VARCHAR(8) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    filter_mode filtermode NOT NULL,
+    searches INTEGER NOT NULL DEFAULT 0,
+    total_results INTEGER NOT NULL DEFAULT 0,
+    safe_results INTEGER NOT NULL DEFAULT 0,
+    blocked_results INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket_start, filter_mode)
+);
@@ -0,0 +1,15 @@
+-- migrations/0003_history_indexes.sql
+-- Indexes for keyset pagination of /api/stats/history and /api/stats/recent,
+-- and for the search_results -> search_queries foreign key.
+-- CONCURRENTLY: no write lock on a live table (psql -f runs these outside a transaction).
+-- Apply with: psql -h localhost -p 5435 -U netsentinel -d netsentinel -f migrations/0003_history_indexes.sql
+-- Check with: python -m scripts.check_query_plans
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_queries_created_at_id
+    ON search_queries (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_queries_filter_mode_created_at_id
+    ON search_queries (filter_mode, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_results_query_id
+    ON search_results (query_id);
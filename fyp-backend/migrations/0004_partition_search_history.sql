@@ -0,0 +1,92 @@
+-- migrations/0004_partition_search_history.sql
+-- Turns search_queries and search_results into native range-partitioned tables
+-- (monthly partitions on created_at), so retention can drop whole partitions.
+--
+-- Notes:
+--  * A partitioned table's primary key must contain the partition key, so the
+--    keys become (id, created_at). ids still come from the same sequences and
+--    stay unique.
+--  * For the same reason search_results.query_id can no longer be a foreign
+--    key (search_queries.id alone is not unique-constrained any more). Both
+--    tables are partitioned on the same months and purged together; results
+--    added to a query in a later month are deleted by query_id before the
+--    query goes (app/services/retention.py), which takes over the ON DELETE
+--    CASCADE.
+--  * Future partitions are created by the app (PARTITION_PREMAKE_MONTHS);
+--    rows outside any monthly partition land in the *_default partitions.
+--
+-- Stop the API, then apply with:
+--   psql -h localhost -p 5435 -U netsentinel -d netsentinel -1 -f migrations/0004_partition_search_history.sql
+
+ALTER TABLE search_results RENAME TO search_results_legacy;
+ALTER TABLE search_queries RENAME TO search_queries_legacy;
+
+-- index names from 0003 are recreated on the partitioned tables below
+DROP INDEX IF EXISTS ix_search_queries_created_at_id;
+DROP INDEX IF EXISTS ix_search_queries_filter_mode_created_at_id;
+DROP INDEX IF EXISTS ix_search_results_query_id;
+
+-- ---------- search_queries ----------
+
+CREATE TABLE search_queries (
+    LIKE search_queries_legacy INCLUDING DEFAULTS,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE search_queries_id_seq OWNED BY search_queries.id;
+
+-- ---------- search_results ----------
+
+CREATE TABLE search_results (
+    LIKE search_results_legacy INCLUDING DEFAULTS,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE search_results_id_seq OWNED BY search_results.id;
+
+-- ---------- partitions: every month with data, up to 3 months ahead ----------
+
+DO $$
+DECLARE
+    first_month DATE;
+    month DATE;
+BEGIN
+    SELECT date_trunc('month', LEAST(
+               COALESCE((SELECT min(created_at) FROM search_queries_legacy), now()),
+               COALESCE((SELECT min(created_at) FROM search_results_legacy), now())
+           ))::date
+      INTO first_month;
+
+    month := first_month;
+    WHILE month <= date_trunc('month', now() + interval '3 months')::date LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF search_queries FOR VALUES FROM (%L) TO (%L)',
+            'search_queries_p' || to_char(month, 'YYYYMM'), month, month + interval '1 month'
+        );
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF search_results FOR VALUES FROM (%L) TO (%L)',
+            'search_results_p' || to_char(month, 'YYYYMM'), month, month + interval '1 month'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS search_queries_default PARTITION OF search_queries DEFAULT;
+CREATE TABLE IF NOT EXISTS search_results_default PARTITION OF search_results DEFAULT;
+
+-- ---------- indexes (created on every partition) ----------
+
+CREATE INDEX IF NOT EXISTS ix_search_queries_created_at_id
+    ON search_queries (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_search_queries_filter_mode_created_at_id
+    ON search_queries (filter_mode, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_search_results_query_id
+    ON search_results (query_id);
+
+-- ---------- data ----------
+
+INSERT INTO search_queries SELECT * FROM search_queries_legacy;
+INSERT INTO search_results SELECT * FROM search_results_legacy;
+
+DROP TABLE search_results_legacy;
+DROP TABLE search_queries_legacy;
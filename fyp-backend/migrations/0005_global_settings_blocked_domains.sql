@@ -0,0 +1,6 @@
+-- migrations/0005_global_settings_blocked_domains.sql
+-- Admin domain blocklist (comma-separated, matched by suffix like allowed_domains).
+-- Apply with: psql -h localhost -p 5435 -U netsentinel -d netsentinel -f migrations/0005_global_settings_blocked_domains.sql
+
+ALTER TABLE global_settings
+    ADD COLUMN IF NOT EXISTS blocked_domains TEXT DEFAULT '';
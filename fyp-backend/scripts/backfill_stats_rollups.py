@@ -0,0 +1,60 @@
+# scripts/backfill_stats_rollups.py
+"""
+Rebuild search_stats_rollups from search_queries.
+
+Needed once after applying migrations/0002_search_stats_rollups.sql (the
+app only maintains the rollups for new searches), or to repair them.
+Runs in a single transaction; stop the API first, or searches made
+while it runs may be counted twice.
+
+Run from fyp-backend/:
+    python -m scripts.backfill_stats_rollups
+    python -m scripts.backfill_stats_rollups --chunk-size 50000
+"""
+import argparse
+import time
+
+from sqlalchemy import delete, select
+
+from app import models
+from app.database import engine
+from app.services.stats_rollup import RollupAccumulator, apply_rollups
+
+
+def backfill(chunk_size: int) -> int:
+    Q = models.SearchQuery
+    acc = RollupAccumulator()
+    count = 0
+
+    with engine.begin() as conn:
+        conn.execute(delete(models.SearchStatsRollup.__table__))
+
+        result = conn.execution_options(yield_per=chunk_size).execute(
+            select(
+                Q.created_at,
+                Q.filter_mode,
+                Q.total_results,
+                Q.safe_results,
+                Q.blocked_results,
+            )
+        )
+        for created_at, mode, total, safe, blocked in result:
+            acc.add(created_at, mode, 1, total, safe, blocked)
+            count += 1
+
+        apply_rollups(conn, acc)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = backfill(args.chunk_size)
+    print(f"Rolled up {count} searches in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
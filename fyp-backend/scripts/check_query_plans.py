@@ -0,0 +1,101 @@
+# scripts/check_query_plans.py
+"""
+EXPLAIN the history queries and check they are served by the indexes from
+migrations/0003_history_indexes.sql rather than sequential scans.
+
+Sequential scans are disabled for the session (small or fresh tables would
+otherwise legitimately prefer them), so a plan that still scans the table
+means no usable index exists. Exits 1 if any check fails.
+
+Works against Postgres (EXPLAIN) and SQLite (EXPLAIN QUERY PLAN).
+
+Run from fyp-backend/:
+    python -m scripts.check_query_plans
+    DATABASE_URL=sqlite:////tmp/netsentinel.db python -m scripts.check_query_plans
+"""
+import sys
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection
+
+from app import models
+from app.database import engine
+from app.models import FilterMode
+from app.services.activity_history import history_select
+
+
+def _explain(conn: Connection, stmt) -> str:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN" if conn.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN"
+    rows = conn.execute(text(f"{prefix} {compiled}")).fetchall()
+    # Postgres: one text column; SQLite: (id, parent, notused, detail)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _uses_index(plan: str, index: str, table: str) -> bool:
+    if index not in plan:
+        return False
+    # Postgres "Seq Scan on <table>" / SQLite "SCAN <table>" without an index
+    return f"Seq Scan on {table}" not in plan and f"SCAN {table}\n" not in plan + "\n"
+
+
+def checks() -> List[Tuple[str, object, str, str]]:
+    now = datetime.utcnow()
+    after = (now, 1_000_000)
+    return [
+        (
+            "recent (first page)",
+            history_select(10),
+            "ix_search_queries_created_at_id",
+            "search_queries",
+        ),
+        (
+            "history page after cursor",
+            history_select(21, after=after),
+            "ix_search_queries_created_at_id",
+            "search_queries",
+        ),
+        (
+            "history by date range",
+            history_select(21, start=now - timedelta(days=7), end=now),
+            "ix_search_queries_created_at_id",
+            "search_queries",
+        ),
+        (
+            "history by filter_mode after cursor",
+            history_select(21, after=after, filter_mode=FilterMode.strict),
+            "ix_search_queries_filter_mode_created_at_id",
+            "search_queries",
+        ),
+        (
+            "results of one query",
+            select(models.SearchResult).where(models.SearchResult.query_id == 1),
+            "ix_search_results_query_id",
+            "search_results",
+        ),
+    ]
+
+
+def main() -> int:
+    failed = 0
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET enable_seqscan = off"))
+
+        for name, stmt, index, table in checks():
+            plan = _explain(conn, stmt)
+            ok = _uses_index(plan, index, table)
+            failed += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] {name}: expects {index}")
+            if not ok:
+                print("    " + plan.replace("\n", "\n    "))
+
+    if failed:
+        print(f"{failed} check(s) failed: apply migrations/0003_history_indexes.sql")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
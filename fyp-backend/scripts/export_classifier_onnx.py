@@ -0,0 +1,151 @@
+# scripts/export_classifier_onnx.py
+"""
+Export the NSFW classifier to ONNX, quantize it to int8 and verify it
+against the PyTorch model.
+
+Run from fyp-backend/:
+    python -m scripts.export_classifier_onnx
+    python -m scripts.export_classifier_onnx --samples /path/to/images --tolerance 0.05
+    python -m scripts.export_classifier_onnx --verify-only --onnx models/nsfw_classifier.int8.onnx
+
+Exit code is non-zero when a score differs by more than --tolerance or a
+blur decision flips at the moderate/strict classifier thresholds.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.services.classifier_backends import (
+    MODEL_ID,
+    ClassifierBackend,
+    OnnxClassifierBackend,
+    TorchClassifierBackend,
+)
+
+# classifier thresholds used by censor_if_needed (moderate, strict)
+DECISION_THRESHOLDS = (0.90, 0.75)
+
+
+def export(fp32_path: str, opset: int) -> None:
+    import torch
+
+    backend = TorchClassifierBackend()
+
+    class _LogitsOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            return self.model(pixel_values=pixel_values).logits
+
+    size = backend.processor.size.get("height", 224)
+    dummy = torch.randn(1, 3, size, size)
+
+    os.makedirs(os.path.dirname(os.path.abspath(fp32_path)), exist_ok=True)
+    torch.onnx.export(
+        _LogitsOnly(backend.model).eval(),
+        (dummy,),
+        fp32_path,
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+    )
+    print(f"exported {fp32_path}")
+
+
+def quantize(fp32_path: str, int8_path: str) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(
+        f"quantized {int8_path} "
+        f"({os.path.getsize(fp32_path) / 1e6:.1f} MB -> {os.path.getsize(int8_path) / 1e6:.1f} MB)"
+    )
+
+
+def load_samples(directory: str, count: int) -> List[Image.Image]:
+    images: List[Image.Image] = []
+    if directory:
+        for path in sorted(glob.glob(os.path.join(directory, "*")))[:count]:
+            try:
+                images.append(Image.open(path).convert("RGB"))
+            except OSError:
+                continue
+    if not images:
+        # no sample set given: random noise/gradient images still catch export bugs
+        rng = np.random.default_rng(0)
+        for i in range(count):
+            arr = rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+            arr[:, :, i % 3] = np.linspace(0, 255, 256, dtype=np.uint8)
+            images.append(Image.fromarray(arr))
+    return images
+
+
+def score(backend: ClassifierBackend, images: List[Image.Image], batch: int) -> Tuple[List[float], float]:
+    backend.predict(images[:1])  # warm-up
+    start = time.perf_counter()
+    scores: List[float] = []
+    for i in range(0, len(images), batch):
+        scores.extend(backend.predict(images[i:i + batch]))
+    return scores, (time.perf_counter() - start) / len(images)
+
+
+def verify(onnx_path: str, images: List[Image.Image], batch: int, tolerance: float) -> bool:
+    reference, t_ref = score(TorchClassifierBackend(), images, batch)
+    candidate, t_cand = score(OnnxClassifierBackend(onnx_path), images, batch)
+
+    diffs = np.abs(np.array(reference) - np.array(candidate))
+    flips = sum(
+        (r >= t) != (c >= t)
+        for r, c in zip(reference, candidate)
+        for t in DECISION_THRESHOLDS
+    )
+
+    print(f"samples:          {len(images)}")
+    print(f"max |diff|:       {diffs.max():.4f}")
+    print(f"mean |diff|:      {diffs.mean():.4f}")
+    print(f"decision flips:   {flips}")
+    print(f"torch latency:    {t_ref * 1000:.1f} ms/image")
+    print(f"onnx latency:     {t_cand * 1000:.1f} ms/image ({t_ref / t_cand:.1f}x)")
+
+    return bool(diffs.max() <= tolerance and flips == 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output-dir", default="models")
+    parser.add_argument("--onnx", help="model to verify (default: the int8 export)")
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--verify-only", action="store_true")
+    parser.add_argument("--samples", default="", help="directory of sample images")
+    parser.add_argument("--count", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    fp32_path = os.path.join(args.output_dir, "nsfw_classifier.onnx")
+    int8_path = os.path.join(args.output_dir, "nsfw_classifier.int8.onnx")
+    target = args.onnx or (fp32_path if args.no_quantize else int8_path)
+
+    if not args.verify_only:
+        print(f"model: {MODEL_ID}")
+        export(fp32_path, args.opset)
+        if not args.no_quantize:
+            quantize(fp32_path, int8_path)
+
+    ok = verify(target, load_samples(args.samples, args.count), args.batch, args.tolerance)
+    print("OK" if ok else "FAILED: ONNX scores drift from the torch model")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# scripts/import_domain_list.py
+"""
+Build a domain list file (app/services/domain_policy.py format) from public
+blocklists, for DOMAIN_BLOCKLIST_PATH / DOMAIN_ALLOWLIST_PATH.
+
+Input formats (--format auto picks per line):
+  hosts   "0.0.0.0 ads.example.com [more names]", as in /etc/hosts lists
+  plain   one domain per line ("*.example.com" and ".example.com" accepted)
+Comments ("#" or "!") and localhost-style entries are skipped. Subdomains of
+a listed domain are dropped, since the parent already covers them.
+
+The output is replaced atomically; running workers pick it up within
+DOMAIN_LIST_RELOAD_SECONDS.
+
+Run from fyp-backend/:
+    python -m scripts.import_domain_list hosts.txt more.txt -o /var/lib/netsentinel/blocklist.nsdl
+    cat list.txt | python -m scripts.import_domain_list - --format plain -o blocklist.nsdl
+"""
+import argparse
+import ipaddress
+import os
+import sys
+from typing import Iterable, Iterator, TextIO
+
+from app.services.domain_policy import MappedDomainList, normalize_domain, write_domain_list
+
+_LOCAL_NAMES = {
+    "localhost",
+    "localhost.localdomain",
+    "local",
+    "broadcasthost",
+    "ip6-localhost",
+    "ip6-loopback",
+    "ip6-localnet",
+    "ip6-mcastprefix",
+    "ip6-allnodes",
+    "ip6-allrouters",
+    "ip6-allhosts",
+    "0.0.0.0",
+}
+
+
+def _is_ip(token: str) -> bool:
+    try:
+        ipaddress.ip_address(token.split("%", 1)[0])
+        return True
+    except ValueError:
+        return False
+
+
+def parse_lines(lines: Iterable[str], fmt: str) -> Iterator[str]:
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("!"):
+            continue
+        tokens = line.split()
+        if fmt == "hosts" or (fmt == "auto" and len(tokens) > 1 and _is_ip(tokens[0])):
+            names = tokens[1:]
+        else:
+            names = tokens[:1]
+        for name in names:
+            if name.lower() in _LOCAL_NAMES or _is_ip(name):
+                continue
+            normalized = normalize_domain(name)
+            # single labels ("lan", "router") are not public domains
+            if normalized and "." in normalized:
+                yield normalized
+
+
+def _open(path: str) -> TextIO:
+    if path == "-":
+        return sys.stdin
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("inputs", nargs="+", help="list files ('-' for stdin)")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--format", choices=("auto", "hosts", "plain"), default="auto")
+    args = parser.parse_args()
+
+    names = []
+    for path in args.inputs:
+        with _open(path) as f:
+            before = len(names)
+            names.extend(parse_lines(f, args.format))
+        print(f"{path}: {len(names) - before} entries")
+
+    written = write_domain_list(names, args.output)
+    size = os.path.getsize(args.output)
+    # sanity check: the file opens and maps
+    MappedDomainList(args.output)
+    print(f"wrote {written} domains ({size / 1024:.0f} KiB) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# scripts/measure_startup.py
+"""
+Start-up timing for the API:
+  1. import time of app.main (fresh interpreter), plus the slowest imports
+  2. uvicorn launch -> first 200 from /health
+  3. uvicorn launch -> first 200 from /ready (models loaded + warmed up)
+
+Run from fyp-backend/:
+    python -m scripts.measure_startup
+    python -m scripts.measure_startup --port 8011 --timeout 300
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional, Tuple
+
+
+def measure_import(top: int) -> Tuple[float, List[Tuple[float, str]]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    # "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(\S.*)", line)
+        if m and not m.group(2).startswith(" "):
+            rows.append((int(m.group(1)) / 1e6, m.group(2).strip()))
+    rows.sort(reverse=True)
+    return elapsed, rows[:top]
+
+
+def _get(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+def measure_server(port: int, timeout: float) -> Tuple[Optional[float], Optional[float]]:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    to_health = to_ready = None
+    try:
+        while time.perf_counter() - start < timeout and proc.poll() is None:
+            elapsed = time.perf_counter() - start
+            if to_health is None and _get(f"http://127.0.0.1:{port}/health") == 200:
+                to_health = elapsed
+            if to_health is not None and _get(f"http://127.0.0.1:{port}/ready") == 200:
+                to_ready = elapsed
+                break
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return to_health, to_ready
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    elapsed, slowest = measure_import(args.top)
+    print(f"import app.main: {elapsed:.2f}s (fresh interpreter, incl. startup)")
+    for seconds, name in slowest:
+        print(f"  {seconds:6.3f}s  {name}")
+
+    to_health, to_ready = measure_server(args.port, args.timeout)
+    fmt = lambda v: f"{v:.2f}s" if v is not None else "timed out"  # noqa: E731
+    print(f"launch -> /health 200: {fmt(to_health)}")
+    print(f"launch -> /ready  200: {fmt(to_ready)}")
+
+
+if __name__ == "__main__":
+    main()